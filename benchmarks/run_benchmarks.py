@@ -0,0 +1,250 @@
+"""
+Throughput, latency and memory benchmark of the trades -> candles ->
+technical-indicators -> to-feature-store pipeline.
+
+Each stage runs the transformation functions of its service in-process, in the
+directory and the environment of the service (`uv run`), on the output of the
+previous stage. The trades are synthetic (reproducible with the seed) or replayed
+from a local trades archive. With `--redpanda` it also measures the end-to-end
+latency against the services running on the local Redpanda.
+
+The results are saved as JSON in `benchmarks/results`, named after the commit, so
+we can compare them between commits:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --compare results/a.json results/b.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+STAGES_DIR = ROOT / 'benchmarks' / 'stages'
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+PAIRS = ['BTC/USD', 'BTC/EUR', 'ETH/EUR', 'ETH/USD']
+
+# name, service, script, input, output
+STAGES = [
+    ('trades', 'trades', 'stage_trades.py', None, 'trades.jsonl'),
+    ('candles', 'candles', 'stage_candles.py', 'trades.jsonl', 'candles.jsonl'),
+    (
+        'technical-indicators',
+        'technical-indicators',
+        'stage_technical_indicators.py',
+        'candles.jsonl',
+        'technical_indicators.jsonl',
+    ),
+    (
+        'technical-indicators-talib',
+        'technical-indicators',
+        'stage_technical_indicators.py',
+        'candles.jsonl',
+        'technical_indicators_talib.jsonl',
+    ),
+    (
+        'to-feature-store',
+        'to-feature-store',
+        'stage_to_feature_store.py',
+        'technical_indicators.jsonl',
+        None,
+    ),
+]
+
+
+def stage_params(name: str, args: argparse.Namespace) -> dict:
+    return {
+        'trades': {
+            'pairs': PAIRS,
+            'trades_per_second': args.trades_per_second,
+            'duration_seconds': args.duration_seconds,
+            'seed': args.seed,
+            # A fixed start, so the same seed gives the same candles
+            'start_timestamp_ms': 1_731_110_400_000,
+            'archive': args.archive,
+            'codec': args.codec,
+        },
+        'candles': {
+            'candle_seconds': args.candle_seconds,
+            'extra_aggregates': args.extra_aggregates,
+        },
+        'technical-indicators': {'variant': 'incremental'},
+        'technical-indicators-talib': {'variant': 'talib'},
+        'to-feature-store': {'sink_batch_size': args.sink_batch_size},
+        'redpanda': {
+            'broker_address': args.broker_address,
+            'trades_topic': 'trades',
+            'output_topic': args.output_topic,
+            'pairs': PAIRS,
+            'trades_per_second': args.trades_per_second,
+            'duration_seconds': args.redpanda_seconds,
+            'drain_seconds': 2 * args.candle_seconds[0],
+            'seed': args.seed,
+            'codec': args.codec,
+        },
+    }[name]
+
+
+def run_stage(
+    service: str,
+    script: str,
+    params: dict,
+    workdir: Path,
+    input_file: Optional[str],
+    output_file: Optional[str],
+    python: Optional[str],
+) -> dict:
+    """
+    Runs a stage in the directory of its service and returns its results
+    """
+    command = [python] if python else ['uv', 'run', 'python']
+    command += [str(STAGES_DIR / script), '--params', json.dumps(params)]
+    if input_file:
+        command += ['--input', str(workdir / input_file)]
+    if output_file:
+        command += ['--output', str(workdir / output_file)]
+
+    process = subprocess.run(
+        command, cwd=ROOT / 'services' / service, capture_output=True, text=True
+    )
+    for line in process.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX) :])
+    raise RuntimeError(f'Stage {script} in {service} failed:\n{process.stderr}')
+
+
+def git_commit() -> dict:
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ['git', *args], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+
+    return {
+        'sha': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain')),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now(tz=timezone.utc).isoformat(),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+        },
+        'params': {
+            name: stage_params(name, args) for name, *_ in STAGES if name in args.stages
+        },
+        'stages': {},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, service, script, input_file, output_file in STAGES:
+            if name not in args.stages:
+                continue
+            print(f'Running {name}...', file=sys.stderr)
+            results['stages'][name] = run_stage(
+                service,
+                script,
+                stage_params(name, args),
+                Path(workdir),
+                input_file,
+                output_file,
+                args.python,
+            )
+            print(f'  {results["stages"][name]}', file=sys.stderr)
+
+    if args.redpanda:
+        print('Running against Redpanda...', file=sys.stderr)
+        results['params']['redpanda'] = stage_params('redpanda', args)
+        results['stages']['redpanda'] = run_stage(
+            'trades',
+            'redpanda.py',
+            results['params']['redpanda'],
+            Path('.'),
+            None,
+            None,
+            args.python,
+        )
+        print(f'  {results["stages"]["redpanda"]}', file=sys.stderr)
+
+    return results
+
+
+def compare(paths: List[str]) -> None:
+    """
+    Prints the throughput and p99 latency of each stage of two results, and the
+    change from the first one to the second one
+    """
+    old, new = (json.loads(Path(path).read_text()) for path in paths)
+    print(f'{old["commit"]["sha"]} -> {new["commit"]["sha"]}')
+    for name, new_stage in new['stages'].items():
+        old_stage = old['stages'].get(name)
+        if old_stage is None:
+            continue
+        for metric, get in (
+            ('throughput/s', lambda stage: stage['throughput_per_second']),
+            ('p99 us', lambda stage: (stage.get('latency_us') or {}).get('p99')),
+            ('max rss MB', lambda stage: stage['max_rss_mb']),
+        ):
+            before, after = get(old_stage), get(new_stage)
+            if not before or not after:
+                continue
+            print(
+                f'  {name:<28} {metric:<13} {before:>12.1f} {after:>12.1f} '
+                f'{(after - before) / before:+8.1%}'
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--stages', nargs='+', default=[name for name, *_ in STAGES])
+    parser.add_argument('--trades-per-second', type=float, default=20.0)
+    parser.add_argument('--duration-seconds', type=float, default=6 * 3600)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--archive', help='Replay this trades archive instead')
+    parser.add_argument('--codec', choices=['json', 'binary'], default='json')
+    parser.add_argument(
+        '--candle-seconds', type=int, nargs='+', default=[60, 300, 900, 3600]
+    )
+    parser.add_argument('--extra-aggregates', action='store_true')
+    parser.add_argument('--sink-batch-size', type=int, default=1000)
+    parser.add_argument(
+        '--python', help='Run all the stages with this interpreter instead of uv'
+    )
+    parser.add_argument('--redpanda', action='store_true')
+    parser.add_argument('--redpanda-seconds', type=float, default=300)
+    parser.add_argument('--broker-address', default='localhost:19092')
+    parser.add_argument('--output-topic', default='technical_indicators')
+    parser.add_argument('--output', help='Results file, by default in results/')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    results = run(args)
+    output = (
+        Path(args.output)
+        if args.output
+        else RESULTS_DIR / (f'{results["commit"]["sha"]}-{int(time.time())}.json')
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f'Results saved to {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Helpers shared by the stages of the pipeline benchmark.
+
+Each stage runs in the directory (and the environment) of its service, so it can
+import the modules of the service as `run.py` does. A stage reads the messages of
+the previous stage from a JSON lines file, times the transformation functions of its
+service on each one and writes its output messages for the next stage. It reports
+its results as a JSON line on stdout, prefixed with `RESULT_PREFIX`.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from typing import Any, Iterable, List
+
+from loguru import logger
+from quixstreams.utils.json import dumps, loads
+
+# The modules of the service, e.g. `run` or `candle`, are in the working directory
+sys.path.insert(0, os.getcwd())
+
+# We measure the transformations, not the logs of every message
+logger.remove()
+logger.add(sys.stderr, level=os.environ.get('BENCHMARK_LOG_LEVEL', 'WARNING'))
+
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help='JSON lines file with the input messages')
+    parser.add_argument('--output', help='JSON lines file for the output messages')
+    parser.add_argument(
+        '--params', default='{}', help='JSON object with the parameters of the stage'
+    )
+    args = parser.parse_args()
+    args.params = json.loads(args.params)
+    return args
+
+
+def read_messages(path: str) -> List[dict]:
+    with open(path, 'rb') as f:
+        return [loads(line) for line in f]
+
+
+def write_messages(path: str, messages: Iterable[dict]) -> None:
+    with open(path, 'wb') as f:
+        for message in messages:
+            f.write(dumps(message))
+            f.write(b'\n')
+
+
+class MemoryState:
+    """
+    In-memory replacement of the Quix Streams state of a key. Values are stored as
+    JSON, as the RocksDB state does, so we also pay for their serialization.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._values.get(key)
+        return loads(value) if value is not None else default
+
+    def set(self, key: str, value: Any) -> None:
+        self._values[key] = dumps(value)
+
+    def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    def exists(self, key: str) -> bool:
+        return key in self._values
+
+    def size(self) -> int:
+        return sum(len(value) for value in self._values.values())
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def report(
+    n_in: int, n_out: int, seconds: float, latencies_ns: List[int], **extra
+) -> None:
+    """
+    Prints the results of the stage
+
+    Args:
+        n_in: Number of input messages
+        n_out: Number of output messages
+        seconds: Time spent in the transformation functions
+        latencies_ns: Time to process each input message (or batch, for the stages
+            that work on batches)
+        extra: Other results of the stage
+    """
+    latencies_us = [latency / 1000 for latency in latencies_ns]
+    result = {
+        'messages_in': n_in,
+        'messages_out': n_out,
+        'seconds': round(seconds, 4),
+        'throughput_per_second': round(n_in / seconds, 1) if seconds else None,
+        'latency_us': {
+            'p50': round(percentile(latencies_us, 50), 2),
+            'p99': round(percentile(latencies_us, 99), 2),
+            'max': round(max(latencies_us), 2),
+        }
+        if latencies_us
+        else None,
+        # ru_maxrss is in kilobytes on Linux
+        'max_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        **extra,
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+class Stopwatch:
+    """
+    Accumulates the time of the timed sections and keeps the time of each one
+    """
+
+    def __init__(self):
+        self.latencies_ns: List[int] = []
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        self.latencies_ns.append(time.perf_counter_ns() - self._start)
+
+    @property
+    def seconds(self) -> float:
+        return sum(self.latencies_ns) / 1e9
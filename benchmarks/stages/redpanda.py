@@ -0,0 +1,96 @@
+"""
+End-to-end benchmark against a running pipeline: the local Redpanda from
+`docker-compose/redpanda.yml` with the candles, technical-indicators and
+to-feature-store services consuming from it.
+
+It produces synthetic trades in real time to the trades topic and consumes the
+output topic at the same time. The latency of an output message is the time from
+its last trade (the `timestamp_ms` of the candle, which is when we produced that
+trade) until we consume it. It runs in the trades service.
+"""
+
+import threading
+import time
+import uuid
+
+from common import parse_args, percentile
+from common import report as report_stage
+from kraken_api.synthetic import SyntheticTradesAPI
+from quixstreams import Application
+from streaming_common.serialization import MessageDeserializer, get_serializer
+
+if __name__ == '__main__':
+    args = parse_args()
+    params = args.params
+
+    app = Application(
+        broker_address=params['broker_address'],
+        # A new consumer group that only reads what we produce from now on
+        consumer_group=f'benchmark-{uuid.uuid4()}',
+        auto_offset_reset='latest',
+    )
+    trades_topic = app.topic(
+        params['trades_topic'],
+        value_serializer=get_serializer(params['codec'], 'trade'),
+    )
+    output_topic = app.topic(
+        params['output_topic'], value_deserializer=MessageDeserializer()
+    )
+
+    latencies_ms = []
+    stop = threading.Event()
+
+    def consume():
+        with app.get_consumer() as consumer:
+            consumer.subscribe([output_topic.name])
+            while not stop.is_set():
+                message = consumer.poll(0.5)
+                if message is None or message.error():
+                    continue
+                value = output_topic.deserialize(message).value
+                latencies_ms.append(time.time() * 1000 - value['timestamp_ms'])
+
+    consumer_thread = threading.Thread(target=consume, daemon=True)
+    consumer_thread.start()
+    # Give the consumer time to join its group before we produce
+    time.sleep(5)
+
+    trades_api = SyntheticTradesAPI(
+        pairs=params['pairs'],
+        trades_per_second=params['trades_per_second'],
+        seed=params['seed'],
+        realtime=True,
+        duration_seconds=params['duration_seconds'],
+    )
+    n_trades = 0
+    start = time.monotonic()
+    with app.get_producer() as producer:
+        while not trades_api.is_done():
+            for trade in trades_api.get_trades():
+                message = trades_topic.serialize(
+                    key=trade.pair.replace('/', '-'), value=trade.to_dict()
+                )
+                producer.produce(
+                    topic=trades_topic.name, value=message.value, key=message.key
+                )
+                n_trades += 1
+    seconds = time.monotonic() - start
+
+    # Wait for the last windows to close and reach the output topic
+    time.sleep(params['drain_seconds'])
+    stop.set()
+    consumer_thread.join()
+
+    report_stage(
+        n_in=n_trades,
+        n_out=len(latencies_ms),
+        seconds=seconds,
+        latencies_ns=[],
+        end_to_end_latency_ms={
+            'p50': round(percentile(latencies_ms, 50), 1),
+            'p99': round(percentile(latencies_ms, 99), 1),
+            'max': round(max(latencies_ms), 1),
+        }
+        if latencies_ms
+        else None,
+    )
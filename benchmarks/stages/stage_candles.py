@@ -0,0 +1,67 @@
+"""
+Candles stage: aggregates the trades with the reducer of the candles service in
+tumbling windows of the smallest candle seconds, emitting the final candles, and
+builds the larger candles with `rollup_candles`. The latency is the time per trade.
+"""
+
+from common import (
+    MemoryState,
+    Stopwatch,
+    parse_args,
+    read_messages,
+    report,
+    write_messages,
+)
+from run import init_candle, rollup_candles, to_message, update_candle
+
+if __name__ == '__main__':
+    args = parse_args()
+    params = args.params
+    candle_seconds = params['candle_seconds']
+    extra_aggregates = params['extra_aggregates']
+    window_ms = candle_seconds[0] * 1000
+
+    trades = read_messages(args.input)
+
+    # The open window and the state of each pair, as the key of the topic
+    windows = {}
+    states = {}
+
+    def close_window(pair: str) -> list:
+        start, candle = windows[pair]
+        message = to_message(
+            {'start': start, 'end': start + window_ms, 'value': candle},
+            candle_seconds[0],
+            extra_aggregates,
+        )
+        if len(candle_seconds) == 1:
+            return [message]
+        return rollup_candles(
+            message,
+            states.setdefault(pair, MemoryState()),
+            candle_seconds[1:],
+            emit_incomplete_candles=False,
+        )
+
+    stopwatch = Stopwatch()
+    candles = []
+    for trade in trades:
+        with stopwatch:
+            pair = trade['pair']
+            start = trade['timestamp_ms'] - trade['timestamp_ms'] % window_ms
+            window = windows.get(pair)
+            if window is not None and window[0] == start:
+                windows[pair] = (start, update_candle(window[1], trade))
+            else:
+                if window is not None:
+                    candles += close_window(pair)
+                windows[pair] = (start, init_candle(trade))
+
+    write_messages(args.output, candles)
+    report(
+        n_in=len(trades),
+        n_out=len(candles),
+        seconds=stopwatch.seconds,
+        latencies_ns=stopwatch.latencies_ns,
+        state_bytes=sum(state.size() for state in states.values()),
+    )
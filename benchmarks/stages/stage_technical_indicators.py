@@ -0,0 +1,56 @@
+"""
+Technical indicators stage: computes the indicators of the candles of the configured
+candle seconds, with the incremental indicators (`update_indicators`) or with TA-Lib
+over the candles in the state (`update_candles` and `compute_indicators`). The
+latency is the time per candle.
+"""
+
+from common import (
+    MemoryState,
+    Stopwatch,
+    parse_args,
+    read_messages,
+    report,
+    write_messages,
+)
+from config import config
+
+if __name__ == '__main__':
+    args = parse_args()
+    params = args.params
+
+    if params['variant'] == 'incremental':
+        from incremental_indicators import update_indicators
+
+        steps = [update_indicators]
+    else:
+        from candle import update_candles
+        from technical_indicators import compute_indicators
+
+        steps = [update_candles, compute_indicators]
+
+    candles = [
+        candle
+        for candle in read_messages(args.input)
+        if candle['candle_seconds'] == config.candle_seconds
+    ]
+
+    states = {}
+    stopwatch = Stopwatch()
+    messages = []
+    for candle in candles:
+        with stopwatch:
+            state = states.setdefault(candle['pair'], MemoryState())
+            value = candle
+            for step in steps:
+                value = step(value, state)
+            messages.append({**value, 'coin': value['pair'].split('/')[0]})
+
+    write_messages(args.output, messages)
+    report(
+        n_in=len(candles),
+        n_out=len(messages),
+        seconds=stopwatch.seconds,
+        latencies_ns=stopwatch.latencies_ns,
+        state_bytes=sum(state.size() for state in states.values()),
+    )
@@ -0,0 +1,75 @@
+"""
+To feature store stage: writes the technical indicators in batches with the `write`
+method of the Hopsworks sink. Instead of inserting the batches into the feature
+group, which needs a Hopsworks project, we write them to local Parquet files, so we
+time converting the batch to a DataFrame and serializing it. The latency is the time
+per batch.
+"""
+
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from common import Stopwatch, parse_args, read_messages, report
+from quixstreams.sinks.base import SinkBatch
+from sinks import HopsworksFeatureStoreSink
+from streaming_common.metrics import (
+    FEATURE_STORE_INSERT_SECONDS,
+    MESSAGES_OUT,
+    SINK_RETRIES,
+)
+
+
+class LocalFeatureGroup:
+    """
+    Writes the inserted DataFrames to Parquet files in a directory
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.n_inserts = 0
+
+    def insert(self, data: pd.DataFrame) -> None:
+        data.to_parquet(self.path / f'batch-{self.n_inserts}.parquet')
+        self.n_inserts += 1
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    batch_size = args.params['sink_batch_size']
+
+    messages = read_messages(args.input)
+
+    with tempfile.TemporaryDirectory() as path:
+        # Skip the constructor, which logs in to Hopsworks
+        sink = HopsworksFeatureStoreSink.__new__(HopsworksFeatureStoreSink)
+        sink._feature_group = LocalFeatureGroup(Path(path))
+        sink._insert_seconds = FEATURE_STORE_INSERT_SECONDS.labels(
+            feature_group='benchmark'
+        )
+        sink._rows_written = MESSAGES_OUT.labels(topic='benchmark')
+        sink._retries = SINK_RETRIES.labels(sink='benchmark')
+
+        stopwatch = Stopwatch()
+        for start in range(0, len(messages), batch_size):
+            batch = SinkBatch(topic='technical_indicators', partition=0)
+            for offset, message in enumerate(messages[start : start + batch_size]):
+                batch.append(
+                    value=message,
+                    key=message['pair'],
+                    timestamp=message['timestamp_ms'],
+                    headers=[],
+                    offset=start + offset,
+                )
+            with stopwatch:
+                sink.write(batch)
+
+        n_bytes = sum(file.stat().st_size for file in Path(path).iterdir())
+
+    report(
+        n_in=len(messages),
+        n_out=len(messages),
+        seconds=stopwatch.seconds,
+        latencies_ns=stopwatch.latencies_ns,
+        parquet_bytes_per_message=round(n_bytes / max(1, len(messages)), 1),
+    )
@@ -0,0 +1,56 @@
+"""
+Trades stage: gets the batches of trades from the synthetic generator (or the local
+trades archive) and serializes them as the trades service does before producing
+them. The latency is the time per batch.
+"""
+
+from common import Stopwatch, parse_args, report, write_messages
+from kraken_api.replay import TradesReplayAPI
+from kraken_api.synthetic import SyntheticTradesAPI
+from quixstreams.models import MessageField
+from quixstreams.models.serializers import SerializationContext
+from streaming_common.serialization import get_serializer
+
+if __name__ == '__main__':
+    args = parse_args()
+    params = args.params
+
+    if params.get('archive'):
+        trades_api = TradesReplayAPI(path=params['archive'], pairs=params['pairs'])
+    else:
+        trades_api = SyntheticTradesAPI(
+            pairs=params['pairs'],
+            trades_per_second=params['trades_per_second'],
+            seed=params['seed'],
+            realtime=False,
+            duration_seconds=params['duration_seconds'],
+            start_timestamp_ms=params['start_timestamp_ms'],
+        )
+
+    serializer = get_serializer(params['codec'], 'trade')
+    if serializer == 'json':
+        from quixstreams.utils.json import dumps as serialize
+    else:
+        ctx = SerializationContext(topic='trades', field=MessageField.VALUE)
+
+        def serialize(value):
+            return serializer(value, ctx)
+
+    stopwatch = Stopwatch()
+    messages = []
+    n_bytes = 0
+    while not trades_api.is_done():
+        with stopwatch:
+            batch = [trade.to_dict() for trade in trades_api.get_trades()]
+            payloads = [serialize(message) for message in batch]
+        messages += batch
+        n_bytes += sum(len(payload) for payload in payloads)
+
+    write_messages(args.output, messages)
+    report(
+        n_in=len(messages),
+        n_out=len(messages),
+        seconds=stopwatch.seconds,
+        latencies_ns=stopwatch.latencies_ns,
+        bytes_per_message=round(n_bytes / max(1, len(messages)), 1),
+    )
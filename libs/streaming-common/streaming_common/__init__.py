@@ -0,0 +1,5 @@
+"""
+Code shared by the streaming services: the binary codec of the Kafka topics
+(`serialization`), the Prometheus metrics (`metrics`) and the latency tracing headers
+(`tracing`).
+"""
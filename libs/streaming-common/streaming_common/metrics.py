@@ -0,0 +1,174 @@
+"""
+Prometheus metrics of the streaming services, served on a local HTTP port in the
+Prometheus text format:
+
+    curl localhost:9102/metrics
+
+The metrics are `prometheus_client` objects at module level, so any module of the
+service can update them:
+
+    MESSAGES_OUT.labels(topic='candles').inc()
+    with PROCESSING_SECONDS.labels(step='candle').time():
+        ...
+
+`app_config()` returns the arguments of the Quix Streams `Application` that count the
+consumed messages and the errors and keep the consumer lag up to date, and
+`start_server(port)` serves the metrics.
+"""
+
+import json
+import logging
+import os
+from typing import Callable, Optional
+
+from loguru import logger
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Upper bounds of the buckets of the histograms, in seconds
+BUCKETS_SECONDS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+MESSAGES_IN = Counter(
+    'messages_in_total', 'Messages consumed from Kafka or a data source', ['topic']
+)
+MESSAGES_OUT = Counter(
+    'messages_out_total', 'Messages produced to Kafka or written to a sink', ['topic']
+)
+ERRORS = Counter(
+    'errors_total', 'Errors consuming, processing or producing messages', ['kind']
+)
+SINK_RETRIES = Counter(
+    'sink_retries_total', 'Writes to a sink that are retried later', ['sink']
+)
+STATE_BYTES = Gauge('state_bytes', 'Size of the state of the application on disk')
+CONSUMER_LAG = Gauge(
+    'consumer_lag', 'Messages of the partition not consumed yet', ['topic', 'partition']
+)
+QUEUE_SIZE = Gauge('queue_size', 'Items waiting in an in-memory queue', ['queue'])
+SOURCE_LAG_SECONDS = Gauge(
+    'source_lag_seconds',
+    'Receive time minus the time of the last trade of a data source connection',
+    ['connection'],
+)
+SOURCE_LAST_MESSAGE_TIMESTAMP = Gauge(
+    'source_last_message_timestamp_seconds',
+    'Time of the last message of a data source connection',
+    ['connection'],
+)
+SOURCE_BLOCKED_SECONDS = Counter(
+    'source_blocked_seconds_total',
+    'Time a data source connection waits for room in a full queue',
+    ['connection'],
+)
+PROCESSING_SECONDS = Histogram(
+    'processing_seconds',
+    'Time to process a message in each step',
+    ['step'],
+    buckets=BUCKETS_SECONDS,
+)
+LLM_CALL_SECONDS = Histogram(
+    'llm_call_seconds', 'Time of the LLM calls', ['model'], buckets=BUCKETS_SECONDS
+)
+FEATURE_STORE_INSERT_SECONDS = Histogram(
+    'feature_store_insert_seconds',
+    'Time to insert a batch into the feature store',
+    ['feature_group'],
+    buckets=BUCKETS_SECONDS,
+)
+
+
+def start_server(port: Optional[int]) -> None:
+    """
+    Serves the metrics on `port` from a background thread. Does nothing if the port is
+    None, and only logs a warning if the port is taken, so the metrics never stop the
+    service.
+    """
+    if port is None:
+        return
+    try:
+        start_http_server(port)
+    except OSError as e:
+        logger.warning(f'Cannot serve the metrics on port {port}: {e}')
+        return
+    logger.info(f'Serving the metrics on port {port}')
+
+
+def directory_bytes(path: str) -> int:
+    """
+    Returns the size of the files under `path`, e.g. the state directory
+    """
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                # RocksDB deletes files while we walk the directory
+                pass
+    return size
+
+
+def count_message(topic: str, partition: int, offset: int) -> None:
+    """
+    `on_message_processed` callback of the Quix Streams application
+    """
+    MESSAGES_IN.labels(topic=topic).inc()
+
+
+def _on_statistics(statistics: str) -> None:
+    """
+    Updates the consumer lag of each partition with the statistics of librdkafka
+    """
+    for topic, topic_statistics in json.loads(statistics).get('topics', {}).items():
+        for partition, partition_statistics in topic_statistics['partitions'].items():
+            lag = partition_statistics.get('consumer_lag', -1)
+            # The internal partition -1 and the partitions we do not consume have no
+            # lag
+            if partition != '-1' and lag >= 0:
+                CONSUMER_LAG.labels(topic=topic, partition=partition).set(lag)
+
+
+def app_config(statistics_interval_ms: int = 15000) -> dict:
+    """
+    Returns the arguments of the Quix Streams `Application` that update the metrics:
+    the messages consumed, the errors and the consumer lag. The error callbacks keep
+    the default behaviour of the application (log the error and stop).
+    """
+    from quixstreams.error_callbacks import (
+        default_on_consumer_error,
+        default_on_processing_error,
+        default_on_producer_error,
+    )
+
+    def counting(kind: str, callback: Callable) -> Callable:
+        def on_error(exc: Exception, message, quix_logger: logging.Logger) -> bool:
+            ERRORS.labels(kind=kind).inc()
+            return callback(exc, message, quix_logger)
+
+        return on_error
+
+    return {
+        'on_message_processed': count_message,
+        'on_consumer_error': counting('consumer', default_on_consumer_error),
+        'on_processing_error': counting('processing', default_on_processing_error),
+        'on_producer_error': counting('producer', default_on_producer_error),
+        'consumer_extra_config': {
+            'statistics.interval.ms': statistics_interval_ms,
+            'stats_cb': _on_statistics,
+        },
+    }
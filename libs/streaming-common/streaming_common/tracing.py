@@ -0,0 +1,162 @@
+"""
+Latency tracing across the Kafka hops of the pipeline.
+
+Each service adds two headers to the messages it produces: the time it got the input
+message (`trace.<service>.in`) and the time it produced the output message
+(`trace.<service>.out`), in milliseconds. It also keeps the trace headers of the input
+message, so the headers of a technical indicators message tell when the trades service
+got its trade, when the candles service got it, and so on.
+
+Run as a module, it consumes topics and prints the latency histogram of each hop, e.g.
+`trades.out -> candles.in` is the time the trade spent in Kafka:
+
+    uv run python -m streaming_common.tracing technical_indicators --seconds 60
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+PREFIX = 'trace.'
+
+Headers = List[Tuple[str, bytes]]
+
+# Upper bounds of the buckets of the latency histograms, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 60000)
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def trace_headers(headers: Optional[Any]) -> Headers:
+    """
+    Returns the trace headers of a message, in the order they were added
+    """
+    if not headers:
+        return []
+    items = headers.items() if isinstance(headers, dict) else headers
+    return [(name, value) for name, value in items if name.startswith(PREFIX)]
+
+
+def stamp(name: str, timestamp_ms: Optional[int] = None) -> Tuple[str, bytes]:
+    """
+    Returns the trace header of the event `name`, e.g. 'candles.in'
+    """
+    timestamp_ms = now_ms() if timestamp_ms is None else timestamp_ms
+    return (f'{PREFIX}{name}', str(timestamp_ms).encode())
+
+
+def parse(headers: Optional[Any]) -> Dict[str, int]:
+    """
+    Returns the time of each event of the trace headers, e.g. {'trades.in': ...}
+    """
+    return {name[len(PREFIX) :]: int(value) for name, value in trace_headers(headers)}
+
+
+class HopTracer:
+    """
+    Adds the trace headers of a service to the messages it produces.
+
+    The windows of Quix Streams drop the headers of their input messages, so we keep
+    the trace headers of the last input message in `on_input` and add them to the
+    output messages in `on_output`:
+
+        sdf = sdf.update(tracer.on_input, metadata=True)
+        ...
+        sdf = sdf.set_headers(tracer.on_output)
+        sdf = sdf.to_topic(output_topic)
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+        self._input_headers: Headers = []
+        self._input_ms = now_ms()
+
+    def on_input(self, value: Any, key: Any, timestamp: int, headers: Any) -> None:
+        self._input_headers = trace_headers(headers)
+        self._input_ms = now_ms()
+
+    def on_output(self, value: Any, key: Any, timestamp: int, headers: Any) -> Headers:
+        other_headers = [
+            (name, header_value)
+            for name, header_value in (headers or [])
+            if not name.startswith(PREFIX)
+        ]
+        return [
+            *other_headers,
+            *self._input_headers,
+            stamp(f'{self.service}.in', self._input_ms),
+            stamp(f'{self.service}.out'),
+        ]
+
+
+def hop_latencies(events: Dict[str, int], consumed_ms: int) -> Dict[str, int]:
+    """
+    Returns the latency of each hop of a trace, from each event to the next one and
+    from the last one to the time we consumed the message
+    """
+    names = [*events, 'consumed']
+    times = [*events.values(), consumed_ms]
+    return {
+        f'{names[i]} -> {names[i + 1]}': times[i + 1] - times[i]
+        for i in range(len(names) - 1)
+    }
+
+
+def print_histograms(latencies: Dict[str, List[int]]) -> None:
+    for hop, values in latencies.items():
+        values = sorted(values)
+        print(
+            f'\n{hop}: {len(values)} messages, '
+            f'p50 {values[len(values) // 2]} ms, '
+            f'p99 {values[min(len(values) - 1, int(0.99 * len(values)))]} ms, '
+            f'max {values[-1]} ms'
+        )
+        lower = float('-inf')
+        for upper in (*BUCKETS_MS, float('inf')):
+            count = sum(lower < value <= upper for value in values)
+            if count:
+                bar = '#' * max(1, round(50 * count / len(values)))
+                print(f'  <= {upper:>7} ms {count:>8} {bar}')
+            lower = upper
+
+
+if __name__ == '__main__':
+    import argparse
+    import uuid
+    from collections import defaultdict
+
+    from quixstreams import Application
+
+    parser = argparse.ArgumentParser(
+        description='Latency histograms of the hops of the messages of some topics'
+    )
+    parser.add_argument('topics', nargs='+')
+    parser.add_argument('--broker-address', default='localhost:19092')
+    parser.add_argument('--seconds', type=float, default=60)
+    args = parser.parse_args()
+
+    app = Application(
+        broker_address=args.broker_address,
+        # A new consumer group that only reads the new messages
+        consumer_group=f'tracing-{uuid.uuid4()}',
+        auto_offset_reset='latest',
+    )
+
+    latencies: Dict[str, Dict[str, List[int]]] = {
+        topic: defaultdict(list) for topic in args.topics
+    }
+    end = time.monotonic() + args.seconds
+    with app.get_consumer() as consumer:
+        consumer.subscribe(args.topics)
+        while time.monotonic() < end:
+            message = consumer.poll(0.5)
+            if message is None or message.error():
+                continue
+            events = parse(message.headers())
+            for hop, latency in hop_latencies(events, now_ms()).items():
+                latencies[message.topic()][hop].append(latency)
+
+    for topic, topic_latencies in latencies.items():
+        print(f'\n=== {topic} ===')
+        print_histograms(topic_latencies)
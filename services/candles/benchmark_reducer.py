@@ -0,0 +1,116 @@
+"""
+Benchmark of the candle reducer on a synthetic stream of trades.
+
+Compares the dict based reducer we used before with the list based one in `run.py`,
+which also computes the VWAP, number of trades and buy/sell volume.
+
+    uv run python benchmark_reducer.py
+"""
+
+import json
+import random
+import time
+from typing import Callable, List
+
+from run import init_candle, update_candle
+
+N_TRADES = 1_000_000
+CANDLE_SECONDS = 60
+
+
+def legacy_init_candle(trade: dict) -> dict:
+    """
+    Dict based reducer, as it was before the list based one
+    """
+    return {
+        'open': trade['price'],
+        'high': trade['price'],
+        'low': trade['price'],
+        'close': trade['price'],
+        'volume': trade['volume'],
+        'timestamp_ms': trade['timestamp_ms'],
+        'pair': trade['pair'],
+    }
+
+
+def legacy_update_candle(candle: dict, trade: dict) -> dict:
+    candle['close'] = trade['price']
+    candle['high'] = max(candle['high'], trade['price'])
+    candle['low'] = min(candle['low'], trade['price'])
+    candle['volume'] += trade['volume']
+    candle['timestamp_ms'] = trade['timestamp_ms']
+    candle['pair'] = trade['pair']
+    return candle
+
+
+def synthetic_trades(n_trades: int, seed: int = 42) -> List[dict]:
+    """
+    Random walk of trades for a single pair, a few trades per second
+    """
+    rng = random.Random(seed)
+    price = 100_000.0
+    timestamp_ms = 1_733_000_000_000
+    trades = []
+    for _ in range(n_trades):
+        price *= 1 + rng.gauss(0, 1e-4)
+        timestamp_ms += rng.randint(0, 500)
+        trades.append(
+            {
+                'pair': 'BTC/USD',
+                'price': price,
+                'volume': rng.expovariate(10),
+                'timestamp': '',
+                'timestamp_ms': timestamp_ms,
+                'side': rng.choice(('buy', 'sell')),
+            }
+        )
+    return trades
+
+
+def reduce_windows(
+    trades: List[dict], initializer: Callable, reducer: Callable
+) -> List:
+    """
+    Aggregates the trades in tumbling windows, as the Quix Streams window does
+    """
+    window_ms = CANDLE_SECONDS * 1000
+    candles = []
+    window_start_ms = None
+    candle = None
+    for trade in trades:
+        start = trade['timestamp_ms'] - trade['timestamp_ms'] % window_ms
+        if start != window_start_ms:
+            if candle is not None:
+                candles.append(candle)
+            window_start_ms = start
+            candle = initializer(trade)
+        else:
+            candle = reducer(candle, trade)
+    candles.append(candle)
+    return candles
+
+
+def benchmark(name: str, trades: List[dict], initializer, reducer) -> List:
+    start = time.perf_counter()
+    candles = reduce_windows(trades, initializer, reducer)
+    elapsed = time.perf_counter() - start
+
+    state_bytes = sum(len(json.dumps(candle)) for candle in candles) / len(candles)
+    print(
+        f'{name:<8} {elapsed:6.2f} s  {len(trades) / elapsed / 1e6:5.2f} M trades/s  '
+        f'{state_bytes:6.1f} bytes of state per window'
+    )
+    return candles
+
+
+if __name__ == '__main__':
+    trades = synthetic_trades(N_TRADES)
+    print(f'{N_TRADES} trades, {CANDLE_SECONDS} seconds candles')
+
+    legacy = benchmark('dict', trades, legacy_init_candle, legacy_update_candle)
+    compact = benchmark('list', trades, init_candle, update_candle)
+
+    # Both reducers must give the same candles
+    for old, new in zip(legacy, compact, strict=True):
+        assert [old[field] for field in ('open', 'high', 'low', 'close')] == new[:4]
+        assert abs(old['volume'] - new[4]) < 1e-9
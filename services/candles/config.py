@@ -1,5 +1,6 @@
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,10 +9,36 @@ class Config(BaseSettings):
     kafka_broker_address: str
     kafka_input_topic: str
     kafka_output_topic: str
+    kafka_output_topic_codec: Literal['json', 'binary'] = 'json'
     kafka_consumer_group: str
-    candle_seconds: int
+    candle_seconds: List[int]
     emit_incomplete_candles: Optional[bool] = True
     data_source: Literal['live', 'historical', 'test']
+    extra_aggregates: Optional[bool] = False
+    metrics_port: Optional[int] = None
+    # How long the windows stay open for late trades, and the topic of the trades that
+    # arrive after their window closed (they are dropped if there is no topic)
+    window_grace_seconds: Optional[int] = 0
+    kafka_late_trades_topic: Optional[str] = None
+    # Emit flat candles for at most this number of windows of a pair without trades
+    max_candles_to_fill: Optional[int] = 0
+
+    @field_validator('candle_seconds', mode='before')
+    @classmethod
+    def to_list(cls, value):
+        # A single value, e.g. CANDLE_SECONDS=60, is a single resolution
+        return [value] if isinstance(value, int) else value
+
+    @field_validator('candle_seconds')
+    @classmethod
+    def check_multiples(cls, value: List[int]) -> List[int]:
+        # The larger candles are built from the smallest ones
+        value = sorted(set(value))
+        if any(seconds % value[0] for seconds in value):
+            raise ValueError(
+                f'Each candle seconds must be a multiple of {value[0]}, got {value}'
+            )
+        return value
 
 
 config = Config()
@@ -0,0 +1,103 @@
+from typing import Any, Optional
+
+from loguru import logger
+from prometheus_client import Counter
+from quixstreams import State
+from quixstreams.kafka import Producer
+from quixstreams.models import Topic
+
+LATE_TRADES = Counter(
+    'late_trades_total',
+    'Trades older than the latest trade of their pair, aggregated within the grace '
+    'period or dropped',
+    ['outcome'],
+)
+
+
+class LateTradesFilter:
+    """
+    Stateful filter that keeps the trades the tumbling window will still aggregate and
+    sends the ones that are too late to a side topic, instead of letting the window
+    drop them.
+
+    The window of a pair closes when the latest timestamp of the pair passes the end of
+    the window plus the grace period, and from then on the window drops the trades of
+    that window. We keep the same latest timestamp in the state of the pair, so we
+    know which trades the window would drop:
+
+        sdf = sdf.filter(late_trades, stateful=True, metadata=True)
+
+    The late trades within the grace period (e.g. after a reconnection of the
+    WebSocket) still go to their candle, and all the late trades are counted in the
+    `late_trades_total` metric.
+    """
+
+    def __init__(
+        self,
+        window_ms: int,
+        grace_ms: int,
+        producer: Optional[Producer] = None,
+        late_trades_topic: Optional[Topic] = None,
+    ):
+        """
+        Args:
+            window_ms: The size of the tumbling window
+            grace_ms: The grace period of the tumbling window
+            producer: The producer to send the dropped trades with
+            late_trades_topic: The topic to send the dropped trades to, if any
+        """
+        self.window_ms = window_ms
+        self.grace_ms = grace_ms
+        self.producer = producer
+        self.late_trades_topic = late_trades_topic
+
+        self.n_accepted = 0
+        self.n_dropped = 0
+        self._accepted = LATE_TRADES.labels(outcome='accepted')
+        self._dropped = LATE_TRADES.labels(outcome='dropped')
+
+    def __call__(
+        self, value: dict, key: Any, timestamp: int, headers: Any, state: State
+    ) -> bool:
+        latest_timestamp_ms = state.get('latest_timestamp_ms', default=None)
+        if latest_timestamp_ms is None or timestamp > latest_timestamp_ms:
+            state.set('latest_timestamp_ms', timestamp)
+            return True
+        if timestamp == latest_timestamp_ms:
+            return True
+
+        window_start_ms = timestamp - timestamp % self.window_ms
+        if window_start_ms > latest_timestamp_ms - self.window_ms - self.grace_ms:
+            # Late, but its window is still open
+            self.n_accepted += 1
+            self._accepted.inc()
+            return True
+
+        self.n_dropped += 1
+        self._dropped.inc()
+        if self.n_dropped % 1000 == 1:
+            logger.warning(
+                f'{self.n_dropped} trades arrived after their window closed, the '
+                f'last one {latest_timestamp_ms - timestamp} ms late: {value}'
+            )
+        if self.late_trades_topic is not None:
+            message = self.late_trades_topic.serialize(
+                key=key, value=value, headers=headers
+            )
+            self.producer.produce(
+                topic=self.late_trades_topic.name,
+                value=message.value,
+                key=message.key,
+                headers=message.headers,
+            )
+            # Serve the delivery reports without waiting
+            self.producer.poll(0)
+        return False
+
+    def flush(self) -> None:
+        if self.producer is not None:
+            self.producer.flush()
+        logger.info(
+            f'Late trades: {self.n_accepted} within the grace period, '
+            f'{self.n_dropped} after their window closed'
+        )
@@ -1,9 +1,21 @@
 from datetime import timedelta
-from typing import Any, List, Literal, Optional, Tuple
+from typing import Any, List, Literal, Optional, Tuple, Union
 
+from late_trades import LateTradesFilter
 from loguru import logger
-from quixstreams import Application
+from prometheus_client import Counter
+from quixstreams import Application, State
 from quixstreams.models import TimestampType
+from streaming_common.metrics import (
+    MESSAGES_OUT,
+    PROCESSING_SECONDS,
+    STATE_BYTES,
+    app_config,
+    directory_bytes,
+    start_server,
+)
+from streaming_common.serialization import Codec, MessageDeserializer, get_serializer
+from streaming_common.tracing import HopTracer
 
 
 # Timestamp extractor must always return timestamp as an integer in milliseconds.
@@ -20,53 +32,367 @@ def custom_ts_extractor(
     return value['timestamp_ms']
 
 
-def init_candle(trade: dict) -> dict:
+# The state of each window is a fixed-size list instead of a dict, so updating it
+# with a trade only assigns a few slots in place
+OPEN, HIGH, LOW, CLOSE, VOLUME, TIMESTAMP_MS, PAIR = range(7)
+TRADE_COUNT, NOTIONAL, BUY_VOLUME, SELL_VOLUME = range(7, 11)
+
+FILLED_CANDLES = Counter(
+    'filled_candles_total', 'Flat candles emitted for windows without trades'
+)
+
+
+def init_candle(trade: dict) -> list:
     """
     Initialize a candle with the first trade
+
+    If the first trade is a heartbeat of the trades service (zero volume at the last
+    price of the pair), the candle is flat until the first real trade.
     """
-    return {
-        'open': trade['price'],
-        'high': trade['price'],
-        'low': trade['price'],
-        'close': trade['price'],
-        'volume': trade['volume'],
-        'timestamp_ms': trade['timestamp_ms'],
-        'pair': trade['pair'],
-    }
+    price = trade['price']
+    volume = trade['volume']
+    side = trade.get('side')
+    return [
+        price,
+        price,
+        price,
+        price,
+        volume,
+        trade['timestamp_ms'],
+        trade['pair'],
+        1 if volume else 0,
+        price * volume,
+        volume if side == 'buy' else 0.0,
+        volume if side == 'sell' else 0.0,
+    ]
+
 
+def from_dict_candle(candle: dict) -> list:
+    """
+    Converts the state of a window written by a previous version of this service, a
+    dict with the OHLCV, timestamp and pair, to the list we keep now.
 
-def update_candle(candle: dict, trade: dict) -> dict:
+    The old state has no extra aggregates: the trades before the upgrade do not count
+    in the trade count and the buy and sell volume, and their VWAP is the close.
+    """
+    return [
+        candle['open'],
+        candle['high'],
+        candle['low'],
+        candle['close'],
+        candle['volume'],
+        candle['timestamp_ms'],
+        candle['pair'],
+        0,
+        candle['close'] * candle['volume'],
+        0.0,
+        0.0,
+    ]
+
+
+def update_candle(candle: Union[list, dict], trade: dict) -> list:
     """
     Update the candle with the latest trade
+
+    The pair is the same for all the trades of a window (the message key), so it is
+    only set by `init_candle`.
     """
-    candle['close'] = trade['price']
-    candle['high'] = max(
-        candle['high'], trade['price']
-    )  # Max of the candle high (current high of the candle) and new received trade price.
-    candle['low'] = min(
-        candle['low'], trade['price']
-    )  # Max of the candle low (current low of the candle) and new received trade price.
-    candle['volume'] += trade[
-        'volume'
-    ]  # Sum of the candle volume (current volume of the candle) and new received trade volume.
-    candle['timestamp_ms'] = trade['timestamp_ms']
-    candle['pair'] = trade['pair']
+    if isinstance(candle, dict):
+        # a window that was open when we upgraded from the dict state
+        candle = from_dict_candle(candle)
+
+    price = trade['price']
+    volume = trade['volume']
+
+    if not volume:
+        # A heartbeat, it only makes the window of the previous candle close
+        return candle
+    if not candle[VOLUME]:
+        # The first real trade of a window that only had heartbeats
+        return init_candle(trade)
+
+    candle[CLOSE] = price
+    if price > candle[HIGH]:
+        candle[HIGH] = price
+    elif price < candle[LOW]:
+        candle[LOW] = price
+    candle[VOLUME] += volume
+    candle[TIMESTAMP_MS] = trade['timestamp_ms']
+
+    # Extra aggregates: number of trades, VWAP numerator and buy/sell volume
+    candle[TRADE_COUNT] += 1
+    candle[NOTIONAL] += price * volume
+    side = trade.get('side')
+    if side == 'buy':
+        candle[BUY_VOLUME] += volume
+    elif side == 'sell':
+        candle[SELL_VOLUME] += volume
+
     return candle
 
 
+def to_message(window: dict, candle_seconds: int, extra_aggregates: bool) -> dict:
+    """
+    Convert the window emitted by the tumbling window to the candle we send to the
+    output topic
+    """
+    candle = window['value']
+    if isinstance(candle, dict):
+        # a window that was open when we upgraded from the dict state
+        candle = from_dict_candle(candle)
+    message = {
+        'pair': candle[PAIR],
+        'timestamp_ms': candle[TIMESTAMP_MS],
+        'open': candle[OPEN],
+        'high': candle[HIGH],
+        'low': candle[LOW],
+        'close': candle[CLOSE],
+        'volume': candle[VOLUME],
+        'window_start_ms': window['start'],
+        'window_end_ms': window['end'],
+        'candle_seconds': candle_seconds,
+    }
+    if extra_aggregates:
+        message['vwap'] = (
+            candle[NOTIONAL] / candle[VOLUME] if candle[VOLUME] else candle[CLOSE]
+        )
+        message['trade_count'] = candle[TRADE_COUNT]
+        message['buy_volume'] = candle[BUY_VOLUME]
+        message['sell_volume'] = candle[SELL_VOLUME]
+    return message
+
+
+def to_rollup(candle: dict, seconds: int) -> dict:
+    """
+    Initialize the candle of a larger window with a candle of the smallest window
+    """
+    window_ms = seconds * 1000
+    window_start_ms = candle['window_start_ms'] - candle['window_start_ms'] % window_ms
+    return {
+        **candle,
+        'window_start_ms': window_start_ms,
+        'window_end_ms': window_start_ms + window_ms,
+        'candle_seconds': seconds,
+    }
+
+
+def merge_candles(rollup: dict, candle: dict) -> dict:
+    """
+    Update the candle of a larger window with a later candle of the smallest window
+    """
+    merged = {
+        **rollup,
+        'timestamp_ms': candle['timestamp_ms'],
+        'high': max(rollup['high'], candle['high']),
+        'low': min(rollup['low'], candle['low']),
+        'close': candle['close'],
+        'volume': rollup['volume'] + candle['volume'],
+    }
+    if 'vwap' in candle:
+        merged['vwap'] = (
+            (rollup['vwap'] * rollup['volume'] + candle['vwap'] * candle['volume'])
+            / merged['volume']
+            if merged['volume']
+            else candle['vwap']
+        )
+        merged['trade_count'] = rollup['trade_count'] + candle['trade_count']
+        merged['buy_volume'] = rollup['buy_volume'] + candle['buy_volume']
+        merged['sell_volume'] = rollup['sell_volume'] + candle['sell_volume']
+    return merged
+
+
+def flat_candle(candle: dict, window_start_ms: int, close: float) -> dict:
+    """
+    Candle of a window without trades: the price stays at the previous close and the
+    volume is zero
+    """
+    window_end_ms = window_start_ms + candle['candle_seconds'] * 1000
+    flat = {
+        **candle,
+        'timestamp_ms': window_end_ms,
+        'open': close,
+        'high': close,
+        'low': close,
+        'close': close,
+        'volume': 0.0,
+        'window_start_ms': window_start_ms,
+        'window_end_ms': window_end_ms,
+    }
+    if 'vwap' in candle:
+        flat.update(vwap=close, trade_count=0, buy_volume=0.0, sell_volume=0.0)
+    return flat
+
+
+def fill_missing_candles(candle: dict, state: State, max_candles: int) -> List[dict]:
+    """
+    Returns flat candles for the windows of the pair without trades since its last
+    candle, followed by the candle, so every pair has a candle for every window.
+
+    The heartbeats of the trades service give a candle to the windows without trades
+    as they close. This also fills the windows that got no heartbeat, e.g. while the
+    trades service was down, when the pair trades again.
+
+    Args:
+        candle: The latest candle of the smallest window
+        state: The state of our application
+        max_candles: The maximum number of flat candles to fill
+    Returns:
+        The flat candles, from oldest to latest, and the candle
+    """
+    # The window start and end and the close of the last candle of the pair
+    last_window = state.get('last_window', default=None)
+    if last_window is not None and candle['window_start_ms'] < last_window[0]:
+        # A late trade updated a candle of an earlier window
+        return [candle]
+    state.set(
+        'last_window',
+        [candle['window_start_ms'], candle['window_end_ms'], candle['close']],
+    )
+    if last_window is None or candle['window_start_ms'] <= last_window[1]:
+        return [candle]
+
+    last_window_end_ms, last_close = last_window[1], last_window[2]
+    window_ms = candle['candle_seconds'] * 1000
+    n_missing = min(
+        (candle['window_start_ms'] - last_window_end_ms) // window_ms, max_candles
+    )
+    flat_candles = [
+        flat_candle(candle, candle['window_start_ms'] - i * window_ms, last_close)
+        for i in range(n_missing, 0, -1)
+    ]
+    FILLED_CANDLES.inc(len(flat_candles))
+    return [*flat_candles, candle]
+
+
+def fill_and_rollup_candles(
+    candle: dict,
+    state: State,
+    rollup_seconds: List[int],
+    emit_incomplete_candles: bool,
+    max_candles_to_fill: int,
+) -> List[dict]:
+    """
+    Fills the windows without trades before the candle with flat candles, and builds
+    the larger candles from them and from the candle
+    """
+    candles = (
+        fill_missing_candles(candle, state, max_candles_to_fill)
+        if max_candles_to_fill
+        else [candle]
+    )
+    if not rollup_seconds:
+        return candles
+    return [
+        rolled
+        for filled in candles
+        for rolled in rollup_candles(
+            filled, state, rollup_seconds, emit_incomplete_candles
+        )
+    ]
+
+
+def rollup_candles(
+    candle: dict,
+    state: State,
+    rollup_seconds: List[int],
+    emit_incomplete_candles: bool,
+) -> List[dict]:
+    """
+    Builds the candles of the larger windows from the candles of the smallest window,
+    so all the resolutions come from a single pass over the trades.
+
+    For each larger window we keep in the state the aggregate of the completed candles
+    of the smallest window. A candle is completed when it is final or, if we emit
+    incomplete candles, when we get the first candle of the next window.
+
+    With a grace period and incomplete candles, a late trade can update a candle of
+    the smallest window after we got the first candle of the next window. We emit
+    the updated candle, but we do not add it to the larger candles again. Emit only
+    the final candles to get exact larger candles with late trades.
+
+    Args:
+        candle: The latest candle of the smallest window
+        state: The state of our application
+        rollup_seconds: The seconds of the larger candles
+        emit_incomplete_candles: Emit all intermediate candles or just the final ones
+    Returns:
+        The latest candle followed by the candles of the larger windows to emit
+    """
+    candles = [candle]
+
+    if emit_incomplete_candles:
+        last_candle = state.get('last_candle', default=None)
+        if (
+            last_candle is not None
+            and candle['window_start_ms'] < last_candle['window_start_ms']
+        ):
+            # A late trade updated a candle that was already completed
+            return candles
+        state.set('last_candle', candle)
+        completed = (
+            last_candle
+            if last_candle is not None
+            and last_candle['window_start_ms'] != candle['window_start_ms']
+            else None
+        )
+    else:
+        completed = candle
+
+    for seconds in rollup_seconds:
+        key = f'rollup_{seconds}'
+        rollup: Optional[dict] = state.get(key, default=None)
+
+        if completed is not None:
+            part = to_rollup(completed, seconds)
+            if (
+                rollup is not None
+                and rollup['window_start_ms'] != part['window_start_ms']
+            ):
+                # There were no trades in the last windows of the previous larger
+                # window, so it was not emitted yet
+                if not emit_incomplete_candles:
+                    candles.append(rollup)
+                rollup = None
+            rollup = part if rollup is None else merge_candles(rollup, completed)
+
+        current = to_rollup(candle, seconds)
+        if emit_incomplete_candles:
+            if (
+                rollup is not None
+                and rollup['window_start_ms'] != current['window_start_ms']
+            ):
+                rollup = None
+            candles.append(current if rollup is None else merge_candles(rollup, candle))
+        elif candle['window_end_ms'] == current['window_end_ms']:
+            # The candle closes the larger window
+            candles.append(rollup)
+            rollup = None
+
+        state.set(key, rollup)
+
+    return candles
+
+
 def main(
     kafka_broker_address: str,
     kafka_input_topic: str,
     kafka_output_topic: str,
     kafka_consumer_group: str,
-    candle_seconds: int,
+    candle_seconds: List[int],
     emit_incomplete_candles: bool,
     data_source: Literal['live', 'historical', 'test'],
+    extra_aggregates: bool = False,
+    kafka_output_topic_codec: Codec = 'json',
+    metrics_port: Optional[int] = None,
+    window_grace_seconds: int = 0,
+    kafka_late_trades_topic: Optional[str] = None,
+    max_candles_to_fill: int = 0,
 ):
     """
     3 steps:
     1. Ingests trades from Kafka
-    2. Generates candles using tumbling windows and
+    2. Generates candles using tumbling windows of the smallest candle seconds, and
+       builds the candles of the larger windows from them
     3. Outputs candles to Kafka
 
     Args:
@@ -74,9 +400,20 @@ def main(
         kafka_input_topic (str): Kafka input topic
         kafka_output_topic (str): Kafka output topic
         kafka_consumer_group (str): Kafka consumer group
-        candle_seconds (int): Candle seconds
+        candle_seconds (List[int]): Candle seconds of each resolution, sorted, each one
+            a multiple of the first one
         emit_incomplete_candles (bool): Emit incomplete candles or just the final one
         data_source (Literal['live', 'historical', 'test']): Data source
+        extra_aggregates (bool): Add the VWAP, number of trades and buy/sell volume to
+            the candles
+        kafka_output_topic_codec (Codec): The codec of the candles, 'json' or 'binary'
+        metrics_port (Optional[int]): Serve the Prometheus metrics on this port
+        window_grace_seconds (int): How long the windows of the smallest candles stay
+            open for late trades after their end
+        kafka_late_trades_topic (Optional[str]): Kafka topic to send the trades that
+            arrive after their window closed to, instead of dropping them
+        max_candles_to_fill (int): Emit flat candles for at most this number of
+            windows without trades before each candle of a pair
 
     Returns:
         None
@@ -92,28 +429,60 @@ def main(
         auto_offset_reset='latest'
         if data_source == 'live'
         else 'earliest',  # If test or historical, start fetching data from the beginning (first message in the topic)
+        # Count the messages and errors and track the consumer lag
+        **app_config(),
     )
 
+    STATE_BYTES.set_function(lambda: directory_bytes(app.config.state_dir))
+    start_server(metrics_port)
+
     # Define the input and output topics
     input_topic = app.topic(
         name=kafka_input_topic,
-        value_deserializer='json',
+        value_deserializer=MessageDeserializer(),  # Reads JSON and binary trades
         timestamp_extractor=custom_ts_extractor,  # To use the "timestamp_ms" in window aggregations
     )
 
     output_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_topic_codec, 'candle'),
     )
 
     # Create a Streaming DataFrame from the input topic
     sdf = app.dataframe(topic=input_topic)
 
+    # Count the trades that arrive out of order, and send the ones the window would
+    # drop to the late trades topic
+    late_trades = LateTradesFilter(
+        window_ms=candle_seconds[0] * 1000,
+        grace_ms=window_grace_seconds * 1000,
+        producer=app.get_producer() if kafka_late_trades_topic else None,
+        late_trades_topic=app.topic(
+            name=kafka_late_trades_topic, value_serializer='json'
+        )
+        if kafka_late_trades_topic
+        else None,
+    )
+    sdf = sdf.filter(late_trades, stateful=True, metadata=True)
+
+    # Keep the trace headers of the trades, the window drops them
+    tracer = HopTracer('candles')
+    sdf = sdf.update(tracer.on_input, metadata=True)
+
     sdf = (
-        # Define a tumbling window of 10 minutes
-        sdf.tumbling_window(timedelta(seconds=candle_seconds))
+        # Define a tumbling window of the smallest candle seconds, that stays open
+        # for late trades during the grace period
+        sdf.tumbling_window(
+            timedelta(seconds=candle_seconds[0]),
+            grace_ms=timedelta(seconds=window_grace_seconds),
+        )
         # Create a "reduce" aggregation with "reducer" and "initializer" functions
-        .reduce(reducer=update_candle, initializer=init_candle)
+        .reduce(
+            reducer=PROCESSING_SECONDS.labels(step='update_candle').time()(
+                update_candle
+            ),
+            initializer=init_candle,
+        )
     )
 
     if emit_incomplete_candles:
@@ -123,48 +492,45 @@ def main(
         # Emit only the final candle
         sdf = sdf.final()
 
-    # Extract open, high, low, close, volume, timestamp_ms, pair from the dataframe
-    # to make them keys and not being nested in the value
-    sdf['open'] = sdf['value']['open']
-    sdf['high'] = sdf['value']['high']
-    sdf['low'] = sdf['value']['low']
-    sdf['close'] = sdf['value']['close']
-    sdf['volume'] = sdf['value']['volume']
-    sdf['timestamp_ms'] = sdf['value']['timestamp_ms']
-    sdf['pair'] = sdf['value']['pair']
-
-    # Extract window start and end timestamps
-    sdf['window_start_ms'] = sdf['start']
-    sdf['window_end_ms'] = sdf['end']
-
-    # Keep only the relevant columns
-    sdf = sdf[
-        [
-            'pair',
-            'timestamp_ms',
-            'open',
-            'high',
-            'low',
-            'close',
-            'volume',
-            'window_start_ms',
-            'window_end_ms',
-        ]
-    ]
+    # Convert the window to a flat candle with pair, timestamp_ms, open, high, low,
+    # close, volume, window start and end timestamps and candle_seconds
+    sdf = sdf.apply(
+        lambda window: to_message(window, candle_seconds[0], extra_aggregates)
+    )
 
-    # We add the candle_seconds to the dataframe
-    sdf['candle_seconds'] = candle_seconds
+    if len(candle_seconds) > 1 or max_candles_to_fill:
+        # Fill the windows of the pair without trades with flat candles, and build
+        # the larger candles from the smallest ones instead of consuming the trades
+        # again for each resolution
+        sdf = sdf.apply(
+            lambda candle, state: fill_and_rollup_candles(
+                candle,
+                state,
+                candle_seconds[1:],
+                emit_incomplete_candles,
+                max_candles_to_fill,
+            ),
+            stateful=True,
+            expand=True,
+        )
 
-    # With the following line, we can see the candle values in the logs
-    # Otherwise you only see them in the output topic in Redpanda
-    sdf = sdf.update(lambda value: logger.info(f'Candle: {value}'))
+    # Count the candles instead of logging each one, see the candles in the output
+    # topic in Redpanda
+    candles_out = MESSAGES_OUT.labels(topic=kafka_output_topic)
+    sdf = sdf.update(lambda _: candles_out.inc())
     # sdf = sdf.update(lambda value: breakpoint()) # Set to current() instead of final() above to see the candle values in the logs
 
+    # Add the trace headers of the trade that emitted the candle and our own ones
+    sdf = sdf.set_headers(tracer.on_output)
+
     # Push the candle to the output topic
     sdf = sdf.to_topic(topic=output_topic)
 
     # Start the application
-    app.run()
+    try:
+        app.run()
+    finally:
+        late_trades.flush()
 
 
 if __name__ == '__main__':
@@ -178,4 +544,10 @@ if __name__ == '__main__':
         candle_seconds=config.candle_seconds,
         emit_incomplete_candles=config.emit_incomplete_candles,
         data_source=config.data_source,
+        extra_aggregates=config.extra_aggregates,
+        kafka_output_topic_codec=config.kafka_output_topic_codec,
+        metrics_port=config.metrics_port,
+        window_grace_seconds=config.window_grace_seconds,
+        kafka_late_trades_topic=config.kafka_late_trades_topic,
+        max_candles_to_fill=config.max_candles_to_fill,
     )
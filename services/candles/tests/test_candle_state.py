@@ -0,0 +1,52 @@
+"""
+The windows stored in the state by the dict based reducer still update and close
+after the upgrade to the list state.
+"""
+
+from run import to_message, update_candle
+
+DICT_CANDLE = {
+    'open': 100.0,
+    'high': 110.0,
+    'low': 90.0,
+    'close': 105.0,
+    'volume': 2.0,
+    'timestamp_ms': 1_000,
+    'pair': 'BTC/USD',
+}
+
+
+def test_update_dict_candle():
+    trade = {
+        'pair': 'BTC/USD',
+        'price': 120.0,
+        'volume': 1.0,
+        'timestamp_ms': 2_000,
+        'side': 'buy',
+    }
+
+    candle = update_candle(dict(DICT_CANDLE), trade)
+    message = to_message({'value': candle, 'start': 0, 'end': 60_000}, 60, True)
+
+    assert message['open'] == 100.0
+    assert message['high'] == 120.0
+    assert message['low'] == 90.0
+    assert message['close'] == 120.0
+    assert message['volume'] == 3.0
+    assert message['timestamp_ms'] == 2_000
+    assert message['trade_count'] == 1
+    assert message['buy_volume'] == 1.0
+    assert message['vwap'] == (105.0 * 2.0 + 120.0) / 3.0
+
+
+def test_close_dict_candle():
+    message = to_message(
+        {'value': dict(DICT_CANDLE), 'start': 0, 'end': 60_000}, 60, False
+    )
+
+    assert message == {
+        **DICT_CANDLE,
+        'window_start_ms': 0,
+        'window_end_ms': 60_000,
+        'candle_seconds': 60,
+    }
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,10 +9,13 @@ class Config(BaseSettings):
     kafka_broker_address: str
     kafka_input_topic: str
     kafka_output_topic: str
+    kafka_output_topic_codec: Literal['json', 'binary'] = 'json'
     kafka_consumer_group: str
 
     model: Literal['anthropic', 'ollama', 'dummy']
     data_source: Literal['live', 'historical']
 
+    metrics_port: Optional[int] = None
+
 
 config = Config()
@@ -3,16 +3,23 @@ from typing import List, Literal, Optional
 from llms.base import BaseNewsSignalExtractor
 from loguru import logger
 from quixstreams import Application
+from streaming_common.metrics import (
+    LLM_CALL_SECONDS,
+    MESSAGES_OUT,
+    app_config,
+    start_server,
+)
+from streaming_common.serialization import Codec, get_serializer
+from streaming_common.tracing import HopTracer
 
 
 def add_signal_to_news(value: dict) -> dict:
     """
     From the given news in value['title'] extract the news signal using the LLM.
     """
-    logger.debug(f'Extracting news signal from {value["title"]}')
-    logger.debug(f'Extracting news signal from {value["title"]}')
-    news_signal: List[dict] = llm.get_signal(value['title'], output_format='list')
-    print(news_signal)
+    logger.debug('Extracting news signal from {}', value['title'])
+    with LLM_CALL_SECONDS.labels(model=config.model).time():
+        news_signal: List[dict] = llm.get_signal(value['title'], output_format='list')
 
     # breakpoint()
     # A news_signal might have multiple coins, e.g.
@@ -64,6 +71,8 @@ def main(
     llm: BaseNewsSignalExtractor,
     data_source: Literal['live', 'historical', 'test'],
     debug: Optional[bool] = False,
+    kafka_output_topic_codec: Codec = 'json',
+    metrics_port: Optional[int] = None,
 ):
     logger.info('Hello from news-signal!')
 
@@ -79,7 +88,10 @@ def main(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='latest' if data_source == 'live' else 'earliest',
+        # Count the messages and errors and track the consumer lag
+        **app_config(),
     )
+    start_server(metrics_port)
 
     input_topic = app.topic(
         name=kafka_input_topic,
@@ -88,11 +100,14 @@ def main(
 
     output_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_topic_codec, 'news_signal'),
     )
 
     sdf = app.dataframe(input_topic)
 
+    tracer = HopTracer('news-signal')
+    sdf = sdf.update(tracer.on_input, metadata=True)
+
     # expand=True will expand the collection (e.g. list or tuple).
     # Useful when the output of the function has a list
     # with more than one currency.
@@ -108,7 +123,12 @@ def main(
     #     }
     # )
 
-    sdf = sdf.update(lambda value: logger.debug(f'Final message: {value}'))
+    # Count the signals instead of logging each one
+    signals_out = MESSAGES_OUT.labels(topic=kafka_output_topic)
+    sdf = sdf.update(lambda _: signals_out.inc())
+
+    # Add the times we got the news and produced its signals
+    sdf = sdf.set_headers(tracer.on_output)
 
     sdf = sdf.to_topic(output_topic)
 
@@ -129,4 +149,6 @@ if __name__ == '__main__':
         kafka_consumer_group=config.kafka_consumer_group,
         llm=llm,
         data_source=config.data_source,
+        kafka_output_topic_codec=config.kafka_output_topic_codec,
+        metrics_port=config.metrics_port,
     )
@@ -1,5 +1,8 @@
+from typing import Optional
+
 from loguru import logger
 from quixstreams import Application
+from streaming_common.metrics import MESSAGES_OUT, app_config, start_server
 
 from sources import NewsDataSource
 
@@ -8,6 +11,7 @@ def main(
     kafka_broker_address: str,
     kafka_topic: str,
     news_source: NewsDataSource,
+    metrics_port: Optional[int] = None,
 ):
     """
     Gets news from Cryptopanic and pushes it to a Kafka topic.
@@ -16,12 +20,18 @@ def main(
         kafka_broker_address: The address of the Kafka broker.
         kafka_topic: The topic to push the news to.
         news_source: The news source to get the news from.
+        metrics_port: Serve the Prometheus metrics on this port.
     Returns:
         None
     """
     logger.info('Hello from news!')
 
-    app = Application(broker_address=kafka_broker_address)
+    app = Application(
+        broker_address=kafka_broker_address,
+        # Count the messages and errors and track the consumer lag
+        **app_config(),
+    )
+    start_server(metrics_port)
 
     # Topic where we will push the news to
     output_topic = app.topic(name=kafka_topic, value_serializer='json')
@@ -29,8 +39,9 @@ def main(
     # Create the streaming dataframe
     sdf = app.dataframe(source=news_source)
 
-    # Let's print to check this thing is working
-    sdf.print(metadata=True)
+    # Count the news instead of printing each one
+    news_out = MESSAGES_OUT.labels(topic=kafka_topic)
+    sdf = sdf.update(lambda _: news_out.inc())
 
     # Send the final messages to the output topic
     sdf = sdf.to_topic(output_topic)
@@ -65,4 +76,5 @@ if __name__ == '__main__':
         kafka_broker_address=config.kafka_broker_address,
         kafka_topic=config.kafka_topic,
         news_source=news_source,
+        metrics_port=config.metrics_port,
     )
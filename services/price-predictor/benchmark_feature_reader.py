@@ -0,0 +1,221 @@
+"""
+Benchmark of the preprocessing of the `FeatureReader` on synthetic training data.
+
+Compares the merge based preprocessing we used before, which filtered and merged the
+data once per pair and merged it again with itself for the target, with the pivot
+based `preprocess_features`, and prints the time and the peak memory of each. It also
+compares the time per prediction of the `FeatureVectorPlan` and of the preprocessing
+at inference:
+
+    uv run python benchmark_feature_reader.py
+
+`tests/test_feature_reader.py` checks they give the same features and target.
+"""
+
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from feature_reader import preprocess_features
+from feature_vector import FeatureVectorPlan
+
+DAYS = 90
+CANDLE_SECONDS = 60
+PREDICTION_SECONDS = 300
+N_REPEATS = 5
+N_PREDICTIONS = 2000
+PAIRS = ['BTC/USD', 'ETH/USD', 'SOL/USD', 'XRP/USD']
+TECHNICAL_INDICATORS = [
+    'rsi_9',
+    'rsi_14',
+    'rsi_21',
+    'macd',
+    'macd_signal',
+    'macd_hist',
+    'bbands_upper',
+    'bbands_middle',
+    'bbands_lower',
+    'stochrsi_fastk',
+    'stochrsi_fastd',
+    'adx',
+    'volume_ema',
+    'ichimoku_conv',
+    'ichimoku_base',
+    'ichimoku_span_a',
+    'ichimoku_span_b',
+    'mfi',
+    'atr',
+    'price_roc',
+    'sma_7',
+    'sma_14',
+    'sma_21',
+]
+
+
+def legacy_preprocess_features(
+    data: pd.DataFrame,
+    pairs: list[str],
+    technical_indicators: list[str],
+    prediction_seconds: int,
+    add_target_column: bool,
+) -> pd.DataFrame:
+    """
+    Merge based preprocessing, as it was before the pivot based one
+    """
+    df_all = None
+    for pair in pairs:
+        df = data[data['pair'] == pair]
+        df = df[
+            ['pair', 'window_end_ms', 'open', 'close']
+            + technical_indicators
+            + ['news_signals_signal']
+        ]
+        if df_all is not None:
+            df_all = df_all.merge(
+                df, on='window_end_ms', how='left', suffixes=('', f'_{pair}')
+            )
+        else:
+            df_all = df
+
+    if add_target_column:
+        df_target = df_all[['window_end_ms', 'close']].copy()
+        df_target['window_end_ms'] = (
+            df_target['window_end_ms'] - prediction_seconds * 1000
+        )
+        df_all = df_all.merge(
+            df_target, on='window_end_ms', how='left', suffixes=('', '_target')
+        )
+        df_all = df_all[df_all['close_target'].notna()]
+        df_all = df_all.rename(columns={'close_target': 'target'})
+
+    df_all = df_all.rename(columns={'window_end_ms': 'timestamp_ms'})
+    df_all = df_all.sort_values(by='timestamp_ms')
+    df_all = df_all.drop(
+        columns=[col for col in df_all.columns if col.startswith('pair')]
+    )
+    return df_all
+
+
+def synthetic_features(days: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Rows of the feature view for each pair and candle, with the columns we do not
+    use, some candles missing for the other pairs and some missing values
+    """
+    rng = np.random.default_rng(seed)
+    n_candles = days * 24 * 3600 // CANDLE_SECONDS
+    window_end_ms = 1_733_000_000_000 + CANDLE_SECONDS * 1000 * np.arange(n_candles)
+
+    frames = []
+    for i, pair in enumerate(PAIRS):
+        # the first pair has every candle, the others miss some
+        keep = rng.random(n_candles) > (0 if i == 0 else 0.05)
+        n = int(keep.sum())
+        close = 100.0 * (i + 1) * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+        frame = {
+            'pair': pair,
+            'candle_seconds': CANDLE_SECONDS,
+            'window_start_ms': window_end_ms[keep] - CANDLE_SECONDS * 1000,
+            'window_end_ms': window_end_ms[keep],
+            'timestamp_ms': window_end_ms[keep] - rng.integers(1, 1000, n),
+            'open': close * (1 + rng.normal(0, 1e-4, n)),
+            'high': close * 1.001,
+            'low': close * 0.999,
+            'close': close,
+            'volume': rng.exponential(1.0, n),
+        }
+        for indicator in TECHNICAL_INDICATORS:
+            values = rng.normal(50, 10, n)
+            values[rng.random(n) < 0.01] = np.nan
+            frame[indicator] = values
+        frame['news_signals_coin'] = pair.split('/')[0]
+        frame['news_signals_model_name'] = 'dummy'
+        frame['news_signals_signal'] = rng.integers(-1, 2, n).astype('float64')
+        frames.append(pd.DataFrame(frame))
+
+    # the rows of all the pairs in the order they were written
+    data = pd.concat(frames, ignore_index=True)
+    return data.sort_values('window_end_ms', kind='stable', ignore_index=True)
+
+
+def benchmark(name: str, function: Callable, data: pd.DataFrame) -> pd.DataFrame:
+    def run() -> pd.DataFrame:
+        return function(
+            data,
+            pairs=PAIRS,
+            technical_indicators=TECHNICAL_INDICATORS,
+            prediction_seconds=PREDICTION_SECONDS,
+            add_target_column=True,
+        )
+
+    start = time.perf_counter()
+    for _ in range(N_REPEATS):
+        features = run()
+    elapsed = (time.perf_counter() - start) / N_REPEATS
+
+    # tracing the allocations slows it down, so we measure the memory apart
+    tracemalloc.start()
+    run()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f'{name:<6} {elapsed:6.3f} s  {peak_bytes / 1e6:8.1f} MB peak  '
+        f'{features.memory_usage(deep=True).sum() / 1e6:8.1f} MB output'
+    )
+    return features
+
+
+if __name__ == '__main__':
+    logger.remove()
+
+    data = synthetic_features(DAYS)
+    print(
+        f'{DAYS} days of {CANDLE_SECONDS} seconds candles, {len(PAIRS)} pairs, '
+        f'{len(data)} rows, {data.memory_usage(deep=True).sum() / 1e6:.1f} MB'
+    )
+
+    benchmark('merge', legacy_preprocess_features, data)
+    benchmark('pivot', preprocess_features, data)
+
+    # The feature vector of each prediction, built with pandas and with the plan, from
+    # the raw features of the pairs at random windows, sometimes not the same one
+    plan = FeatureVectorPlan(PAIRS, TECHNICAL_INDICATORS)
+    rng = np.random.default_rng(0)
+    rows_by_pair = {
+        pair: rows.to_dict(orient='records') for pair, rows in data.groupby('pair')
+    }
+    predictions = []
+    for _ in range(N_PREDICTIONS):
+        i = int(rng.integers(0, len(rows_by_pair[PAIRS[0]]) - 1))
+        predictions.append(
+            {
+                pair: rows[min(i + int(rng.random() < 0.1), len(rows) - 1)]
+                for pair, rows in rows_by_pair.items()
+            }
+        )
+
+    start = time.perf_counter()
+    dataframes = [
+        preprocess_features(
+            pd.DataFrame(list(rows.values())),
+            PAIRS,
+            TECHNICAL_INDICATORS,
+            PREDICTION_SECONDS,
+            False,
+        )
+        for rows in predictions
+    ]
+    pandas_us = (time.perf_counter() - start) / N_PREDICTIONS * 1e6
+
+    start = time.perf_counter()
+    vectors = [plan.assemble(rows).copy() for rows in predictions]
+    plan_us = (time.perf_counter() - start) / N_PREDICTIONS * 1e6
+
+    print(
+        f'Feature vector: {pandas_us:.0f} us with pandas, {plan_us:.1f} us with the '
+        'plan'
+    )
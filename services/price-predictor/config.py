@@ -1,6 +1,6 @@
 from typing import Literal, Optional
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -31,6 +31,17 @@ class TrainingConfig(BaseSettings):
         description='The name of the LLM model to use for the news signals'
     )
 
+    training_data_cache_dir: Optional[str] = Field(
+        default=None,
+        description='The folder of the local cache of the training data, or None to '
+        'read all the training data from the feature store',
+    )
+    training_data_chunk_days: Optional[int] = Field(
+        default=None,
+        description='The number of days of training data to read and preprocess at a '
+        'time, or None to read it all at once',
+    )
+
     # hyperparameter tuning
     hyperparameter_tuning_search_trials: Optional[int] = Field(
         default=0,
@@ -64,11 +75,24 @@ class InferenceConfig(BaseSettings):
 
     model_config = SettingsConfigDict(env_file='inference.settings.env')
 
-    # pair and frequency for which we want to predict
-    pair_to_predict: str = Field(description='The pair to train the model on')
+    # pairs and frequency for which we want to predict. One process serves the models
+    # of all the pairs and prediction seconds
+    pairs_to_predict: Optional[list[str]] = Field(
+        default=None, description='The pairs to predict'
+    )
     candle_seconds: int = Field(description='The number of seconds per candle')
-    prediction_seconds: int = Field(
-        description='The number of seconds into the future to predict'
+    predictions_seconds: Optional[list[int]] = Field(
+        default=None,
+        description='The numbers of seconds into the future to predict for every pair',
+    )
+
+    # a single pair or prediction seconds, instead of `pairs_to_predict` or
+    # `predictions_seconds`
+    pair_to_predict: Optional[str] = Field(
+        default=None, description='The pair to predict'
+    )
+    prediction_seconds: Optional[int] = Field(
+        default=None, description='The number of seconds into the future to predict'
     )
 
     # environment of the model we want to use for inference
@@ -89,12 +113,48 @@ class InferenceConfig(BaseSettings):
         description='The consumer group to use for the kafka consumer'
     )
 
+    # To keep the latest features in memory instead of reading them from the online
+    # feature store for every prediction
+    kafka_technical_indicators_topic: Optional[str] = Field(
+        default=None,
+        description='The topic of the technical indicators, to keep the latest '
+        'technical indicators of each pair in memory',
+    )
+    kafka_news_signals_topic: Optional[str] = Field(
+        default=None,
+        description='The topic of the news signals, to keep the latest news signal of '
+        'each coin in memory',
+    )
+
     # Elastic Search config
     elasticsearch_url: str = Field(description='The URL of the Elastic Search instance')
     elasticsearch_index: str = Field(
         description='The index to write the predictions to'
     )
 
+    # Prometheus metrics
+    metrics_port: Optional[int] = Field(
+        default=None, description='The port to serve the Prometheus metrics on'
+    )
+
+    @model_validator(mode='after')
+    def single_source(self) -> 'InferenceConfig':
+        # The pairs and the prediction seconds are set once, as a list or as a single
+        # value
+        for many, one in [
+            ('pairs_to_predict', 'pair_to_predict'),
+            ('predictions_seconds', 'prediction_seconds'),
+        ]:
+            if getattr(self, many) is not None and getattr(self, one) is not None:
+                raise ValueError(
+                    f'Set either {many.upper()} or {one.upper()}, not both'
+                )
+            if getattr(self, many) is None:
+                if getattr(self, one) is None:
+                    raise ValueError(f'Set {many.upper()} or {one.upper()}')
+                setattr(self, many, [getattr(self, one)])
+        return self
+
 
 inference_config = InferenceConfig()
 
@@ -110,4 +170,4 @@ class CometMlCredentials(BaseSettings):
     workspace: str
 
 hopsworks_credentials = HopsworksCredentials()
-comet_ml_credentials = CometMlCredentials()
\ No newline at end of file
+comet_ml_credentials = CometMlCredentials()
@@ -1,443 +1,101 @@
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
 
 import hopsworks
+import numpy as np
 import pandas as pd
 from hsfs.feature_group import FeatureGroup
 from hsfs.feature_store import FeatureStore
 from hsfs.feature_view import FeatureView
 from loguru import logger
 
+from feature_vector import feature_columns, pair_features
+from online_features import OnlineFeatureCache
+from training_cache import TrainingDataCache
 
-class FeatureReader:
+
+def preprocess_features(
+    data: pd.DataFrame,
+    pairs: list[str],
+    technical_indicators: list[str],
+    prediction_seconds: int,
+    add_target_column: bool,
+) -> pd.DataFrame:
     """
-    Reads features from our 2 features groups
-    - technical_indicators
-    - news_signals
-    and preprocess it so that it has the format (features, target) we need for
-    training and for inference.
+    Horizontally stacks the features of each pair, matching the `window_end_ms`, and
+    adds the `close` of the first pair `prediction_seconds` later as the target.
+
+    The features of all the pairs are pivoted at once into a (pair, feature,
+    timestamp) array, and the target is looked up by position in the sorted timestamps,
+    instead of filtering and merging the data once per pair and merging it again with
+    itself for the target. Each feature is cast to float32 as we copy it into the
+    array, so we never copy the raw data in float64.
+
+    The rows are the timestamps of the first pair, sorted. The columns are
+    `timestamp_ms`, the features of the first pair, the features of each other pair
+    with the suffix `_{pair}` and the `target`. If the data has several rows for the
+    same pair and timestamp, only one of them is kept.
+
+    Args:
+        data: The raw features from the Feature Store.
+        pairs: The pairs whose features we stack, the pair to predict first.
+        technical_indicators: The technical indicators to use as features.
+        prediction_seconds: How far in the future the target is.
+        add_target_column: Whether to add the target column to the features.
+
+    Returns:
+        The features and possibly targets.
     """
-
-    def __init__(
-        self,
-        hopsworks_project_name: str,
-        hopsworks_api_key: str,
-        feature_view_name: str,
-        feature_view_version: int,
-        pair_to_predict: str,
-        candle_seconds: int,
-        pairs_as_features: list[str],
-        technical_indicators_as_features: list[str],
-        prediction_seconds: int,
-        llm_model_name_news_signals: str,
-        # Optional. Only required if the feature view above does not exist and needs
-        # to be created
-        technical_indicators_feature_group_name: Optional[str] = None,
-        technical_indicators_feature_group_version: Optional[int] = None,
-        news_signals_feature_group_name: Optional[str] = None,
-        news_signals_feature_group_version: Optional[int] = None,
-    ):
-        """ """
-        self.pair_to_predict = pair_to_predict
-        self.candle_seconds = candle_seconds
-        self.pairs_as_features = pairs_as_features
-        self.technical_indicators_as_features = technical_indicators_as_features
-        self.prediction_seconds = prediction_seconds
-        self.llm_model_name_news_signals = llm_model_name_news_signals
-
-        # connect to the Hopsworks Feature Store
-        self._feature_store = self._get_feature_store(
-            hopsworks_project_name,
-            hopsworks_api_key,
-        )
-
-        if technical_indicators_feature_group_name is not None:
-            logger.info(
-                f'Attempt to create the feature view {feature_view_name}-{feature_view_version}'
-            )
-            self._feature_view = self._create_feature_view(
-                feature_view_name,
-                feature_view_version,
-                technical_indicators_feature_group_name,
-                technical_indicators_feature_group_version,
-                news_signals_feature_group_name,
-                news_signals_feature_group_version,
-            )
-        else:
-            self._feature_view = self._get_feature_view(
-                feature_view_name,
-                feature_view_version,
-            )
-
-    def _get_feature_group(self, name: str, version: int) -> FeatureGroup:
-        """
-        Returns a feature group object given its name and version.
-        """
-        return self._feature_store.get_feature_group(
-            name=name,
-            version=version,
-        )
-
-    def _create_feature_view(
-        self,
-        feature_view_name: str,
-        feature_view_version: int,
-        technical_indicators_feature_group_name: str,
-        technical_indicators_feature_group_version: int,
-        news_signals_feature_group_name: str,
-        news_signals_feature_group_version: int,
-    ) -> FeatureView:
-        # we get the 2 features groups we need to join
-        technical_indicators_fg = self._get_feature_group(
-            technical_indicators_feature_group_name,
-            technical_indicators_feature_group_version,
-        )
-        print(f'A: {technical_indicators_fg}')
-
-        news_signals_fg = self._get_feature_group(
-            news_signals_feature_group_name,
-            news_signals_feature_group_version,
-        )
-        print(f'B: {news_signals_fg}')
-
-        # # Query in 3-steps
-        # # Step 1. Filter rows from news_signals_fg for the model_name we need and drop the model_name column
-        # news_signal_query = news_signals_fg \
-        #     .select_all() \
-        #     .filter(news_signals_fg.model_name == self.llm_model_name_news_signals)
-
-        # # Step 2. Filter rows from technical_indicators_fg for the candle_seconds we need
-        # technical_indicators_query = technical_indicators_fg \
-        #     .select_all() \
-        #     .filter(technical_indicators_fg.candle_seconds == self.candle_seconds) \
-
-        # # Step 3. Join the 2 queries on the `coin` column
-        # query = technical_indicators_query.join(
-        #     news_signal_query,
-        #     on=["coin"],
-        #     join_type="left",
-        #     prefix='news_signals_',
-        # )
-
-        # # Attempt to create the feature view in one query
-        # Query to create a new feature view
-        query = (
-            technical_indicators_fg.select_all()
-            .join(
-                news_signals_fg.select_all(),
-                on=['coin'],
-                join_type='left',
-                prefix='news_signals_',
-            )
-            .filter(
-                (technical_indicators_fg.candle_seconds == self.candle_seconds)
-                & (news_signals_fg.model_name == self.llm_model_name_news_signals)
-            )
-        )
-
-        # Query to view the existing feature view
-        query = technical_indicators_fg.select_all().join(
-            news_signals_fg.select_all(),
-            on=['coin'],
-            join_type='left',
-            prefix='news_signals_',
-            # ) \
-            # .filter(
-            #     (technical_indicators_fg.candle_seconds == self.candle_seconds) & \
-            #     (news_signals_fg.model_name == self.llm_model_name_news_signals)
-        )
-
-        # # # TODO: remove this once we have the correct query
-        # query = technical_indicators_fg.select_all().filter(
-        #     technical_indicators_fg.candle_seconds == self.candle_seconds
-        # )
-
-        # # This query works
-        # query = technical_indicators_fg \
-        #     .select_all(
-        #         ["pair", "timestamp_ms", "close", "candle_seconds"]
-        #     )
-
-        # attempt to create the feature view
-        feature_view = self._feature_store.create_feature_view(
-            name=feature_view_name,
-            version=feature_view_version,
-            query=query,
-            # logging_enabled=True,
-        )
-        logger.info(f'Feature view {feature_view_name}-{feature_view_version} created')
-
-        # breakpoint()
-        return feature_view
-
-    def _get_feature_view(
-        self, feature_view_name: str, feature_view_version: int
-    ) -> FeatureView:
-        """
-        Returns a feature view object given its name and version.
-        """
-        # raise NotImplementedError('Feature view creation is not supported yet')
-        return self._feature_store.get_feature_view(
-            name=feature_view_name,
-            version=feature_view_version,
-        )
-
-    def _get_feature_store(self, project_name: str, api_key: str) -> FeatureStore:
-        """
-        Returns a feature store object.
-        """
-        logger.info('Getting feature store')
-        project = hopsworks.login(project=project_name, api_key_value=api_key)
-        fs = project.get_feature_store()
-        print(f'fs: {fs}')
-        return fs
-
-    def get_training_data(self, days_back: int):
-        """
-        Use the self._feature_view to get the training data going back `days_back` days.
-        """
-        logger.info(f'Getting training data going back {days_back} days')
-        raw_features = self._feature_view.get_batch_data(
-            start_time=datetime.now() - timedelta(days=days_back),
-            end_time=datetime.now(),
-        )
-
-        # horizontally stack the features for each pair
-        # we want the outpu to be a daframe with (features, target)
-        features = self._preprocess_raw_features_into_features_and_target(
-            raw_features,
-            add_target_column=True,
-        )
-
-        # breakpoint()
-
-        return features
-
-    #     # TODO: split these features into groups of `pairs` and then stack them
-    #     # horizontally
-    #     # On Monday
-
-    def _preprocess_raw_features_into_features_and_target(
-        self,
-        data: pd.DataFrame,
-        add_target_column: bool,
-    ) -> pd.DataFrame:
-        """
-        Preprocess the features into features and possibly targets.
-        Horizontally stack the features for each pair, matching the timestamps.
-
-        """
-        # append self.pair_to_predict to the list of pairs
-        if self.pair_to_predict != self.pairs_as_features[0]:
-            # TODO: move this validation to the config.py
-            raise ValueError(
-                f'Pair {self.pair_to_predict} not found as the first feature in pairs_as_features'
-            )
-
-        # Horizontally stack the features for each pair
-        df_all = None
-        for pair in self.pairs_as_features:
-            logger.info(f'Horizontally stacking features for pair {pair}')
-
-            # filer rows for this pair
-            df = data[data['pair'] == pair]
-
-            # keep only the columns we need
-            df = df[
-                ['pair', 'window_end_ms', 'open', 'close']
-                + self.technical_indicators_as_features
-                + ['news_signals_signal']
-            ]
-
-            if df_all is not None:
-                # if we already have a df, we need to match the timestamps
-                # left join between df_all and df on the timestamp column
-                df_all = df_all.merge(
-                    df,
-                    on='window_end_ms',
-                    how='left',
-                    suffixes=('', f'_{pair}'),
-                )
-            else:
-                df_all = df
-
-        df_all = self._optimize_data_types(df_all)
-
-        # breakpoint()
-
-        if add_target_column:
-            logger.info('Adding target column to the dataset')
-
-            # extract the timestamp_ms and close columns where the targets are
-            df_target = df_all[['window_end_ms', 'close']]
-
-            # print(df_target)
-
-            # move the timestamp_ms column to the prediction_seconds seconds from now
-            # so we can join on it
-            df_target.loc[:, 'window_end_ms'] = (
-                df_target['window_end_ms'] - self.prediction_seconds * 1000
-            )
-            # print(df_target)
-            # breakpoint()
-
-            # left join on the timestamp_ms columns
-            df_all = df_all.merge(
-                df_target,
-                on='window_end_ms',
-                how='left',
-                suffixes=('', '_target'),
-            )
-            # breakpoint()
-
-            # drop rows for which the column `close_target` is NaN
-            df_all = df_all[df_all['close_target'].notna()]
-
-            # rename the close_target column to target
-            df_all.rename(columns={'close_target': 'target'}, inplace=True)
-
-        # rename the window_end_ms column to timestamp_ms and sort by it
-        df_all.rename(columns={'window_end_ms': 'timestamp_ms'}, inplace=True)
-        df_all.sort_values(by='timestamp_ms', inplace=True)
-
-        # # drop the pair_{pair} columns
-        # # These are categorical features and we don't need for the model
-        df_all.drop(
-            columns=[col for col in df_all.columns if col.startswith('pair')],
-            inplace=True,
-        )
-
-        logger.info(f'Final df_all: {df_all}')
-        logger.info(f'Final df_all shape: {df_all.shape}')
-
-        return df_all
-
-    def _optimize_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Optimize the data types of the DataFrame to reduce memory usage.
-        Converts float64 to float32 and int64 to int32.
-        """
-        logger.info('Optimizing data types')
-        float_cols = df.select_dtypes(include=['float64']).columns
-        int_cols = df.select_dtypes(include=['int64']).columns
-
-        df[float_cols] = df[float_cols].astype('float32')
-        df[int_cols] = df[int_cols].astype('int32')
-
-        logger.info('Data type optimization complete')
-        return df
-
-    def get_inference_features(self):
-        """
-        Get the latest features from the ONLINE feature store.
-        """
-        # get raw features from the Feature Store
-        logger.info('Getting latest features from the online feature store')
-        keys_to_read = self._get_online_store_keys()
-        logger.info(f'Keys to read: {keys_to_read}')
-        raw_features = self._feature_view.get_feature_vectors(
-            entry=keys_to_read,
-            return_type='pandas',
-        )
-
-        # horizontally stack the features for each pair
-        # we want the outpu to be a daframe with (features, target)
-        features = self._preprocess_raw_features_into_features_and_target(
-            raw_features,
-            add_target_column=False,
-        )
-
-        return features
-
-    def _get_online_store_keys(self) -> list[dict]:
-        """
-        Get the keys we need to get features from the online store.
-
-        Serving keys:
-        - pair
-        - candle_seconds
-        - news_signals_coin -> TODO: remove this as a serving key. For that, update the query that behind this feature view.
-
-        Returns:
-            A list of dictionaries with the keys we need to get features from the online store.
-        """
-        # breakpoint()
-        keys = []
-        for pair in self.pairs_as_features:
-            for candle_seconds in [self.candle_seconds]:
-                keys.append(
-                    {
-                        'pair': pair,
-                        'candle_seconds': candle_seconds,
-                        # TODO: remove this hack once the query is updated
-                        'news_signals_coin': pair.split('/')[0],
-                    }
-                )
-        return keys
-
-
-if __name__ == '__main__':
-    from config import hopsworks_credentials
-
-    print(hopsworks_credentials)
-
-    feature_reader = FeatureReader(
-        hopsworks_project_name=hopsworks_credentials.hopsworks_project_name,
-        hopsworks_api_key=hopsworks_credentials.hopsworks_api_key,
-        feature_view_name='price_predictor',
-        feature_view_version=1,
-        pair_to_predict='BTC/USD',
-        candle_seconds=60,
-        pairs_as_features=['BTC/USD', 'ETH/USD'],
-        technical_indicators_as_features=[
-            'rsi_9',
-            'rsi_14',
-            'rsi_21',
-            'macd',
-            'macd_signal',
-            'macd_hist',
-            'bbands_upper',
-            'bbands_middle',
-            'bbands_lower',
-            'stochrsi_fastk',
-            'stochrsi_fastd',
-            'adx',
-            'volume_ema',
-            'ichimoku_conv',
-            'ichimoku_base',
-            'ichimoku_span_a',
-            'ichimoku_span_b',
-            'mfi',
-            'atr',
-            'price_roc',
-            'sma_7',
-            'sma_14',
-            'sma_21',
-        ],
-        prediction_seconds=60 * 5,  # 5 Minutes into the future
-        llm_model_name_news_signals='ollama',
-        # # Optional. Only required if the feature view above does not exist and needs
-        # to be created
-        # technical_indicators_feature_group_name='technical_indicators',
-        # technical_indicators_feature_group_version=1,
-        # news_signals_feature_group_name='news_signals',
-        # news_signals_feature_group_version=1,
+    features = pair_features(technical_indicators)
+
+    # the position of each row in the pivoted array: the timestamp of the first pair
+    # and the pair
+    codes, uniques = pd.factorize(data['pair'])
+    pair_codes = np.append(pd.Index(pairs).get_indexer(uniques), -1)[codes]
+    window_end_ms = data['window_end_ms'].to_numpy(dtype='int64')
+    timestamps = np.unique(window_end_ms[pair_codes == 0])
+    rows = np.searchsorted(timestamps, window_end_ms)
+    rows = np.minimum(rows, max(len(timestamps) - 1, 0))
+    keep = pair_codes >= 0
+    if len(timestamps) > 0:
+        keep &= timestamps[rows] == window_end_ms
+    else:
+        keep[:] = False
+    rows, pair_codes = rows[keep], pair_codes[keep]
+
+    # one row per column of the output, so each feature of each pair is contiguous
+    values = np.full((len(pairs), len(features), len(timestamps)), np.nan, 'float32')
+    positions = pair_codes.astype('int64') * len(features) * len(timestamps) + rows
+    flat_values = values.reshape(-1)
+    for i, feature in enumerate(features):
+        flat_values[positions + i * len(timestamps)] = data[feature].to_numpy()[keep]
+
+    df_all = pd.DataFrame(
+        values.reshape(-1, len(timestamps)).T,
+        columns=feature_columns(pairs, technical_indicators),
+        copy=False,
     )
+    df_all.insert(0, 'timestamp_ms', timestamps)
+
+    if add_target_column:
+        logger.info('Adding target column to the dataset')
+
+        # the position of the timestamp `prediction_seconds` later, if we have it
+        target_timestamps = timestamps + prediction_seconds * 1000
+        positions = np.searchsorted(timestamps, target_timestamps)
+        positions = np.minimum(positions, max(len(timestamps) - 1, 0))
+        close = df_all['close'].to_numpy()
+        target = np.where(
+            timestamps[positions] == target_timestamps,
+            close[positions],
+            np.float32(np.nan),
+        )
+        df_all['target'] = target
 
-    training_data = feature_reader.get_training_data(days_back=100)
-    print(training_data)
-
-    # breakpoint()
-
-from datetime import datetime, timedelta
-from typing import Optional
+        # drop rows without a target
+        df_all = df_all[df_all['target'].notna()]
 
-import hopsworks
-import pandas as pd
-from hsfs.feature_group import FeatureGroup
-from hsfs.feature_store import FeatureStore
-from hsfs.feature_view import FeatureView
-from loguru import logger
+    return df_all
 
 
 class FeatureReader:
@@ -467,6 +125,10 @@ class FeatureReader:
         technical_indicators_feature_group_version: Optional[int] = None,
         news_signals_feature_group_name: Optional[str] = None,
         news_signals_feature_group_version: Optional[int] = None,
+        # Optional. The folder of the local cache of the training data
+        training_data_cache_dir: Optional[str] = None,
+        # Optional. The latest features from Kafka, to read before the online store
+        online_feature_cache: Optional[OnlineFeatureCache] = None,
     ):
         """ """
         self.pair_to_predict = pair_to_predict
@@ -500,6 +162,18 @@ class FeatureReader:
                 feature_view_version,
             )
 
+        if training_data_cache_dir is not None:
+            self._training_data_cache = TrainingDataCache(
+                training_data_cache_dir,
+                feature_view_name,
+                feature_view_version,
+                pairs_as_features,
+            )
+        else:
+            self._training_data_cache = None
+
+        self._online_feature_cache = online_feature_cache
+
     def _get_feature_group(self, name: str, version: int) -> FeatureGroup:
         """
         Returns a feature group object given its name and version.
@@ -614,16 +288,26 @@ class FeatureReader:
         fs = project.get_feature_store()
         return fs
 
-    def get_training_data(self, days_back: int):
+    def get_training_data(self, days_back: int, chunk_days: Optional[int] = None):
         """
         Use the self._feature_view to get the training data going back `days_back` days.
+        With a training data cache, only the days we do not have on disk are read from
+        the feature store.
+
+        With `chunk_days`, the data is read and preprocessed `chunk_days` at a time (see
+        `iter_training_data`), so the raw features of the whole range are never in
+        memory at once.
         """
+        if chunk_days is not None:
+            return pd.concat(
+                self.iter_training_data(days_back, chunk_days), ignore_index=True
+            )
+
         # get raw features from the Feature Store
         logger.info(f'Getting training data going back {days_back} days')
-        raw_features = self._feature_view.get_batch_data(
-            start_time=datetime.now() - timedelta(days=days_back),
-            end_time=datetime.now(),
-        )
+        end_time = datetime.now(tz=timezone.utc)
+        start_time = end_time - timedelta(days=days_back)
+        raw_features = self._read_raw_features(start_time, end_time)
 
         # horizontally stack the features for each pair
         # we want the outpu to be a daframe with (features, target)
@@ -634,6 +318,75 @@ class FeatureReader:
 
         return features
 
+    def iter_training_data(
+        self, days_back: int, chunk_days: int
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields the training data going back `days_back` days, in time order, in chunks
+        of `chunk_days` days. Together, the chunks are the same rows as
+        `get_training_data` returns.
+
+        The target of a row is the close `prediction_seconds` later, which can be in the
+        next chunk, and the event time of a candle is before the end of its window, so
+        each chunk reads the raw features from one candle before its start to one
+        candle after its end plus the prediction seconds, and keeps the rows of its own
+        windows.
+
+        Args:
+            days_back: The number of days of training data
+            chunk_days: The number of days of each chunk
+
+        Returns:
+            The features and targets of each chunk
+        """
+        end_time = datetime.now(tz=timezone.utc)
+        start_time = end_time - timedelta(days=days_back)
+        candle = timedelta(seconds=self.candle_seconds)
+        overlap = timedelta(seconds=self.prediction_seconds) + candle
+
+        chunk_start = start_time
+        while chunk_start < end_time:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days), end_time)
+            logger.info(f'Getting training data from {chunk_start} to {chunk_end}')
+            raw_features = self._read_raw_features(
+                max(chunk_start - candle, start_time),
+                min(chunk_end + overlap, end_time),
+            )
+            features = self._preprocess_raw_features_into_features_and_target(
+                raw_features,
+                add_target_column=True,
+            )
+            del raw_features
+
+            # the rows of the windows that end in this chunk. The windows that end
+            # after the end of the training data belong to the last chunk
+            in_chunk = features['timestamp_ms'] >= chunk_start.timestamp() * 1000
+            if chunk_end < end_time:
+                in_chunk &= features['timestamp_ms'] < chunk_end.timestamp() * 1000
+            yield features[in_chunk]
+
+            chunk_start = chunk_end
+
+    def _read_raw_features(
+        self, start_time: datetime, end_time: datetime
+    ) -> pd.DataFrame:
+        """
+        Returns the raw features between `start_time` and `end_time`, from the training
+        data cache if we have one
+        """
+        if self._training_data_cache is not None:
+            return self._training_data_cache.read(
+                start_time,
+                end_time,
+                fetch=lambda start, end: self._feature_view.get_batch_data(
+                    start_time=start, end_time=end
+                ),
+            )
+        return self._feature_view.get_batch_data(
+            start_time=start_time,
+            end_time=end_time,
+        )
+
     def _preprocess_raw_features_into_features_and_target(
         self,
         data: pd.DataFrame,
@@ -660,79 +413,40 @@ class FeatureReader:
                 f'Pair {self.pair_to_predict} not found as the first feature in pairs_as_features'
             )
 
-        # Horizontally stack the features for each pair
-        df_all = None
-        for pair in self.pairs_as_features:
-            logger.info(f'Horizontally stacking features for pair {pair}')
-
-            # filer rows for this pair
-            df = data[data['pair'] == pair]
-
-            # keep only the columns we need
-            df = df[
-                ['pair', 'window_end_ms', 'open', 'close']
-                + self.technical_indicators_as_features
-                + ['news_signals_signal']
-            ]
-
-            # rename the window_end_ms column to timestamp_ms
-            # df.rename(columns={'window_end_ms': 'timestamp_ms'}, inplace=True)
-
-            if df_all is not None:
-                # if we already have a df, we need to match the timestamps
-                # left join between df_all and df on the timestamp column
-                df_all = df_all.merge(
-                    df,
-                    on='window_end_ms',
-                    how='left',
-                    suffixes=('', f'_{pair}'),
-                )
-            else:
-                df_all = df
-
-        if add_target_column:
-            logger.info('Adding target column to the dataset')
-
-            # extract the timestamp_ms and close columns where the targets are
-            df_target = df_all[['window_end_ms', 'close']]
-
-            # move the timestamp_ms column to the prediction_seconds seconds from now
-            # so we can join on it
-            df_target['window_end_ms'] = (
-                df_target['window_end_ms'] - self.prediction_seconds * 1000
-            )
-
-            # left join on the timestamp_ms columns
-            df_all = df_all.merge(
-                df_target,
-                on='window_end_ms',
-                how='left',
-                suffixes=('', '_target'),
-            )
-
-            # drop rows for which the column `close_target` is NaN
-            df_all = df_all[df_all['close_target'].notna()]
-
-            # rename the close_target column to target
-            df_all.rename(columns={'close_target': 'target'}, inplace=True)
+        return preprocess_features(
+            data,
+            pairs=self.pairs_as_features,
+            technical_indicators=self.technical_indicators_as_features,
+            prediction_seconds=self.prediction_seconds,
+            add_target_column=add_target_column,
+        )
 
-        # rename the window_end_ms column to timestamp_ms and sort by it
-        df_all.rename(columns={'window_end_ms': 'timestamp_ms'}, inplace=True)
-        df_all.sort_values(by='timestamp_ms', inplace=True)
+    def get_inference_features(self):
+        """
+        Get the latest features from the online feature cache, or from the ONLINE
+        feature store if the cache does not have them.
+        """
+        raw_features = pd.DataFrame(list(self.get_latest_raw_features().values()))
 
-        # drop the pair_{pair} columns
-        # These are categorical features and we don't need for the model
-        df_all.drop(
-            columns=[col for col in df_all.columns if col.startswith('pair')],
-            inplace=True,
+        # horizontally stack the features for each pair
+        # we want the outpu to be a daframe with (features, target)
+        features = self._preprocess_raw_features_into_features_and_target(
+            raw_features,
+            add_target_column=False,
         )
 
-        return df_all
+        return features
 
-    def get_inference_features(self):
+    def get_latest_raw_features(self) -> dict[str, dict]:
         """
-        Get the latest features from the ONLINE feature store.
+        Returns the latest raw features of each pair, from the online feature cache
+        or from the ONLINE feature store
         """
+        if self._online_feature_cache is not None:
+            rows = self._online_feature_cache.get(self.pairs_as_features)
+            if rows is not None:
+                return rows
+
         # get raw features from the Feature Store
         logger.info('Getting latest features from the online feature store')
         keys_to_read = self._get_online_store_keys()
@@ -741,15 +455,10 @@ class FeatureReader:
             entry=keys_to_read,
             return_type='pandas',
         )
+        if self._online_feature_cache is not None:
+            self._online_feature_cache.warm(raw_features)
 
-        # horizontally stack the features for each pair
-        # we want the outpu to be a daframe with (features, target)
-        features = self._preprocess_raw_features_into_features_and_target(
-            raw_features,
-            add_target_column=False,
-        )
-
-        return features
+        return {row['pair']: row for row in raw_features.to_dict(orient='records')}
 
     def _get_online_store_keys(self) -> list[dict]:
         """
@@ -829,4 +538,4 @@ if __name__ == '__main__':
     # breakpoint()
 
     latest_features = feature_reader.get_inference_features()
-    print(latest_features)
\ No newline at end of file
+    print(latest_features)
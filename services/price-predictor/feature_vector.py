@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def pair_features(technical_indicators: List[str]) -> List[str]:
+    """
+    Returns the features we take from the raw features of each pair
+    """
+    return ['open', 'close'] + technical_indicators + ['news_signals_signal']
+
+
+def feature_columns(pairs: List[str], technical_indicators: List[str]) -> List[str]:
+    """
+    Returns the names of the features of the model, in order: the features of the
+    first pair, then the features of each other pair with the suffix `_{pair}`
+    """
+    return [
+        feature if pair == pairs[0] else f'{feature}_{pair}'
+        for pair in pairs
+        for feature in pair_features(technical_indicators)
+    ]
+
+
+class FeatureVectorPlan:
+    """
+    Builds the feature vector of a prediction from the latest raw features of each
+    pair, without pandas.
+
+    The plan is built once from the inference params, and `assemble` copies the
+    features of each pair into a preallocated float32 row, in the order of the
+    columns of the training data (`timestamp_ms` and then `feature_columns`). It gives
+    the same values as the preprocessing of the `FeatureReader`: the row is at the
+    `window_end_ms` of the first pair, and a pair with another `window_end_ms` has
+    missing features.
+    """
+
+    def __init__(self, pairs: List[str], technical_indicators: List[str]):
+        """
+        Args:
+            pairs: The pairs whose features we stack, the pair to predict first
+            technical_indicators: The technical indicators to use as features
+        """
+        self.pairs = pairs
+        self.features = pair_features(technical_indicators)
+        self.columns = ['timestamp_ms'] + feature_columns(pairs, technical_indicators)
+
+        # where the features of each pair start in the row
+        self._offsets = [
+            (pair, 1 + i * len(self.features)) for i, pair in enumerate(pairs)
+        ]
+        self._row = np.full((1, len(self.columns)), np.nan, dtype='float32')
+
+    def check(self, feature_names: Optional[Sequence[str]]) -> None:
+        """
+        Raises a ValueError if the model was trained with other features, or in
+        another order. Does nothing if the model does not know its features.
+        """
+        if feature_names is None:
+            return
+        if list(feature_names) != self.columns:
+            raise ValueError(
+                f'The model was trained with the features {list(feature_names)}, '
+                f'but the inference params give {self.columns}'
+            )
+
+    def assemble(self, rows: Dict[str, dict]) -> np.ndarray:
+        """
+        Returns the feature vector, as a row of a 2D array. The array is reused by the
+        next call, so use it before calling `assemble` again.
+
+        Args:
+            rows: The latest raw features of each pair, with their `window_end_ms`,
+                `open`, `close`, technical indicators and `news_signals_signal`
+        Returns:
+            The feature vector
+        """
+        first = rows.get(self.pairs[0])
+        if first is None:
+            raise ValueError(f'No features for the pair {self.pairs[0]}')
+        window_end_ms = first['window_end_ms']
+
+        row = self._row
+        row.fill(np.nan)
+        row[0, 0] = window_end_ms
+        for pair, offset in self._offsets:
+            raw = rows.get(pair)
+            if raw is None or raw['window_end_ms'] != window_end_ms:
+                continue
+            row[0, offset : offset + len(self.features)] = [
+                raw[feature] for feature in self.features
+            ]
+        return row
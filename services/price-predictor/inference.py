@@ -1,6 +1,12 @@
+from typing import List, Optional
+
 from loguru import logger
-from price_predictor import PricePredictor
 from quixstreams import Application
+from streaming_common.metrics import PROCESSING_SECONDS, app_config, start_server
+from streaming_common.serialization import MessageDeserializer
+from streaming_common.tracing import HopTracer
+
+from predictor_host import PredictorHost
 from sinks import ElasticSearchSink
 
 
@@ -11,50 +17,97 @@ def run(
     kafka_consumer_group: str,
     # filter only on candles with the given frequency
     candle_seconds: int,
-    # encapsulate the inference logic in its .predict() method
-    price_predictor: PricePredictor,
+    # encapsulate the inference logic of all the models in its .predict() method
+    predictor_host: PredictorHost,
     # where to save the predictions
     elastic_search_sink: ElasticSearchSink,
+    # where to serve the Prometheus metrics
+    metrics_port: Optional[int] = None,
+    # the topics that feed the online feature cache of the predictor host
+    kafka_technical_indicators_topic: Optional[str] = None,
+    kafka_news_signals_topic: Optional[str] = None,
 ):
     """
     Run the inference job as a Quix Streams application.
 
     Steps:
-    1 - Load the model from the model registry
-    2 - Generate predictions
-    2 - Save predictions to Elastic Search
+    1 - Load the models from the model registry
+    2 - Generate the predictions of the models that are ready for each candle
+    3 - Save predictions to Elastic Search
 
     Args:
         kafka_broker_address: the address of the Kafka broker
         kafka_input_topic: the topic to listen to for new data
         kafka_consumer_group: the consumer group to use
-        pair_to_predict: the pair to predict
         candle_seconds: the number of seconds per candle
-        prediction_seconds: the number of seconds into the future to predict
-        model_status: the status of the model in the model registry
+        predictor_host: the models of all the pairs and prediction seconds
         elastic_search_sink: the sink to save the predictions to
+        metrics_port: the port to serve the Prometheus metrics on
+        kafka_technical_indicators_topic: the topic of the technical indicators, to
+            keep the online feature cache up to date
+        kafka_news_signals_topic: the topic of the news signals, to keep the online
+            feature cache up to date
     """
     # Quix Streams application to handles all low-level communication with Kafka
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
+        # Count the messages and errors and track the consumer lag
+        **app_config(),
     )
+    start_server(metrics_port)
 
-    input_topic = app.topic(name=kafka_input_topic, value_deserializer='json')
+    # Reads both JSON and binary messages
+    input_topic = app.topic(
+        name=kafka_input_topic, value_deserializer=MessageDeserializer()
+    )
 
     # Streaming Dataframe to define the business logic, aka the transformations from
     # input data to output data
     sdf = app.dataframe(input_topic)
 
+    tracer = HopTracer('price-predictor')
+    sdf = sdf.update(tracer.on_input, metadata=True)
+
+    # Keep the latest features in the online feature caches of the host. A topic
+    # can only have one StreamingDataFrame, so if the predictions are triggered by the
+    # technical indicators we update the cache before predicting
+    if kafka_technical_indicators_topic is not None:
+        for topic_name, update in (
+            (
+                kafka_technical_indicators_topic,
+                predictor_host.update_technical_indicators,
+            ),
+            (kafka_news_signals_topic, predictor_host.update_news_signal),
+        ):
+            if topic_name is None:
+                continue
+            if topic_name == kafka_input_topic:
+                sdf = sdf.update(update)
+            else:
+                topic = app.topic(
+                    name=topic_name, value_deserializer=MessageDeserializer()
+                )
+                app.dataframe(topic).update(update)
+
     # We only react to candles with the given `candle_seconds` frequency
     sdf = sdf[sdf['candle_seconds'] == candle_seconds]
 
-    # Generate a new prediction
-    sdf = sdf.apply(lambda _: price_predictor.predict().to_dict())
+    # Generate the predictions of the models that are ready, one message each
+    predict_seconds = PROCESSING_SECONDS.labels(step='predict')
+
+    def predict(value: dict) -> List[dict]:
+        with predict_seconds.time():
+            return predictor_host.predict(value)
+
+    sdf = sdf.apply(predict, expand=True)
 
     # logging the predictions
     sdf = sdf.update(lambda x: logger.info(x))
 
+    # The sink adds the trace headers of the candle and ours to the prediction
+    sdf = sdf.set_headers(tracer.on_output)
+
     # Save the predictions to Elastic Search sink
     sdf.sink(elastic_search_sink)
 
@@ -72,17 +125,18 @@ def main():
         inference_config as config,
     )
 
-    # Load the model from the model registry and the necessary metadata at initialization
-    # It exposes a `predict` method that can be used to generate predictions
-    # We initialize here so that the run() methods does not need to worry about credentials
-    # and other low-level details about our PricePredictor class.
-    price_predictor = PricePredictor(
-        pair_to_predict=config.pair_to_predict,
+    # Load the models from the model registry and the necessary metadata at
+    # initialization. It exposes a `predict` method that can be used to generate
+    # predictions. We initialize here so that the run() methods does not need to worry
+    # about credentials and other low-level details about our PredictorHost class.
+    predictor_host = PredictorHost(
+        pairs_to_predict=config.pairs_to_predict,
         candle_seconds=config.candle_seconds,
-        prediction_seconds=config.prediction_seconds,
+        predictions_seconds=config.predictions_seconds,
         model_status=config.model_status,
         comet_config=comet_config,
         hopsworks_config=hopsworks_config,
+        use_online_feature_cache=config.kafka_technical_indicators_topic is not None,
     )
 
     # Create the Elastic Search sink
@@ -96,10 +150,13 @@ def main():
         kafka_input_topic=config.kafka_input_topic,
         kafka_consumer_group=config.kafka_consumer_group,
         candle_seconds=config.candle_seconds,
-        price_predictor=price_predictor,
+        predictor_host=predictor_host,
         elastic_search_sink=elastic_search_sink,
+        metrics_port=config.metrics_port,
+        kafka_technical_indicators_topic=config.kafka_technical_indicators_topic,
+        kafka_news_signals_topic=config.kafka_news_signals_topic,
     )
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
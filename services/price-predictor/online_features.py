@@ -0,0 +1,104 @@
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from loguru import logger
+from prometheus_client import Counter
+
+ONLINE_FEATURES = Counter(
+    'online_feature_cache_total',
+    'Inference features assembled from the local cache (hit) or read from the online '
+    'feature store (miss)',
+    ['outcome'],
+)
+
+
+class OnlineFeatureCache:
+    """
+    Latest technical indicators of each pair and latest news signal of each coin, kept
+    up to date from the Kafka topics the to-feature-store service writes to the
+    feature store, so the inference features are a dictionary read instead of a
+    request to the online feature store:
+
+        sdf_indicators = app.dataframe(technical_indicators_topic)
+        sdf_indicators.update(cache.update_technical_indicators)
+        sdf_news = app.dataframe(news_signals_topic)
+        sdf_news.update(cache.update_news_signal)
+
+    `get` returns the rows the online feature store would return for the pairs, with
+    the fields the preprocessing uses, or None if a pair has no technical indicators
+    yet. Then the `FeatureReader` reads the online feature store and `warm` fills the
+    cache with its rows, so it only happens after a restart.
+    """
+
+    def __init__(self, candle_seconds: int, llm_model_name_news_signals: str):
+        """
+        Args:
+            candle_seconds: The candle seconds of the technical indicators we keep
+            llm_model_name_news_signals: The LLM model of the news signals we keep
+        """
+        self.candle_seconds = candle_seconds
+        self.llm_model_name_news_signals = llm_model_name_news_signals
+
+        # the latest technical indicators of each pair
+        self._indicators: Dict[str, dict] = {}
+        # the timestamp and the latest signal of each coin
+        self._signals: Dict[str, Tuple[int, float]] = {}
+
+        self._hits = ONLINE_FEATURES.labels(outcome='hit')
+        self._misses = ONLINE_FEATURES.labels(outcome='miss')
+
+    def update_technical_indicators(self, value: dict) -> None:
+        if value['candle_seconds'] != self.candle_seconds:
+            return
+        latest = self._indicators.get(value['pair'])
+        if latest is None or value['window_end_ms'] >= latest['window_end_ms']:
+            self._indicators[value['pair']] = value
+
+    def update_news_signal(self, value: dict) -> None:
+        if value['model_name'] != self.llm_model_name_news_signals:
+            return
+        latest = self._signals.get(value['coin'])
+        if latest is None or value['timestamp_ms'] >= latest[0]:
+            self._signals[value['coin']] = (value['timestamp_ms'], value['signal'])
+
+    def get(self, pairs: List[str]) -> Optional[Dict[str, dict]]:
+        """
+        Returns the latest raw features of each of the `pairs`, or None if we do not
+        have the technical indicators of all of them
+        """
+        if any(pair not in self._indicators for pair in pairs):
+            self._misses.inc()
+            return None
+        self._hits.inc()
+
+        rows = {}
+        for pair in pairs:
+            signal = self._signals.get(pair.split('/')[0])
+            rows[pair] = {
+                **self._indicators[pair],
+                'news_signals_signal': signal[1]
+                if signal is not None
+                else float('nan'),
+            }
+        return rows
+
+    def warm(self, raw_features: pd.DataFrame) -> None:
+        """
+        Fills the cache with the rows of the online feature store, where the cache
+        does not have newer ones
+        """
+        for row in raw_features.to_dict(orient='records'):
+            self.update_technical_indicators(row)
+            if pd.notna(row.get('news_signals_signal')):
+                self.update_news_signal(
+                    {
+                        'coin': row['pair'].split('/')[0],
+                        'signal': row['news_signals_signal'],
+                        'model_name': self.llm_model_name_news_signals,
+                        'timestamp_ms': row.get('news_signals_timestamp_ms', 0),
+                    }
+                )
+        logger.info(
+            f'Online feature cache: {len(self._indicators)} pairs, '
+            f'{len(self._signals)} coins with news signals'
+        )
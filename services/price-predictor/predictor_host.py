@@ -0,0 +1,253 @@
+from typing import Dict, List, Literal, Optional
+
+from loguru import logger
+from prometheus_client import Histogram
+
+from config import CometMlCredentials as CometConfig
+from config import HopsworksCredentials as HopsworksConfig
+from feature_reader import FeatureReader
+from online_features import OnlineFeatureCache
+from price_predictor import PricePredictor
+
+PREDICTION_BATCH_SIZE = Histogram(
+    'prediction_batch_size',
+    'Number of models that predict together after one read of the features',
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+
+
+class _FeatureGroup:
+    """
+    The models that read the same features: the same feature view, candles and news
+    signals. They share one feature reader, with all the pairs any of them uses, so
+    the features of a window are read once for all of them.
+    """
+
+    def __init__(
+        self,
+        predictors: List[PricePredictor],
+        hopsworks_config: HopsworksConfig,
+        use_online_feature_cache: bool,
+    ):
+        self.predictors = predictors
+
+        # the pairs and technical indicators of all the models, in order
+        params = [predictor.inference_params for predictor in predictors]
+        pairs = list(
+            dict.fromkeys(pair for p in params for pair in p['pairs_as_features'])
+        )
+        technical_indicators = list(
+            dict.fromkeys(
+                indicator
+                for p in params
+                for indicator in p['technical_indicators_as_features']
+            )
+        )
+
+        if use_online_feature_cache:
+            self.online_feature_cache = OnlineFeatureCache(
+                candle_seconds=params[0]['candle_seconds'],
+                llm_model_name_news_signals=params[0]['llm_model_name_news_signals'],
+            )
+        else:
+            self.online_feature_cache = None
+
+        self.feature_reader = FeatureReader(
+            hopsworks_project_name=hopsworks_config.hopsworks_project_name,
+            hopsworks_api_key=hopsworks_config.hopsworks_api_key,
+            feature_view_name=params[0]['feature_view_name'],
+            feature_view_version=params[0]['feature_view_version'],
+            pair_to_predict=pairs[0],
+            candle_seconds=params[0]['candle_seconds'],
+            pairs_as_features=pairs,
+            technical_indicators_as_features=technical_indicators,
+            prediction_seconds=params[0]['prediction_seconds'],
+            llm_model_name_news_signals=params[0]['llm_model_name_news_signals'],
+            online_feature_cache=self.online_feature_cache,
+        )
+
+
+class PredictorHost:
+    """
+    Serves the models of many pairs and prediction horizons in one process.
+
+    It loads one `PricePredictor` per pair and prediction seconds from the model
+    registry, keyed by their model name (`names.get_model_name`), and groups the models
+    that read the same features. For each candle it makes the predictions of the models
+    that use its pair and whose features are ready for its window, after one read of
+    the features of their group:
+
+        host = PredictorHost(['BTC/USD', 'ETH/USD'], 60, [60, 300, 900], ...)
+        predictions = host.predict(technical_indicators)
+
+    Each model predicts once per window. With an online feature cache, a model is ready
+    when the cache has the features of all its pairs for the window, so it predicts as
+    soon as the last of them arrives. A model that is still waiting when the candles of
+    the next window arrive predicts the window it waited for with the features it has,
+    and then waits for the features of the next window. Without the cache, each model
+    predicts on the first candle of each window that uses one of its pairs.
+    """
+
+    def __init__(
+        self,
+        pairs_to_predict: List[str],
+        candle_seconds: int,
+        predictions_seconds: List[int],
+        model_status: Literal['Development', 'Staging', 'Production'],
+        comet_config: CometConfig,
+        hopsworks_config: HopsworksConfig,
+        use_online_feature_cache: bool = False,
+    ):
+        """
+        Loads the models of all the pairs and prediction seconds.
+
+        Args:
+            pairs_to_predict: The pairs to predict.
+            candle_seconds: The number of seconds in each candle.
+            predictions_seconds: The numbers of seconds to predict, for every pair.
+            model_status: The status of the models to load.
+            comet_config: The Comet configuration to load the models and their
+                inference params.
+            hopsworks_config: The Hopsworks configuration to read the features.
+            use_online_feature_cache: Whether to keep the latest features from the
+                Kafka topics in memory, and read them before the online feature store.
+        """
+        self.candle_seconds = candle_seconds
+
+        # the models, by model name
+        self.predictors: Dict[str, PricePredictor] = {}
+        for pair in pairs_to_predict:
+            for prediction_seconds in predictions_seconds:
+                predictor = PricePredictor(
+                    pair_to_predict=pair,
+                    candle_seconds=candle_seconds,
+                    prediction_seconds=prediction_seconds,
+                    model_status=model_status,
+                    comet_config=comet_config,
+                    # the host reads the features of all the models
+                    hopsworks_config=None,
+                )
+                self.predictors[predictor.model_name] = predictor
+
+        # the models that read the same features share a feature reader
+        predictors_by_features: Dict[tuple, List[PricePredictor]] = {}
+        for predictor in self.predictors.values():
+            params = predictor.inference_params
+            key = (
+                params['feature_view_name'],
+                params['feature_view_version'],
+                params['llm_model_name_news_signals'],
+            )
+            predictors_by_features.setdefault(key, []).append(predictor)
+        self._groups = [
+            _FeatureGroup(predictors, hopsworks_config, use_online_feature_cache)
+            for predictors in predictors_by_features.values()
+        ]
+
+        # the groups of the models that use the features of each pair
+        self._groups_by_pair: Dict[str, List[_FeatureGroup]] = {}
+        for group in self._groups:
+            for pair in group.feature_reader.pairs_as_features:
+                self._groups_by_pair.setdefault(pair, []).append(group)
+
+        # the last window each model predicted, and the window each model waits for
+        self._predicted_window: Dict[str, int] = {}
+        self._due_window: Dict[str, int] = {}
+
+        logger.info(
+            f'Serving {len(self.predictors)} models in {len(self._groups)} feature '
+            'groups'
+        )
+
+    def update_technical_indicators(self, value: dict) -> None:
+        """
+        Keeps the latest technical indicators in the online feature cache of each group
+        """
+        for group in self._groups:
+            if group.online_feature_cache is not None:
+                group.online_feature_cache.update_technical_indicators(value)
+
+    def update_news_signal(self, value: dict) -> None:
+        """
+        Keeps the latest news signal in the online feature cache of each group
+        """
+        for group in self._groups:
+            if group.online_feature_cache is not None:
+                group.online_feature_cache.update_news_signal(value)
+
+    def predict(self, value: dict) -> List[dict]:
+        """
+        Makes the predictions of the models whose features are ready after the candle
+        or technical indicators `value`.
+
+        Args:
+            value: A message with the `pair` and the `window_end_ms` of a candle
+
+        Returns:
+            The predictions of the models that are ready, as dictionaries
+        """
+        window_end_ms = value['window_end_ms']
+
+        predictions = []
+        for group in self._groups_by_pair.get(value['pair'], []):
+            # the models of the group that use this pair and did not predict this
+            # window yet
+            due = [
+                predictor
+                for predictor in group.predictors
+                if value['pair'] in predictor.inference_params['pairs_as_features']
+                and self._predicted_window.get(predictor.model_name, -1) < window_end_ms
+            ]
+            if not due:
+                continue
+            for predictor in due:
+                self._due_window.setdefault(predictor.model_name, window_end_ms)
+
+            # one read of the features for all the models of the group
+            rows = group.feature_reader.get_latest_raw_features()
+
+            # the models that are ready, and the window each one predicts
+            ready = []
+            for predictor in due:
+                due_window_end_ms = self._due_window[predictor.model_name]
+                if self._has_features(group, predictor, rows, window_end_ms):
+                    ready.append((predictor, window_end_ms))
+                elif due_window_end_ms < window_end_ms:
+                    # it is still waiting for an older window: we predict that one
+                    # with the features we have, and this window stays due
+                    ready.append((predictor, due_window_end_ms))
+
+            PREDICTION_BATCH_SIZE.observe(len(ready))
+            for predictor, predicted_window_end_ms in ready:
+                predictions.append(predictor.predict_from_raw_features(rows).to_dict())
+                self._predicted_window[predictor.model_name] = predicted_window_end_ms
+                if predicted_window_end_ms == window_end_ms:
+                    del self._due_window[predictor.model_name]
+                else:
+                    self._due_window[predictor.model_name] = window_end_ms
+
+        return predictions
+
+    def _has_features(
+        self,
+        group: _FeatureGroup,
+        predictor: PricePredictor,
+        rows: Dict[str, dict],
+        window_end_ms: int,
+    ) -> bool:
+        """
+        Whether the model can predict the window `window_end_ms` with the features
+        `rows`: the features of all its pairs are for this window or a newer one.
+        Without an online feature cache we do not know when the online feature store
+        has them, so it predicts right away
+        """
+        if group.online_feature_cache is None:
+            return True
+        return all(
+            _window_end_ms(rows.get(pair)) >= window_end_ms
+            for pair in predictor.inference_params['pairs_as_features']
+        )
+
+
+def _window_end_ms(row: Optional[dict]) -> int:
+    return row['window_end_ms'] if row is not None else -1
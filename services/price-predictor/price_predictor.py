@@ -1,14 +1,15 @@
 import json
 import time
 from datetime import datetime, timezone
-from typing import Literal, Tuple
+from typing import Literal, Optional, Tuple
 
 import joblib  # Other options to serialzie/deserialize model objects to disk are
-import pandas as pd
+import numpy as np
 from comet_ml.api import API
 from config import CometMlCredentials as CometConfig
 from config import HopsworksCredentials as HopsworksConfig
 from feature_reader import FeatureReader
+from feature_vector import FeatureVectorPlan
 from loguru import logger
 
 # - pickle,
@@ -17,6 +18,7 @@ from loguru import logger
 # - etc...
 from models.xgboost_model import XGBRegressor
 from names import get_model_name
+from online_features import OnlineFeatureCache
 from pydantic import BaseModel
 
 Model = Tuple[XGBRegressor]
@@ -48,7 +50,8 @@ class PricePredictor:
         prediction_seconds: int,
         model_status: Literal['Development', 'Staging', 'Production'],
         comet_config: CometConfig,
-        hopsworks_config: HopsworksConfig,
+        hopsworks_config: Optional[HopsworksConfig],
+        use_online_feature_cache: bool = False,
     ):
         """
         Loads the model from the model registry and the necessary metadata.
@@ -63,7 +66,13 @@ class PricePredictor:
                 model artifacts from the model registry, and experiment runs data from CometML.
             hopsworks_config:
                 The Hopsworks configuration with credentials necesseray to load
-                features from the feature store.
+                features from the feature store. If None, the predictor has no
+                feature reader and only predicts with `predict_from_raw_features`,
+                e.g. in a `PredictorHost` that reads the features of all its models.
+            use_online_feature_cache:
+                Whether to keep the latest features from the Kafka topics in
+                `self.online_feature_cache`, and read them before the online feature
+                store.
         """
         self.pair_to_predict = pair_to_predict
         self.candle_seconds = candle_seconds
@@ -92,15 +101,40 @@ class PricePredictor:
         )
         logger.info('Loaded inference params!')
 
+        # Builds the feature vectors in the order of the columns of the training data.
+        # The features we build must be the ones the model was trained with
+        self.feature_vector_plan = FeatureVectorPlan(
+            self.inference_params['pairs_as_features'],
+            self.inference_params['technical_indicators_as_features'],
+        )
+        self.feature_vector_plan.check(getattr(self.model, 'feature_names_in_', None))
+
         # Initialize the feature reader
         # This is the object that talks to Hopsworks which helps us get the features in
         # real time that our self.model needs to make predictions
-        self.feature_reader = self._get_feature_reader(hopsworks_config)
+        self.online_feature_cache = None
+        self.feature_reader = None
+        if hopsworks_config is None:
+            logger.info(f'Model {self.model_name} is ready for inference!')
+            return
+        if use_online_feature_cache:
+            self.online_feature_cache = OnlineFeatureCache(
+                candle_seconds=self.inference_params['candle_seconds'],
+                llm_model_name_news_signals=self.inference_params[
+                    'llm_model_name_news_signals'
+                ],
+            )
+        self.feature_reader = self._get_feature_reader(
+            hopsworks_config, self.online_feature_cache
+        )
 
         logger.info(f'Model {self.model_name} is ready for inference!')
 
-
-    def _get_feature_reader(self, hopsworks_config: HopsworksConfig) -> FeatureReader:
+    def _get_feature_reader(
+        self,
+        hopsworks_config: HopsworksConfig,
+        online_feature_cache: Optional[OnlineFeatureCache] = None,
+    ) -> FeatureReader:
         """
         Initializes the feature reader object that talks to Hopsworks which helps us get the features in
         real time that our self.model needs to make predictions
@@ -121,6 +155,7 @@ class PricePredictor:
             llm_model_name_news_signals=self.inference_params[
                 'llm_model_name_news_signals'
             ],
+            online_feature_cache=online_feature_cache,
         )
 
     def predict(self) -> PredictionOutput:
@@ -133,7 +168,23 @@ class PricePredictor:
         - Return the prediction
         """
         # get the latest features from the feature store
-        features: pd.DataFrame = self.feature_reader.get_inference_features()
+        return self.predict_from_raw_features(
+            self.feature_reader.get_latest_raw_features()
+        )
+
+    def predict_from_raw_features(self, rows: dict[str, dict]) -> PredictionOutput:
+        """
+        Generates a new prediction from the latest raw features of each pair.
+
+        Args:
+            rows: The latest raw features of each pair, as the feature reader returns
+                them
+
+        Returns:
+            The prediction
+        """
+        # the feature vector, in the order of the columns of the training data
+        features: np.ndarray = self.feature_vector_plan.assemble(rows)
 
         # make the prediction
         prediction: float = self.model.predict(features)[0]
@@ -291,14 +342,15 @@ if __name__ == '__main__':
         inference_config as config,
     )
 
+    # the model of the first pair and prediction seconds
     price_predictor = PricePredictor(
-        pair_to_predict=config.pair_to_predict,
+        pair_to_predict=config.pairs_to_predict[0],
         candle_seconds=config.candle_seconds,
-        prediction_seconds=config.prediction_seconds,
+        prediction_seconds=config.predictions_seconds[0],
         model_status=config.model_status,
         comet_config=comet_ml_credentials,
         hopsworks_config=hopsworks_credentials,
     )
 
     output = price_predictor.predict()
-    logger.info(f'Prediction output: {output}')
\ No newline at end of file
+    logger.info(f'Prediction output: {output}')
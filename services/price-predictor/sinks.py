@@ -1,5 +1,7 @@
 from elasticsearch import Elasticsearch
 from quixstreams.sinks.base import BatchingSink, SinkBackpressureError, SinkBatch
+from streaming_common.metrics import MESSAGES_OUT, SINK_RETRIES
+from streaming_common.tracing import now_ms, parse
 
 
 class ElasticSearchSink(BatchingSink):
@@ -33,9 +35,20 @@ class ElasticSearchSink(BatchingSink):
         self.client = Elasticsearch(elasticsearch_url)
         self.index_name = index_name
 
+        self._documents_written = MESSAGES_OUT.labels(topic=index_name)
+        self._retries = SINK_RETRIES.labels(sink=index_name)
+
     def write(self, batch: SinkBatch):
-        # Convert batch items to list of dictionaries
-        documents = [item.value for item in batch]
+        # Convert batch items to list of dictionaries, with the time of each hop from
+        # the trade to the prediction, and when we write it to Elastic Search
+        written_ms = now_ms()
+        documents = [
+            {
+                **item.value,
+                'trace': {**parse(item.headers), 'elasticsearch.write': written_ms},
+            }
+            for item in batch
+        ]
 
         try:
             # TODO: Implement a bulk indexing, instead of this hack.
@@ -48,12 +61,15 @@ class ElasticSearchSink(BatchingSink):
                 )
 
         except TimeoutError as e:
+            self._retries.inc()
             raise SinkBackpressureError(
                 retry_after=30.0,
                 topic=batch.topic,
                 partition=batch.partition,
             ) from e
 
+        self._documents_written.inc(len(documents))
+
         # TODO: Implement a bulk indexing. The code commented below has some bug I cannot
         # find right now.
         # If you manage to make it work, please let me know.
@@ -80,4 +96,4 @@ class ElasticSearchSink(BatchingSink):
         #         retry_after=30.0,
         #         topic=batch.topic,
         #         partition=batch.partition,
-        #     )
\ No newline at end of file
+        #     )
@@ -0,0 +1,11 @@
+import os
+
+# config.py reads the credentials when it is imported, the tests do not use them
+for name in [
+    'HOPSWORKS_API_KEY',
+    'HOPSWORKS_PROJECT_NAME',
+    'API_KEY',
+    'PROJECT_NAME',
+    'WORKSPACE',
+]:
+    os.environ.setdefault(name, 'test')
@@ -0,0 +1,83 @@
+"""
+The pivot based `preprocess_features` against the merge based preprocessing we used
+before, on synthetic features of the feature view.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark_feature_reader import (
+    PAIRS,
+    PREDICTION_SECONDS,
+    TECHNICAL_INDICATORS,
+    legacy_preprocess_features,
+    synthetic_features,
+)
+from feature_reader import preprocess_features
+from feature_vector import FeatureVectorPlan
+
+
+@pytest.fixture(scope='module')
+def data() -> pd.DataFrame:
+    return synthetic_features(days=7)
+
+
+def _as_float32(features: pd.DataFrame) -> pd.DataFrame:
+    """
+    The legacy features in float32, as the pivot based preprocessing gives them
+    """
+    float_columns = features.select_dtypes('float64').columns
+    features = features.astype(dict.fromkeys(float_columns, 'float32'))
+    return features.reset_index(drop=True)
+
+
+def test_training_features_match_legacy(data: pd.DataFrame):
+    args = (data, PAIRS, TECHNICAL_INDICATORS, PREDICTION_SECONDS, True)
+
+    features = preprocess_features(*args)
+
+    assert features['timestamp_ms'].dtype == 'int64'
+    pd.testing.assert_frame_equal(
+        features.reset_index(drop=True),
+        _as_float32(legacy_preprocess_features(*args)),
+    )
+
+
+def test_inference_features_match_legacy(data: pd.DataFrame):
+    # the latest candle of each pair, as the online feature store returns them
+    latest = data.sort_values('window_end_ms').groupby('pair').tail(1)
+    args = (latest, PAIRS, TECHNICAL_INDICATORS, PREDICTION_SECONDS, False)
+
+    pd.testing.assert_frame_equal(
+        preprocess_features(*args).reset_index(drop=True),
+        _as_float32(legacy_preprocess_features(*args)),
+    )
+
+
+def test_feature_vector_plan_matches_preprocessing(data: pd.DataFrame):
+    # the raw features of the pairs at random windows, sometimes not the same one
+    plan = FeatureVectorPlan(PAIRS, TECHNICAL_INDICATORS)
+    rng = np.random.default_rng(0)
+    rows_by_pair = {
+        pair: rows.to_dict(orient='records') for pair, rows in data.groupby('pair')
+    }
+    for _ in range(200):
+        i = int(rng.integers(0, len(rows_by_pair[PAIRS[0]]) - 1))
+        rows = {
+            pair: rows[min(i + int(rng.random() < 0.1), len(rows) - 1)]
+            for pair, rows in rows_by_pair.items()
+        }
+
+        features = preprocess_features(
+            pd.DataFrame(list(rows.values())),
+            PAIRS,
+            TECHNICAL_INDICATORS,
+            PREDICTION_SECONDS,
+            False,
+        )
+
+        assert list(features.columns) == plan.columns
+        np.testing.assert_array_equal(
+            features.to_numpy(dtype='float32'), plan.assemble(rows)
+        )
@@ -0,0 +1,137 @@
+"""
+When the models of the `PredictorHost` predict each window, with the online feature
+cache.
+"""
+
+from typing import Dict, List
+
+import pytest
+
+import predictor_host
+from config import comet_ml_credentials, hopsworks_credentials
+from predictor_host import PredictorHost
+
+PAIRS = ['BTC/USD', 'ETH/USD']
+
+
+class FakePrediction:
+    def __init__(self, model_name: str, rows: Dict[str, dict]):
+        self.model_name = model_name
+        self.windows = {pair: row['window_end_ms'] for pair, row in rows.items()}
+
+    def to_dict(self) -> dict:
+        return {'model_name': self.model_name, 'windows': self.windows}
+
+
+class FakePricePredictor:
+    """
+    A model of `pair_to_predict` that uses the features of `PAIRS`
+    """
+
+    def __init__(self, pair_to_predict: str, prediction_seconds: int, **kwargs):
+        self.model_name = f'{pair_to_predict}_{prediction_seconds}'
+        self.inference_params = {
+            'pairs_as_features': [pair_to_predict]
+            + [pair for pair in PAIRS if pair != pair_to_predict],
+            'technical_indicators_as_features': ['rsi_14'],
+            'feature_view_name': 'feature_view',
+            'feature_view_version': 1,
+            'candle_seconds': 60,
+            'prediction_seconds': prediction_seconds,
+            'llm_model_name_news_signals': 'dummy',
+        }
+
+    def predict_from_raw_features(self, rows: Dict[str, dict]) -> FakePrediction:
+        return FakePrediction(self.model_name, rows)
+
+
+class FakeFeatureReader:
+    """
+    Reads the latest features of each pair from `ROWS`
+    """
+
+    def __init__(self, pairs_as_features: List[str], **kwargs):
+        self.pairs_as_features = pairs_as_features
+
+    def get_latest_raw_features(self) -> Dict[str, dict]:
+        return {pair: ROWS[pair] for pair in self.pairs_as_features if pair in ROWS}
+
+
+class FakeOnlineFeatureCache:
+    def __init__(self, **kwargs):
+        pass
+
+
+ROWS: Dict[str, dict] = {}
+
+
+@pytest.fixture
+def host(monkeypatch) -> PredictorHost:
+    monkeypatch.setattr(predictor_host, 'PricePredictor', FakePricePredictor)
+    monkeypatch.setattr(predictor_host, 'FeatureReader', FakeFeatureReader)
+    monkeypatch.setattr(predictor_host, 'OnlineFeatureCache', FakeOnlineFeatureCache)
+    ROWS.clear()
+    return PredictorHost(
+        pairs_to_predict=['BTC/USD'],
+        candle_seconds=60,
+        predictions_seconds=[300],
+        model_status='Development',
+        comet_config=comet_ml_credentials,
+        hopsworks_config=hopsworks_credentials,
+        use_online_feature_cache=True,
+    )
+
+
+def candle(host: PredictorHost, pair: str, window_end_ms: int) -> List[dict]:
+    """
+    The candle of the pair arrives: the cache has its features and the host predicts
+    """
+    ROWS[pair] = {'pair': pair, 'window_end_ms': window_end_ms}
+    return host.predict(ROWS[pair])
+
+
+def test_ready_when_the_last_pair_arrives(host):
+    candle(host, 'BTC/USD', 0)
+    assert len(candle(host, 'ETH/USD', 0)) == 1
+
+    assert candle(host, 'BTC/USD', 60_000) == []
+
+    # the features of all the pairs are for the window
+    predictions = candle(host, 'ETH/USD', 60_000)
+
+    assert predictions == [
+        {
+            'model_name': 'BTC/USD_300',
+            'windows': {'BTC/USD': 60_000, 'ETH/USD': 60_000},
+        }
+    ]
+    # once per window
+    assert candle(host, 'BTC/USD', 60_000) == []
+
+
+def test_waiting_model_predicts_the_old_window_and_waits_for_the_new_one(host):
+    candle(host, 'BTC/USD', 0)
+    assert len(candle(host, 'ETH/USD', 0)) == 1
+    assert candle(host, 'BTC/USD', 60_000) == []
+
+    # the next window starts before the features of ETH/USD for the first one arrive:
+    # the first window predicts with the features we have
+    predictions = candle(host, 'BTC/USD', 120_000)
+
+    assert predictions == [
+        {'model_name': 'BTC/USD_300', 'windows': {'BTC/USD': 120_000, 'ETH/USD': 0}}
+    ]
+
+    # the late features of the first window do not make it predict again
+    assert candle(host, 'ETH/USD', 60_000) == []
+
+    # the new window predicts once its features are complete
+    predictions = candle(host, 'ETH/USD', 120_000)
+
+    assert predictions == [
+        {
+            'model_name': 'BTC/USD_300',
+            'windows': {'BTC/USD': 120_000, 'ETH/USD': 120_000},
+        }
+    ]
+    assert candle(host, 'ETH/USD', 120_000) == []
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import comet_ml
 import joblib
 import pandas as pd
@@ -44,6 +46,8 @@ def train(
     prediction_seconds: int,
     llm_model_name_news_signals: str,
     days_back: int,
+    training_data_cache_dir: Optional[str],
+    training_data_chunk_days: Optional[int],
     comet_ml_api_key: str,
     comet_ml_project_name: str,
     hyperparameter_tuning_search_trials: int,
@@ -75,6 +79,9 @@ def train(
         prediction_seconds: The number of seconds into the future to predict
         llm_model_name_news_signals: The name of the LLM model to use for the news signals
         days_back: The number of days to consider for the historical data
+        training_data_cache_dir: The folder of the local cache of the training data
+        training_data_chunk_days: The number of days of training data to read and
+            preprocess at a time
         comet_ml_api_key: The API key for the CometML project
         comet_ml_project_name: The name of the CometML project
         hyperparameter_tuning_search_trials: The number of trials to perform for hyperparameter tuning
@@ -122,10 +129,13 @@ def train(
         technical_indicators_as_features,
         prediction_seconds,
         llm_model_name_news_signals,
+        training_data_cache_dir=training_data_cache_dir,
     )
 
     logger.info(f'Reading feature data for {days_back} days back...')
-    features_and_target = feature_reader.get_training_data(days_back=days_back)
+    features_and_target = feature_reader.get_training_data(
+        days_back=days_back, chunk_days=training_data_chunk_days
+    )
     logger.info(f'Got {len(features_and_target)} rows')
 
     # breakpoint()
@@ -247,6 +257,8 @@ def main():
         prediction_seconds=training_config.prediction_seconds,
         llm_model_name_news_signals=training_config.llm_model_name_news_signals,
         days_back=training_config.days_back,
+        training_data_cache_dir=training_config.training_data_cache_dir,
+        training_data_chunk_days=training_config.training_data_chunk_days,
         comet_ml_api_key=comet_ml_credentials.api_key,
         comet_ml_project_name=comet_ml_credentials.project_name,
         hyperparameter_tuning_search_trials=training_config.hyperparameter_tuning_search_trials,
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+from loguru import logger
+
+# The offline feature store gets the rows of a day some time after the day ends (the
+# to-feature-store batches and the materialization job), so we only cache the days
+# that ended this long before now, and read the newer ones from the feature store
+# every time
+SETTLED_AFTER = timedelta(hours=6)
+
+# The event time of the technical indicators feature group
+EVENT_TIME_COLUMN = 'timestamp_ms'
+
+Fetch = Callable[[datetime, datetime], pd.DataFrame]
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _to_ms(time: datetime) -> int:
+    return int(time.timestamp() * 1000)
+
+
+class TrainingDataCache:
+    """
+    Local cache of the raw training data of a feature view, one Parquet file per day.
+
+    The files of a feature view, version and set of pairs are in their own folder,
+    named after a hash of them, so a change of any of them never reads stale data:
+
+        <cache_dir>/<feature view>_<version>_<hash>/2025-01-31.parquet
+
+    Every run reads the cached days from disk and only fetches the missing days and
+    the tail (today and the days that are not settled yet) from the feature store, in
+    as few reads as possible. The raw rows are cached, before the preprocessing, so
+    changing the technical indicators or the prediction seconds still uses the cache.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        feature_view_name: str,
+        feature_view_version: int,
+        pairs: list[str],
+    ):
+        """
+        Args:
+            cache_dir: The folder of the cache
+            feature_view_name: The name of the feature view we read
+            feature_view_version: The version of the feature view we read
+            pairs: The pairs we keep, the other rows are not cached
+        """
+        self.pairs = sorted(set(pairs))
+
+        key = {
+            'feature_view_name': feature_view_name,
+            'feature_view_version': feature_view_version,
+            'pairs': self.pairs,
+        }
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        self.path = (
+            Path(cache_dir)
+            / f'{feature_view_name}_{feature_view_version}_{digest[:12]}'
+        )
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / 'key.json').write_text(json.dumps(key, indent=2))
+
+    def _day_path(self, day: date) -> Path:
+        return self.path / f'{day.isoformat()}.parquet'
+
+    def read(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        fetch: Fetch,
+    ) -> pd.DataFrame:
+        """
+        Returns the raw rows between `start_time` and `end_time`, from the cache and
+        from `fetch` for the days we do not have
+
+        Args:
+            start_time: The start of the time range, timezone aware
+            end_time: The end of the time range, timezone aware
+            fetch: Reads the rows of a time range from the feature store, e.g.
+                `feature_view.get_batch_data`
+        Returns:
+            The rows of the pairs of the cache, in no particular order
+        """
+        # the days that are complete and settled now can be cached, and we only need
+        # them up to the day of `end_time`. The days are settled or not depending on
+        # the current time, not on `end_time`, so the chunks of the training data that
+        # end in the past are read from the cache only
+        last_settled_day = (
+            datetime.now(tz=timezone.utc) - SETTLED_AFTER
+        ).date() - timedelta(days=1)
+        last_day = (end_time - timedelta(microseconds=1)).date()
+        last_cached_day = min(last_settled_day, last_day)
+        days = [
+            start_time.date() + timedelta(days=i)
+            for i in range((last_cached_day - start_time.date()).days + 1)
+        ]
+        missing_days = [day for day in days if not self._day_path(day).exists()]
+
+        # the tail are the days that are not settled yet, if the range has any
+        tail_start = _day_start(last_cached_day + timedelta(days=1))
+        has_tail = tail_start < end_time
+        logger.info(
+            f'Training data cache: {len(days) - len(missing_days)} days cached, '
+            f'{len(missing_days)} days to fetch'
+            + (f' and the tail after {last_cached_day}' if has_tail else '')
+        )
+
+        # fetch the runs of consecutive missing days in one read each, and the last
+        # run together with the tail
+        ranges = []
+        for day in missing_days:
+            if ranges and ranges[-1][1] == _day_start(day):
+                ranges[-1][1] = _day_start(day + timedelta(days=1))
+            else:
+                ranges.append([_day_start(day), _day_start(day + timedelta(days=1))])
+        if has_tail:
+            if ranges and ranges[-1][1] == tail_start:
+                ranges[-1][1] = end_time
+            else:
+                ranges.append([max(tail_start, start_time), end_time])
+
+        tail = []
+        for range_start, range_end in ranges:
+            logger.info(f'Fetching the training data from {range_start} to {range_end}')
+            data = fetch(range_start, range_end)
+            data = data[data['pair'].isin(self.pairs)]
+            self._write_days(data, range_start, min(range_end, tail_start))
+            tail.append(data[data[EVENT_TIME_COLUMN] >= _to_ms(tail_start)])
+
+        # every settled day is in the cache now
+        frames = [pd.read_parquet(self._day_path(day)) for day in days] + tail
+        data = pd.concat(frames, ignore_index=True)
+        in_range = (data[EVENT_TIME_COLUMN] >= _to_ms(start_time)) & (
+            data[EVENT_TIME_COLUMN] < _to_ms(end_time)
+        )
+        return data[in_range]
+
+    def _write_days(self, data: pd.DataFrame, start: datetime, end: datetime) -> None:
+        """
+        Writes one file per day between `start` and `end`, even for the days without
+        rows, so we do not fetch them again
+        """
+        day = start.date()
+        while _day_start(day) < end:
+            next_day_start = _day_start(day + timedelta(days=1))
+            rows = data[
+                (data[EVENT_TIME_COLUMN] >= _to_ms(_day_start(day)))
+                & (data[EVENT_TIME_COLUMN] < _to_ms(next_day_start))
+            ]
+            # write to a temporary file first, so an interrupted run never leaves
+            # half a day in the cache
+            path = self._day_path(day)
+            tmp_path = path.with_suffix('.tmp')
+            rows.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            day += timedelta(days=1)
@@ -0,0 +1,159 @@
+import time
+
+import numpy as np
+from candle import MAX_CANDLES_TO_FILL, flat_candle, missing_windows
+from loguru import logger
+from quixstreams import Application
+from quixstreams.models import Topic
+from technical_indicators import compute_indicators_batch
+
+
+def read_candles(
+    app: Application,
+    input_topic: Topic,
+    candle_seconds: int,
+    idle_timeout_seconds: float,
+) -> dict[str, list[dict]]:
+    """
+    Reads all the candles in the input topic in bulk, until no new messages arrive
+    for `idle_timeout_seconds`.
+
+    The candles service can emit several (incomplete) candles for the same window,
+    so we only keep the last one we get for each window.
+
+    Args:
+        app: The Quix Streams application
+        input_topic: The topic to read the candles from
+        candle_seconds: The number of seconds per candle
+        idle_timeout_seconds: Seconds without new messages after which we stop reading
+    Returns:
+        The candles of each message key (pair), sorted by window
+    """
+    candles_per_key: dict[str, dict[int, dict]] = {}
+    n_messages = 0
+
+    with app.get_consumer(auto_commit_enable=False) as consumer:
+        consumer.subscribe([input_topic.name])
+
+        last_message_time = time.monotonic()
+        while time.monotonic() - last_message_time < idle_timeout_seconds:
+            msg = consumer.poll(timeout=1.0)
+            if msg is None:
+                continue
+            if msg.error():
+                logger.error(f'Error reading candles: {msg.error()}')
+                continue
+
+            last_message_time = time.monotonic()
+            n_messages += 1
+
+            message = input_topic.deserialize(msg)
+            candle = message.value
+            if candle['candle_seconds'] != candle_seconds:
+                continue
+
+            candles_per_key.setdefault(message.key, {})[candle['window_start_ms']] = (
+                candle
+            )
+
+    logger.info(f'Read {n_messages} messages for {len(candles_per_key)} pairs')
+
+    return {
+        key: [candles[window] for window in sorted(candles)]
+        for key, candles in candles_per_key.items()
+    }
+
+
+def add_indicators(candles: list[dict]) -> list[dict]:
+    """
+    Computes the technical indicators for all the candles of a pair in one pass
+
+    As in the streaming app, the windows without candles are filled with flat
+    candles before computing the indicators, but we only send the real candles.
+
+    Args:
+        candles: The candles of a pair, sorted by window
+    Returns:
+        The messages with the same schema the streaming app sends to the output topic
+    """
+    series = [candles[0]]
+    positions = [0]
+    for previous, candle in zip(candles, candles[1:], strict=False):
+        series += [
+            flat_candle(candle, window_start_ms, previous['close'])
+            for window_start_ms in missing_windows(
+                previous['window_end_ms'], candle, MAX_CANDLES_TO_FILL
+            )
+        ]
+        positions.append(len(series))
+        series.append(candle)
+
+    high = np.array([candle['high'] for candle in series], dtype=np.float64)
+    low = np.array([candle['low'] for candle in series], dtype=np.float64)
+    close = np.array([candle['close'] for candle in series], dtype=np.float64)
+    volume = np.array([candle['volume'] for candle in series], dtype=np.float64)
+
+    indicators = compute_indicators_batch(high, low, close, volume)
+
+    # plain python floats (NaN for the warm-up candles) as in the streaming app
+    columns = {name: values[positions].tolist() for name, values in indicators.items()}
+
+    coin = candles[0]['pair'].split('/')[0]
+
+    return [
+        {
+            **candle,
+            **{name: values[i] for name, values in columns.items()},
+            'coin': coin,
+        }
+        for i, candle in enumerate(candles)
+    ]
+
+
+def backfill(
+    app: Application,
+    input_topic: Topic,
+    output_topic: Topic,
+    candle_seconds: int,
+    idle_timeout_seconds: float = 10.0,
+):
+    """
+    Batch alternative to the streaming app for historical data:
+    1. Reads all the candles from the input topic in bulk
+    2. Computes the technical indicators of each pair with the vectorized TA-Lib
+       functions over the whole series
+    3. Sends the messages to the output topic
+
+    Args:
+        app: The Quix Streams application
+        input_topic: The topic to read the candles from
+        output_topic: The topic to send technical indicators to
+        candle_seconds: The number of seconds per candle
+        idle_timeout_seconds: Seconds without new messages after which we stop reading
+    Returns:
+        None
+    """
+    start_time = time.monotonic()
+
+    candles_per_key = read_candles(
+        app, input_topic, candle_seconds, idle_timeout_seconds
+    )
+
+    n_messages = 0
+    with app.get_producer() as producer:
+        for key, candles in candles_per_key.items():
+            messages = add_indicators(candles)
+            logger.info(f'Computed indicators for {len(messages)} candles of {key}')
+
+            for message in messages:
+                kafka_message = output_topic.serialize(key=key, value=message)
+                producer.produce(
+                    topic=output_topic.name,
+                    value=kafka_message.value,
+                    key=kafka_message.key,
+                )
+            n_messages += len(messages)
+
+    logger.info(
+        f'Backfilled {n_messages} messages in {time.monotonic() - start_time:.1f} seconds'
+    )
@@ -0,0 +1,112 @@
+"""
+Benchmark of the JSON and binary codecs of `streaming_common.serialization`.
+
+It uses the trades recorded from the trades topic in
+`../to-feature-store/technical_indicators.csv` (a Redpanda Console export), and the
+technical indicators computed for random candles. Other exports can be benchmarked
+passing the file and the schema of its messages:
+
+    uv run python benchmark_serialization.py
+    uv run python benchmark_serialization.py candles.csv candle
+"""
+
+import csv
+import math
+import sys
+import time
+from typing import List
+
+import numpy as np
+from backfill import add_indicators
+from quixstreams.models import MessageField
+from quixstreams.models.serializers import SerializationContext
+from quixstreams.utils.json import dumps
+from streaming_common.serialization import BinarySerializer, MessageDeserializer
+
+RECORDED_TRADES = '../to-feature-store/technical_indicators.csv'
+N_REPEATS = 20
+
+
+def read_recorded(path: str) -> List[dict]:
+    """
+    Reads the message values of a Redpanda Console CSV export
+    """
+    deserializer = MessageDeserializer()
+    ctx = SerializationContext(topic='benchmark', field=MessageField.VALUE)
+    with open(path, newline='') as f:
+        return [deserializer(row['value'].encode(), ctx) for row in csv.DictReader(f)]
+
+
+def random_indicators(n_candles: int = 1000, seed: int = 42) -> List[dict]:
+    """
+    Technical indicators messages for a random walk of 1 minute candles
+    """
+    rng = np.random.default_rng(seed)
+    close = 100_000 * np.exp(np.cumsum(rng.normal(0, 1e-3, n_candles)))
+    candles = [
+        {
+            'pair': 'BTC/USD',
+            'timestamp_ms': (i + 1) * 60_000 - 1,
+            'open': float(close[i - 1] if i else close[i]),
+            'high': float(close[i] * 1.001),
+            'low': float(close[i] * 0.999),
+            'close': float(close[i]),
+            'volume': float(rng.exponential(1)),
+            'window_start_ms': i * 60_000,
+            'window_end_ms': (i + 1) * 60_000,
+            'candle_seconds': 60,
+        }
+        for i in range(n_candles)
+    ]
+    return add_indicators(candles)
+
+
+def same(decoded: dict, message: dict) -> bool:
+    return all(
+        (math.isnan(value) and math.isnan(decoded[name]))
+        if isinstance(value, float) and math.isnan(value)
+        else decoded[name] == value
+        for name, value in message.items()
+        if value is not None
+    )
+
+
+def benchmark(name: str, schema: str, messages: List[dict]) -> None:
+    ctx = SerializationContext(topic='benchmark', field=MessageField.VALUE)
+    serializer = BinarySerializer(schema)
+    deserializer = MessageDeserializer()
+
+    codecs = {
+        'json': lambda message: dumps(message),
+        'binary': lambda message: serializer(message, ctx),
+    }
+
+    print(f'\n{name}: {len(messages)} messages')
+    for codec, serialize in codecs.items():
+        start = time.perf_counter()
+        for _ in range(N_REPEATS):
+            payloads = [serialize(message) for message in messages]
+        encode_us = (time.perf_counter() - start) / N_REPEATS / len(messages) * 1e6
+
+        start = time.perf_counter()
+        for _ in range(N_REPEATS):
+            decoded = [deserializer(payload, ctx) for payload in payloads]
+        decode_us = (time.perf_counter() - start) / N_REPEATS / len(messages) * 1e6
+
+        if codec == 'binary':
+            assert all(map(same, decoded, messages)), 'Binary round trip failed'
+
+        size = sum(len(payload) for payload in payloads) / len(payloads)
+        print(
+            f'  {codec:<7} {size:7.1f} bytes/msg  encode {encode_us:5.2f} us/msg  '
+            f'decode {decode_us:5.2f} us/msg'
+        )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        path, schema = sys.argv[1:]
+        benchmark(f'{path} ({schema})', schema, read_recorded(path))
+    else:
+        benchmark('Recorded trades', 'trade', read_recorded(RECORDED_TRADES))
+        benchmark('Technical indicators', 'technical_indicators', random_indicators())
@@ -1,19 +1,272 @@
+import base64
+import struct
+from typing import Optional, Union
+
+import numpy as np
 from config import config
 from loguru import logger
+from prometheus_client import Counter
 from quixstreams import State
 
 MAX_CANDLES_IN_STATE = config.max_candles_in_state
+MAX_CANDLES_TO_FILL = config.max_candles_to_fill
+
+FILLED_CANDLES = Counter(
+    'filled_candles_total',
+    'Flat candles filled in the state for windows without candles',
+    ['pair'],
+)
+
+
+class CandleBuffer:
+    """
+    Fixed-capacity columnar ring buffer with the last candles of a pair.
+
+    Each field is stored in its own float64 row, so appending or replacing the last
+    candle is O(1) and the whole buffer is serialized as one binary blob, instead of
+    a JSON list of dicts.
+    """
+
+    FIELDS = (
+        'open',
+        'high',
+        'low',
+        'close',
+        'volume',
+        'window_start_ms',
+        'window_end_ms',
+    )
+    _WINDOW_START = FIELDS.index('window_start_ms')
+    _WINDOW_END = FIELDS.index('window_end_ms')
+
+    # capacity, index of the oldest candle, number of candles
+    _HEADER = struct.Struct('<III')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros((len(self.FIELDS), capacity), dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, candle: dict) -> None:
+        """
+        Adds the candle at the end of the buffer, overwriting the oldest candle if
+        the buffer is full
+        """
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+        self._write(self._last_index(), candle)
+
+    def replace_last(self, candle: dict) -> None:
+        """
+        Replaces the last candle in the buffer
+        """
+        self._write(self._last_index(), candle)
+
+    def fill(self, window_starts_ms: list[int], window_ms: int, close: float) -> None:
+        """
+        Appends flat candles (open = high = low = close, zero volume) for the given
+        windows in one go, overwriting the oldest candles if the buffer is full
+        """
+        # only the latest `capacity` candles fit in the buffer
+        window_starts = np.array(window_starts_ms[-self.capacity :], dtype=np.float64)
+        n = len(window_starts)
+        if not n:
+            return
+
+        indices = (self._start + self._size + np.arange(n)) % self.capacity
+        # open, high, low and close stay at the given price and the volume is zero
+        self._data[:4, indices] = close
+        self._data[4, indices] = 0.0
+        self._data[self._WINDOW_START, indices] = window_starts
+        self._data[self._WINDOW_END, indices] = window_starts + window_ms
+
+        overflow = max(self._size + n - self.capacity, 0)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def last(self, field: str) -> float:
+        """
+        Returns the value of the given field for the last candle in the buffer
+        """
+        return float(self._data[self.FIELDS.index(field), self._last_index()])
+
+    def is_last_window(self, candle: dict) -> bool:
+        """
+        Check if the candle is in the same window as the last candle in the buffer
+        """
+        if not self._size:
+            return False
+        index = self._last_index()
+        return (
+            self._data[self._WINDOW_START, index] == candle['window_start_ms']
+            and self._data[self._WINDOW_END, index] == candle['window_end_ms']
+        )
+
+    def column(self, field: str) -> np.ndarray:
+        """
+        Returns the values of the given field, from the oldest to the latest candle
+        """
+        row = self._data[self.FIELDS.index(field)]
+        end = self._start + self._size
+        if end <= self.capacity:
+            return row[self._start : end]
+        return np.concatenate((row[self._start :], row[: end - self.capacity]))
+
+    def to_bytes(self) -> bytes:
+        return self._HEADER.pack(self.capacity, self._start, self._size) + (
+            self._data.tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, capacity: int) -> 'CandleBuffer':
+        """
+        Loads the buffer from its binary blob. If the blob was saved with a
+        different capacity, we keep the latest `capacity` candles.
+        """
+        saved_capacity, start, size = cls._HEADER.unpack_from(blob)
+        data = np.frombuffer(blob, dtype=np.float64, offset=cls._HEADER.size)
+
+        buffer = cls(saved_capacity)
+        buffer._data = data.reshape(len(cls.FIELDS), saved_capacity).copy()
+        buffer._start = start
+        buffer._size = size
+
+        if saved_capacity != capacity:
+            buffer = buffer._resized(capacity)
+
+        return buffer
+
+    @classmethod
+    def from_candles(cls, candles: list[dict], capacity: int) -> 'CandleBuffer':
+        buffer = cls(capacity)
+        for candle in candles[-capacity:]:
+            buffer.append(candle)
+        return buffer
+
+    def _resized(self, capacity: int) -> 'CandleBuffer':
+        buffer = CandleBuffer(capacity)
+        size = min(self._size, capacity)
+        for i, field in enumerate(self.FIELDS):
+            buffer._data[i, :size] = self.column(field)[self._size - size :]
+        buffer._size = size
+        return buffer
+
+    def _last_index(self) -> int:
+        return (self._start + self._size - 1) % self.capacity
+
+    def _write(self, index: int, candle: dict) -> None:
+        for i, field in enumerate(self.FIELDS):
+            self._data[i, index] = candle[field]
+
+
+def load_candles(state: State) -> CandleBuffer:
+    """
+    Loads the buffer of candles from the state
+
+    Args:
+        state: The state of our application
+    Returns:
+        The buffer with the last candles
+    """
+    candles: Optional[Union[str, list]] = state.get('candles', default=None)
+
+    if candles is None:
+        return CandleBuffer(MAX_CANDLES_IN_STATE)
+
+    if isinstance(candles, list):
+        # state written by a previous version of this service, as a list of dicts
+        return CandleBuffer.from_candles(candles, MAX_CANDLES_IN_STATE)
+
+    # The state is serialized as JSON, so we store the binary blob as base64
+    return CandleBuffer.from_bytes(base64.b64decode(candles), MAX_CANDLES_IN_STATE)
+
+
+def save_candles(candles: CandleBuffer, state: State) -> None:
+    """
+    Saves the buffer of candles to the state
+
+    Args:
+        candles: The buffer with the last candles
+        state: The state of our application
+    """
+    state.set('candles', base64.b64encode(candles.to_bytes()).decode('ascii'))
+
+
+def missing_windows(
+    last_window_end_ms: int, candle: dict, max_candles: int
+) -> list[int]:
+    """
+    Returns the start of the windows we did not get a candle for, between the last
+    candle we have and the given candle. This happens for low volume pairs, when no
+    trades happen in a window.
+
+    At most the latest `max_candles` missing windows are returned.
+
+    Args:
+        last_window_end_ms: The end of the window of the last candle we have
+        candle: The latest candle
+        max_candles: The maximum number of missing windows to return
+    Returns:
+        The start of the missing windows, from oldest to latest
+    """
+    window_ms = candle['candle_seconds'] * 1000
+    n_missing = (candle['window_start_ms'] - last_window_end_ms) // window_ms
+    n_missing = min(n_missing, max_candles)
+    if n_missing <= 0:
+        return []
+
+    return [candle['window_start_ms'] - i * window_ms for i in range(n_missing, 0, -1)]
+
+
+def flat_candle(candle: dict, window_start_ms: int, close: float) -> dict:
+    """
+    Synthetic candle for a window without trades: the price stays at the previous
+    close and the volume is zero
+    """
+    window_end_ms = window_start_ms + candle['candle_seconds'] * 1000
+    return {
+        'pair': candle['pair'],
+        'timestamp_ms': window_end_ms,
+        'open': close,
+        'high': close,
+        'low': close,
+        'close': close,
+        'volume': 0.0,
+        'window_start_ms': window_start_ms,
+        'window_end_ms': window_end_ms,
+        'candle_seconds': candle['candle_seconds'],
+    }
+
+
+def record_filled_candles(n_filled: int, pair: str, state: State) -> None:
+    """
+    Keeps count of the synthetic candles we filled for the pair
+    """
+    total = state.get('n_filled_candles', default=0) + n_filled
+    state.set('n_filled_candles', total)
+    FILLED_CANDLES.labels(pair=pair).inc(n_filled)
+    logger.info(f'Filled {n_filled} missing candles for {pair} ({total} in total)')
 
 
 def update_candles(candle: dict, state: State) -> dict:
     """
-    Updates the list of candles we have in our state using the latest candle
+    Updates the buffer of candles we have in our state using the latest candle
 
-    If the latest candle corresponds to a new window, and the total number
-    of candles in the state is less than the number of candles we want to keep,
-    we just append it to the list.
+    If the latest candle corresponds to a new window we append it to the buffer,
+    which drops the oldest candle once we have `MAX_CANDLES_IN_STATE` candles.
 
-    If it corresponds to the last window, we replace the last candle in the list.
+    If it corresponds to the last window, we replace the last candle in the buffer.
+
+    If there are windows without candles between the last candle and the latest
+    one, we fill them with flat candles (previous close and zero volume) so the
+    buffer always covers a fixed time span. At most `MAX_CANDLES_TO_FILL` windows
+    are filled.
 
     Args:
         candle: The latest candle
@@ -21,32 +274,33 @@ def update_candles(candle: dict, state: State) -> dict:
     Returns:
         candle: The latest candle
     """
-    # Get the list of candles from our state
-    candles = state.get('candles', default=[])  # We have a list of candles in the state
-
-    # If the state is empty, we just append the latest candle to the list
-    if not candles:
-        candles.append(candle)
+    # Get the buffer of candles from our state
+    candles = load_candles(state)
 
-    elif same_window(candle, candles[-1]):
+    if candles.is_last_window(candle):
         # If the latest candle is in the same window as the previous one, we update/replace the last candle
-        candles[-1] = candle
+        candles.replace_last(candle)
     else:
-        # If the latest candle is in a new window, we append it to the list
-        candles.append(candle)
+        if len(candles):
+            # Fill the windows without trades since the last candle
+            window_starts = missing_windows(
+                int(candles.last('window_end_ms')), candle, MAX_CANDLES_TO_FILL
+            )
+            if window_starts:
+                candles.fill(
+                    window_starts,
+                    window_ms=candle['candle_seconds'] * 1000,
+                    close=candles.last('close'),
+                )
+                record_filled_candles(len(window_starts), candle['pair'], state)
 
-    # If the total number of candles in the state is greater than the maximum number of
-    # candles we want to keep, we remove the oldest candle from the list
-    if len(candles) > MAX_CANDLES_IN_STATE:
-        candles.pop(0)
-
-    # TODO: we should check the candles have no missing windows
-    # This can happen for low volume pairs. In this case, we could interpolate the missing windows
+        # If the latest candle is in a new window, we append it to the buffer
+        candles.append(candle)
 
     logger.debug(f'Number of candles in state for {candle["pair"]}: {len(candles)}')
 
-    # Update the state with the new list of candles
-    state.set('candles', candles)
+    # Update the state with the new buffer of candles
+    save_candles(candles, state)
 
     return candle
 
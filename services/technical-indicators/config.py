@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,10 +8,16 @@ class Config(BaseSettings):
     kafka_broker_address: str
     kafka_input_topic: str
     kafka_output_topic: str
+    kafka_output_topic_codec: Literal['json', 'binary'] = 'json'
     kafka_consumer_group: str
     max_candles_in_state: int
+    # 0 disables filling the windows without candles
+    max_candles_to_fill: int = 60
     candle_seconds: int
     data_source: Literal['live', 'historical', 'test']
+    incremental_indicators: Optional[bool] = True
+    batch_backfill: Optional[bool] = False
+    metrics_port: Optional[int] = None
 
 
 config = Config()
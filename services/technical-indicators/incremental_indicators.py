@@ -0,0 +1,698 @@
+"""
+Incremental version of the technical indicators we compute in `technical_indicators.py`
+
+Instead of rebuilding NumPy arrays from all the candles in the state and running the
+TA-Lib functions over them on every message, each indicator keeps its running state
+(EMA accumulators, Wilder smoothers, rolling sums) and is updated in constant time
+per candle.
+
+The formulas replicate the TA-Lib C implementation of each indicator over the full
+history of candles (e.g. `talib.RSI(close)[-1]`), including its warm-up periods, so
+the values match the ones the vectorized backfill computes for the same candles.
+`tests/test_incremental_indicators.py` checks the parity against TA-Lib.
+"""
+
+import math
+from typing import Optional
+
+from candle import (
+    MAX_CANDLES_TO_FILL,
+    flat_candle,
+    missing_windows,
+    record_filled_candles,
+    same_window,
+)
+from quixstreams import State
+
+NAN = float('nan')
+
+
+def _is_zero(value: float) -> bool:
+    """
+    Same tolerance TA-Lib uses in its `TA_IS_ZERO` macro
+    """
+    return -1e-8 < value < 1e-8
+
+
+def _true_range(high: float, low: float, prev_close: float) -> float:
+    """
+    True range of a candle given the close of the previous candle
+    """
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class Stateful:
+    """
+    Base class for the building blocks of the engine.
+
+    The state of each object is the list of values of its `__slots__`, so it can be
+    stored as JSON in the Quix Streams state and loaded back.
+
+    Every indicator exposes an `update(..., commit)` method. With `commit=True` the
+    inputs are added to the running state. With `commit=False` we only get the value
+    the indicator would have, which is what we need for incomplete candles that will
+    be replaced by the next update of the same window.
+    """
+
+    __slots__ = ()
+
+    def to_state(self) -> list:
+        state = []
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, Stateful):
+                value = value.to_state()
+            elif isinstance(value, list):
+                value = list(value)
+            state.append(value)
+        return state
+
+    def load_state(self, state: list) -> None:
+        for name, value in zip(self.__slots__, state, strict=True):
+            current = getattr(self, name)
+            if isinstance(current, Stateful):
+                current.load_state(value)
+            else:
+                setattr(self, name, value)
+
+
+class RollingWindow(Stateful):
+    """
+    Fixed size circular buffer with the last `size` values
+    """
+
+    __slots__ = ('size', 'values', 'count')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+
+    def is_full(self) -> bool:
+        return self.count >= self.size
+
+    def oldest(self) -> float:
+        """
+        The value that will be overwritten by the next push
+        """
+        return self.values[self.count % self.size]
+
+    def last(self, n: int) -> list[float]:
+        """
+        The last `n` values pushed, from oldest to newest
+        """
+        n = min(n, self.count)
+        return [self.values[(self.count - n + i) % self.size] for i in range(n)]
+
+    def push(self, value: float) -> None:
+        self.values[self.count % self.size] = value
+        self.count += 1
+
+
+class SMA(Stateful):
+    """
+    Simple moving average (TA-Lib SMA)
+    """
+
+    __slots__ = ('period', 'window', 'total')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = RollingWindow(period)
+        self.total = 0.0
+
+    def update(self, value: float, commit: bool = True) -> float:
+        total = self.total + value
+        if self.window.is_full():
+            total -= self.window.oldest()
+
+        output = total / self.period if self.window.count + 1 >= self.period else NAN
+
+        if commit:
+            self.total = total
+            self.window.push(value)
+
+        return output
+
+
+class EMA(Stateful):
+    """
+    Exponential moving average (TA-Lib EMA), seeded with the SMA of the first
+    `period` values.
+
+    `skip` ignores the first values of the series, which TA-Lib does for the fast
+    EMA of the MACD so both EMAs start at the same candle.
+    """
+
+    __slots__ = ('period', 'skip', 'count', 'total', 'value')
+
+    def __init__(self, period: int, skip: int = 0):
+        self.period = period
+        self.skip = skip
+        self.count = 0
+        self.total = 0.0
+        self.value = 0.0
+
+    def update(self, value: float, commit: bool = True) -> float:
+        count = self.count + 1
+        total, ema, output = self.total, self.value, NAN
+
+        seen = count - self.skip
+        if 0 < seen < self.period:
+            total += value
+        elif seen == self.period:
+            ema = output = (total + value) / self.period
+        elif seen > self.period:
+            ema = output = (value - ema) * (2.0 / (self.period + 1)) + ema
+
+        if commit:
+            self.count, self.total, self.value = count, total, ema
+
+        return output
+
+
+class RSI(Stateful):
+    """
+    Relative Strength Index with Wilder's smoothing (TA-Lib RSI)
+    """
+
+    __slots__ = ('period', 'count', 'prev', 'gain', 'loss')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.prev = 0.0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, value: float, commit: bool = True) -> float:
+        count = self.count + 1
+        gain, loss, output = self.gain, self.loss, NAN
+
+        if count > 1:
+            diff = value - self.prev
+            up = diff if diff > 0 else 0.0
+            down = -diff if diff < 0 else 0.0
+
+            n_diffs = count - 1
+            if n_diffs < self.period:
+                # accumulate the gains and losses of the initial period
+                gain += up
+                loss += down
+            else:
+                if n_diffs == self.period:
+                    gain = (gain + up) / self.period
+                    loss = (loss + down) / self.period
+                else:
+                    gain = (gain * (self.period - 1) + up) / self.period
+                    loss = (loss * (self.period - 1) + down) / self.period
+
+                total = gain + loss
+                output = 100.0 * (gain / total) if not _is_zero(total) else 0.0
+
+        if commit:
+            self.count, self.prev, self.gain, self.loss = count, value, gain, loss
+
+        return output
+
+
+class MACD(Stateful):
+    """
+    Moving Average Convergence Divergence (TA-Lib MACD)
+
+    Returns the macd, signal and histogram values. TA-Lib only outputs them once the
+    signal line is available.
+    """
+
+    __slots__ = ('fast', 'slow', 'signal')
+
+    def __init__(self, fast_period: int, slow_period: int, signal_period: int):
+        self.fast = EMA(fast_period, skip=slow_period - fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+
+    def update(self, value: float, commit: bool = True) -> tuple[float, float, float]:
+        fast = self.fast.update(value, commit)
+        slow = self.slow.update(value, commit)
+        if math.isnan(slow):
+            return NAN, NAN, NAN
+
+        macd = fast - slow
+        signal = self.signal.update(macd, commit)
+        if math.isnan(signal):
+            return NAN, NAN, NAN
+
+        return macd, signal, macd - signal
+
+
+class BBANDS(Stateful):
+    """
+    Bollinger Bands around a simple moving average (TA-Lib BBANDS with matype=0)
+
+    Returns the upper, middle and lower bands.
+    """
+
+    __slots__ = ('period', 'nbdevup', 'nbdevdn', 'window', 'total', 'total_sq')
+
+    def __init__(self, period: int, nbdevup: float, nbdevdn: float):
+        self.period = period
+        self.nbdevup = nbdevup
+        self.nbdevdn = nbdevdn
+        self.window = RollingWindow(period)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, value: float, commit: bool = True) -> tuple[float, float, float]:
+        total = self.total + value
+        total_sq = self.total_sq + value * value
+        if self.window.is_full():
+            oldest = self.window.oldest()
+            total -= oldest
+            total_sq -= oldest * oldest
+
+        ready = self.window.count + 1 >= self.period
+
+        if commit:
+            self.total, self.total_sq = total, total_sq
+            self.window.push(value)
+
+        if not ready:
+            return NAN, NAN, NAN
+
+        middle = total / self.period
+        variance = total_sq / self.period - middle * middle
+        stddev = math.sqrt(variance) if variance >= 1e-8 else 0.0
+
+        return (
+            middle + stddev * self.nbdevup,
+            middle,
+            middle - stddev * self.nbdevdn,
+        )
+
+
+class STOCHRSI(Stateful):
+    """
+    Stochastic RSI (TA-Lib STOCHRSI with fastd_matype=0)
+
+    Returns the fast %K and fast %D values.
+    """
+
+    __slots__ = ('fastk_period', 'rsi', 'rsi_window', 'fastd')
+
+    def __init__(self, period: int, fastk_period: int, fastd_period: int):
+        self.fastk_period = fastk_period
+        self.rsi = RSI(period)
+        self.rsi_window = RollingWindow(fastk_period)
+        self.fastd = SMA(fastd_period)
+
+    def update(self, value: float, commit: bool = True) -> tuple[float, float]:
+        rsi = self.rsi.update(value, commit)
+        if math.isnan(rsi):
+            return NAN, NAN
+
+        window = self.rsi_window.last(self.fastk_period - 1) + [rsi]
+        if commit:
+            self.rsi_window.push(rsi)
+
+        if len(window) < self.fastk_period:
+            return NAN, NAN
+
+        lowest = min(window)
+        diff = (max(window) - lowest) / 100.0
+        fastk = (rsi - lowest) / diff if not _is_zero(diff) else 0.0
+
+        fastd = self.fastd.update(fastk, commit)
+        if math.isnan(fastd):
+            return NAN, NAN
+
+        return fastk, fastd
+
+
+class ADX(Stateful):
+    """
+    Average Directional Movement Index (TA-Lib ADX)
+    """
+
+    __slots__ = (
+        'period',
+        'count',
+        'prev_high',
+        'prev_low',
+        'prev_close',
+        'plus_dm',
+        'minus_dm',
+        'tr',
+        'sum_dx',
+        'adx',
+    )
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.prev_high = 0.0
+        self.prev_low = 0.0
+        self.prev_close = 0.0
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.sum_dx = 0.0
+        self.adx = 0.0
+
+    def update(
+        self, high: float, low: float, close: float, commit: bool = True
+    ) -> float:
+        n = self.period
+        index = self.count
+        plus_dm, minus_dm, tr = self.plus_dm, self.minus_dm, self.tr
+        sum_dx, adx, output = self.sum_dx, self.adx, NAN
+
+        if index > 0:
+            diff_plus = high - self.prev_high
+            diff_minus = self.prev_low - low
+            true_range = _true_range(high, low, self.prev_close)
+
+            if index >= n:
+                # Wilder's smoothing once the initial period is accumulated
+                minus_dm -= minus_dm / n
+                plus_dm -= plus_dm / n
+                tr = tr - tr / n
+
+            if diff_minus > 0 and diff_plus < diff_minus:
+                minus_dm += diff_minus
+            elif diff_plus > 0 and diff_plus > diff_minus:
+                plus_dm += diff_plus
+            tr += true_range
+
+            if index >= n:
+                dx = None
+                if not _is_zero(tr):
+                    minus_di = 100.0 * (minus_dm / tr)
+                    plus_di = 100.0 * (plus_dm / tr)
+                    total_di = minus_di + plus_di
+                    if not _is_zero(total_di):
+                        dx = 100.0 * (abs(minus_di - plus_di) / total_di)
+
+                if index < 2 * n - 1:
+                    sum_dx += dx or 0.0
+                elif index == 2 * n - 1:
+                    adx = output = (sum_dx + (dx or 0.0)) / n
+                else:
+                    if dx is not None:
+                        adx = ((adx * (n - 1)) + dx) / n
+                    output = adx
+
+        if commit:
+            self.count = index + 1
+            self.prev_high, self.prev_low, self.prev_close = high, low, close
+            self.plus_dm, self.minus_dm, self.tr = plus_dm, minus_dm, tr
+            self.sum_dx, self.adx = sum_dx, adx
+
+        return output
+
+
+class ATR(Stateful):
+    """
+    Average True Range with Wilder's smoothing (TA-Lib ATR)
+    """
+
+    __slots__ = ('period', 'count', 'prev_close', 'atr')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.prev_close = 0.0
+        self.atr = 0.0
+
+    def update(
+        self, high: float, low: float, close: float, commit: bool = True
+    ) -> float:
+        index = self.count
+        atr, output = self.atr, NAN
+
+        if index > 0:
+            true_range = _true_range(high, low, self.prev_close)
+            if index < self.period:
+                # while warming up `atr` holds the sum of the true ranges
+                atr += true_range
+            elif index == self.period:
+                atr = output = (atr + true_range) / self.period
+            else:
+                atr = output = (atr * (self.period - 1) + true_range) / self.period
+
+        if commit:
+            self.count, self.prev_close, self.atr = index + 1, close, atr
+
+        return output
+
+
+class MFI(Stateful):
+    """
+    Money Flow Index (TA-Lib MFI)
+    """
+
+    __slots__ = (
+        'period',
+        'count',
+        'prev_typical_price',
+        'positive',
+        'negative',
+        'positive_total',
+        'negative_total',
+    )
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.prev_typical_price = 0.0
+        self.positive = RollingWindow(period)
+        self.negative = RollingWindow(period)
+        self.positive_total = 0.0
+        self.negative_total = 0.0
+
+    def update(
+        self,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        commit: bool = True,
+    ) -> float:
+        typical_price = (high + low + close) / 3.0
+        output = NAN
+
+        if self.count == 0:
+            if commit:
+                self.count, self.prev_typical_price = 1, typical_price
+            return output
+
+        money_flow = typical_price * volume
+        positive = money_flow if typical_price > self.prev_typical_price else 0.0
+        negative = money_flow if typical_price < self.prev_typical_price else 0.0
+
+        positive_total = self.positive_total + positive
+        negative_total = self.negative_total + negative
+        if self.positive.is_full():
+            positive_total -= self.positive.oldest()
+            negative_total -= self.negative.oldest()
+
+        if self.count >= self.period:
+            total = positive_total + negative_total
+            output = 100.0 * (positive_total / total) if total >= 1.0 else 0.0
+
+        if commit:
+            self.count += 1
+            self.prev_typical_price = typical_price
+            self.positive.push(positive)
+            self.negative.push(negative)
+            self.positive_total, self.negative_total = positive_total, negative_total
+
+        return output
+
+
+class ROC(Stateful):
+    """
+    Rate of change in percentage (TA-Lib ROC)
+    """
+
+    __slots__ = ('period', 'window')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = RollingWindow(period)
+
+    def update(self, value: float, commit: bool = True) -> float:
+        output = NAN
+        if self.window.is_full():
+            previous = self.window.oldest()
+            output = ((value / previous) - 1.0) * 100.0 if previous != 0.0 else 0.0
+
+        if commit:
+            self.window.push(value)
+
+        return output
+
+
+class IndicatorEngine(Stateful):
+    """
+    Computes the same indicators as `compute_indicators` incrementally.
+
+    The running state only includes fully formed candles. The last candle we got is
+    kept aside, because the candles service emits incomplete candles that are
+    replaced by the next update of the same window. It is only added to the running
+    state when a candle for a new window arrives.
+    """
+
+    __slots__ = (
+        'last_candle',
+        'rsi_9',
+        'rsi_14',
+        'rsi_21',
+        'macd',
+        'bbands',
+        'stochrsi',
+        'adx',
+        'volume_ema',
+        'ichimoku_conv',
+        'ichimoku_base',
+        'ichimoku_span_b',
+        'mfi',
+        'atr',
+        'price_roc',
+        'sma_7',
+        'sma_14',
+        'sma_21',
+    )
+
+    def __init__(self):
+        self.last_candle: Optional[dict] = None
+
+        # Same parameters as in `compute_indicators`
+        self.rsi_9 = RSI(9)
+        self.rsi_14 = RSI(14)
+        self.rsi_21 = RSI(21)
+        self.macd = MACD(fast_period=10, slow_period=24, signal_period=9)
+        self.bbands = BBANDS(period=20, nbdevup=2, nbdevdn=2)
+        self.stochrsi = STOCHRSI(period=10, fastk_period=5, fastd_period=3)
+        self.adx = ADX(14)
+        self.volume_ema = EMA(10)
+        self.ichimoku_conv = EMA(9)
+        self.ichimoku_base = EMA(20)
+        self.ichimoku_span_b = EMA(40)
+        self.mfi = MFI(10)
+        self.atr = ATR(10)
+        self.price_roc = ROC(6)
+        self.sma_7 = SMA(7)
+        self.sma_14 = SMA(14)
+        self.sma_21 = SMA(21)
+
+    @classmethod
+    def from_state(cls, state: Optional[list]) -> 'IndicatorEngine':
+        engine = cls()
+        if state is not None:
+            engine.load_state(state)
+        return engine
+
+    def update(self, candle: dict, max_candles_to_fill: int = 0) -> tuple[dict, int]:
+        """
+        Returns the latest candle with the indicators computed up to that candle
+
+        Args:
+            candle: The latest candle
+            max_candles_to_fill: The maximum number of flat candles added to the
+                running state for the windows without candles before the latest one
+        Returns:
+            The candle and its indicators, and the number of flat candles added
+        """
+        n_filled = 0
+
+        if self.last_candle is not None and not same_window(candle, self.last_candle):
+            # the previous candle is complete, so we add it to the running state
+            self._compute(self.last_candle, commit=True)
+
+            # and the windows without trades since then, as flat candles
+            for window_start_ms in missing_windows(
+                self.last_candle['window_end_ms'], candle, max_candles_to_fill
+            ):
+                self._compute(
+                    flat_candle(candle, window_start_ms, self.last_candle['close']),
+                    commit=True,
+                )
+                n_filled += 1
+
+        self.last_candle = candle
+
+        return {**candle, **self._compute(candle, commit=False)}, n_filled
+
+    def _compute(self, candle: dict, commit: bool) -> dict:
+        high = candle['high']
+        low = candle['low']
+        close = candle['close']
+        volume = candle['volume']
+
+        indicators = {}
+
+        indicators['rsi_9'] = self.rsi_9.update(close, commit)
+        indicators['rsi_14'] = self.rsi_14.update(close, commit)
+        indicators['rsi_21'] = self.rsi_21.update(close, commit)
+
+        indicators['macd'], indicators['macd_signal'], indicators['macd_hist'] = (
+            self.macd.update(close, commit)
+        )
+
+        (
+            indicators['bbands_upper'],
+            indicators['bbands_middle'],
+            indicators['bbands_lower'],
+        ) = self.bbands.update(close, commit)
+
+        indicators['stochrsi_fastk'], indicators['stochrsi_fastd'] = (
+            self.stochrsi.update(close, commit)
+        )
+
+        indicators['adx'] = self.adx.update(high, low, close, commit)
+
+        indicators['volume_ema'] = self.volume_ema.update(volume, commit)
+
+        conversion = self.ichimoku_conv.update(close, commit)
+        base = self.ichimoku_base.update(close, commit)
+        indicators['ichimoku_conv'] = conversion
+        indicators['ichimoku_base'] = base
+        indicators['ichimoku_span_a'] = (conversion + base) / 2
+        indicators['ichimoku_span_b'] = self.ichimoku_span_b.update(close, commit)
+
+        indicators['mfi'] = self.mfi.update(high, low, close, volume, commit)
+
+        indicators['atr'] = self.atr.update(high, low, close, commit)
+
+        indicators['price_roc'] = self.price_roc.update(close, commit)
+
+        indicators['sma_7'] = self.sma_7.update(close, commit)
+        indicators['sma_14'] = self.sma_14.update(close, commit)
+        indicators['sma_21'] = self.sma_21.update(close, commit)
+
+        return indicators
+
+
+def update_indicators(candle: dict, state: State) -> dict:
+    """
+    Computes the technical indicators for the latest candle, updating the running
+    state of the indicators we keep in the state
+
+    Args:
+        candle: The latest candle
+        state: The state of our application
+    Returns:
+        The latest candle with the technical indicators
+    """
+    engine = IndicatorEngine.from_state(state.get('indicators', default=None))
+
+    final_message, n_filled = engine.update(
+        candle, max_candles_to_fill=MAX_CANDLES_TO_FILL
+    )
+
+    state.set('indicators', engine.to_state())
+
+    if n_filled:
+        record_filled_candles(n_filled, candle['pair'], state)
+
+    return final_message
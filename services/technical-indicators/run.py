@@ -1,8 +1,20 @@
-from typing import Literal
+from typing import Literal, Optional
 
+from backfill import backfill
 from candle import update_candles
+from incremental_indicators import update_indicators
 from loguru import logger
 from quixstreams import Application
+from streaming_common.metrics import (
+    MESSAGES_OUT,
+    PROCESSING_SECONDS,
+    STATE_BYTES,
+    app_config,
+    directory_bytes,
+    start_server,
+)
+from streaming_common.serialization import Codec, MessageDeserializer, get_serializer
+from streaming_common.tracing import HopTracer
 from technical_indicators import compute_indicators
 
 
@@ -14,6 +26,10 @@ def main(
     max_candles_in_state: int,
     candle_seconds: int,
     data_source: Literal['live', 'historical', 'test'],
+    incremental_indicators: bool,
+    batch_backfill: bool,
+    kafka_output_topic_codec: Codec = 'json',
+    metrics_port: Optional[int] = None,
 ):
     """
     3 steps:
@@ -29,6 +45,12 @@ def main(
         # max_candles_in_state: The maximum number of candles to keep in the state
         candle_seconds: The number of seconds per candle
             data_source: The data source (live, historical, test)
+        incremental_indicators: Update the indicators in constant time per candle
+            instead of recomputing them from the candles in the state
+        batch_backfill: For historical data, compute the indicators for all the
+            candles in the input topic in one pass instead of streaming them
+        kafka_output_topic_codec: The codec of the output messages, 'json' or 'binary'
+        metrics_port: Serve the Prometheus metrics on this port
     Returns:
         None
     """
@@ -38,34 +60,72 @@ def main(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='latest' if data_source == 'live' else 'earliest',
+        # Count the messages and errors and track the consumer lag
+        **app_config(),
     )
 
+    STATE_BYTES.set_function(lambda: directory_bytes(app.config.state_dir))
+    start_server(metrics_port)
+
     # Define the input and output topics of our streaming application
     input_topic = app.topic(
         name=kafka_input_topic,
-        value_deserializer='json',
+        value_deserializer=MessageDeserializer(),  # Reads JSON and binary candles
     )
     output_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(
+            kafka_output_topic_codec, 'technical_indicators'
+        ),
     )
 
+    if data_source == 'historical' and batch_backfill:
+        # Read all the candles in bulk and compute the indicators with the vectorized
+        # TA-Lib functions
+        backfill(app, input_topic, output_topic, candle_seconds)
+        return
+
     # Create a Streaming DataFrame so we can start transforming data in real time
     sdf = app.dataframe(topic=input_topic)
 
+    tracer = HopTracer('technical-indicators')
+    sdf = sdf.update(tracer.on_input, metadata=True)
+
     # We only keep the candles with the same window size as the candle_seconds
     sdf = sdf[sdf['candle_seconds'] == candle_seconds]
 
-    # Update the list of candles in the state
-    sdf = sdf.apply(update_candles, stateful=True)
-
-    # Compute the technical indicators from the candles in the state
-    sdf = sdf.apply(compute_indicators, stateful=True)
+    if incremental_indicators:
+        # Update the running state of each indicator with the latest candle
+        sdf = sdf.apply(
+            PROCESSING_SECONDS.labels(step='update_indicators').time()(
+                update_indicators
+            ),
+            stateful=True,
+        )
+    else:
+        # Update the list of candles in the state
+        sdf = sdf.apply(
+            PROCESSING_SECONDS.labels(step='update_candles').time()(update_candles),
+            stateful=True,
+        )
+
+        # Compute the technical indicators from the candles in the state
+        sdf = sdf.apply(
+            PROCESSING_SECONDS.labels(step='compute_indicators').time()(
+                compute_indicators
+            ),
+            stateful=True,
+        )
 
     # Add a `coin` field to the final message (this line was added for the price predictor)
     sdf = sdf.apply(lambda value: {**value, 'coin': value['pair'].split('/')[0]})
 
-    sdf = sdf.update(lambda value: logger.debug(f'Final message: {value}'))
+    # Count the messages instead of logging each one
+    messages_out = MESSAGES_OUT.labels(topic=kafka_output_topic)
+    sdf = sdf.update(lambda _: messages_out.inc())
+
+    # Add our trace headers to the ones of the candle
+    sdf = sdf.set_headers(tracer.on_output)
 
     # Send the final messages to the output topic
     sdf = sdf.to_topic(output_topic)
@@ -84,4 +144,8 @@ if __name__ == '__main__':
         max_candles_in_state=config.max_candles_in_state,
         candle_seconds=config.candle_seconds,
         data_source=config.data_source,
+        incremental_indicators=config.incremental_indicators,
+        batch_backfill=config.batch_backfill,
+        kafka_output_topic_codec=config.kafka_output_topic_codec,
+        metrics_port=config.metrics_port,
     )
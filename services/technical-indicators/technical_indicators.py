@@ -1,4 +1,6 @@
 import numpy as np
+import talib
+from candle import load_candles
 from quixstreams import State
 from talib import stream
 
@@ -9,14 +11,14 @@ def compute_indicators(
     """
     Computes the technical indicators from the candles in the state
     """
-    candles = state.get('candles', [])
+    candles = load_candles(state)
 
     # extract open, high, low, close from the candles
-    # open = np.array([candle['open'] for candle in candles])
-    high = np.array([candle['high'] for candle in candles])
-    low = np.array([candle['low'] for candle in candles])
-    close = np.array([candle['close'] for candle in candles])
-    volume = np.array([candle['volume'] for candle in candles])
+    # open = candles.column('open')
+    high = candles.column('high')
+    low = candles.column('low')
+    close = candles.column('close')
+    volume = candles.column('volume')
 
     indicators = {}  # We have in total 10 indicators, and 23 values
 
@@ -98,3 +100,65 @@ def compute_indicators(
     # breakpoint()
 
     return final_message
+
+
+def compute_indicators_batch(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """
+    Computes the same technical indicators as `compute_indicators`, but for every
+    candle of a series at once, using the vectorized (non-`stream`) TA-Lib functions.
+
+    Args:
+        high: The high prices of the candles, from oldest to latest
+        low: The low prices of the candles
+        close: The close prices of the candles
+        volume: The volumes of the candles
+    Returns:
+        A dict with one array per indicator, aligned with the input candles
+    """
+    indicators = {}
+
+    indicators['rsi_9'] = talib.RSI(close, timeperiod=9)
+    indicators['rsi_14'] = talib.RSI(close, timeperiod=14)
+    indicators['rsi_21'] = talib.RSI(close, timeperiod=21)
+
+    indicators['macd'], indicators['macd_signal'], indicators['macd_hist'] = talib.MACD(
+        close, fastperiod=10, slowperiod=24, signalperiod=9
+    )
+
+    (
+        indicators['bbands_upper'],
+        indicators['bbands_middle'],
+        indicators['bbands_lower'],
+    ) = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+
+    indicators['stochrsi_fastk'], indicators['stochrsi_fastd'] = talib.STOCHRSI(
+        close, timeperiod=10, fastk_period=5, fastd_period=3, fastd_matype=0
+    )
+
+    indicators['adx'] = talib.ADX(high, low, close, timeperiod=14)
+
+    indicators['volume_ema'] = talib.EMA(volume, timeperiod=10)
+
+    conversion = talib.EMA(close, timeperiod=9)
+    base = talib.EMA(close, timeperiod=20)
+    indicators['ichimoku_conv'] = conversion
+    indicators['ichimoku_base'] = base
+    indicators['ichimoku_span_a'] = (conversion + base) / 2
+    indicators['ichimoku_span_b'] = talib.EMA(close, timeperiod=40)
+
+    indicators['mfi'] = talib.MFI(high, low, close, volume, timeperiod=10)
+
+    indicators['atr'] = talib.ATR(high, low, close, timeperiod=10)
+
+    indicators['price_roc'] = talib.ROC(close, timeperiod=6)
+
+    indicators['sma_7'] = talib.SMA(close, timeperiod=7)
+    indicators['sma_14'] = talib.SMA(close, timeperiod=14)
+    indicators['sma_21'] = talib.SMA(close, timeperiod=21)
+
+    return indicators
@@ -18,6 +18,8 @@ class Settings(BaseSettings):
 
     data_source: Literal['live', 'historical', 'test']
 
+    metrics_port: Optional[int] = None
+
 
 class HopsworksCredentials(BaseSettings):
     model_config = SettingsConfigDict(env_file='hops_credentials.env')
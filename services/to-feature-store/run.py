@@ -1,7 +1,9 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from loguru import logger
 from quixstreams import Application
+from streaming_common.metrics import app_config, start_server
+from streaming_common.serialization import MessageDeserializer
 
 # from quixstreams.sinks.core.csv import CSVSink
 from sinks import HopsworksFeatureStoreSink
@@ -13,6 +15,7 @@ def main(
     kafka_consumer_group: str,
     output_sink: HopsworksFeatureStoreSink,
     data_source: Literal['live', 'historical', 'test'],
+    metrics_port: Optional[int] = None,
 ):
     """
     2 things:
@@ -25,6 +28,7 @@ def main(
         kafka_consumer_group: The Kafka consumer group
         output_sink: The output sink
         data_source: The data source (live, historical, test)
+        metrics_port: Serve the Prometheus metrics on this port
     Returns:
         None
     """
@@ -34,9 +38,13 @@ def main(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='latest' if data_source == 'live' else 'earliest',
+        # Count the messages and errors and track the consumer lag
+        **app_config(),
     )
+    start_server(metrics_port)
 
-    input_topic = app.topic(kafka_input_topic, value_deserializer='json')
+    # Reads both JSON and binary messages
+    input_topic = app.topic(kafka_input_topic, value_deserializer=MessageDeserializer())
 
     # Push messages to Feature Store
     # TODO: Implement
@@ -79,4 +87,5 @@ if __name__ == '__main__':
         kafka_consumer_group=config.kafka_consumer_group,
         output_sink=hopsworks_sink,
         data_source=config.data_source,
+        metrics_port=config.metrics_port,
     )
@@ -4,6 +4,11 @@ import hopsworks
 import pandas as pd
 from loguru import logger
 from quixstreams.sinks.base import BatchingSink, SinkBackpressureError, SinkBatch
+from streaming_common.metrics import (
+    FEATURE_STORE_INSERT_SECONDS,
+    MESSAGES_OUT,
+    SINK_RETRIES,
+)
 
 
 class HopsworksFeatureStoreSink(BatchingSink):
@@ -53,6 +58,12 @@ class HopsworksFeatureStoreSink(BatchingSink):
         except Exception as e:
             logger.error(f'Failed to schedule materialization job: {e}')
 
+        self._insert_seconds = FEATURE_STORE_INSERT_SECONDS.labels(
+            feature_group=feature_group_name
+        )
+        self._rows_written = MESSAGES_OUT.labels(topic=feature_group_name)
+        self._retries = SINK_RETRIES.labels(sink=feature_group_name)
+
         # Call the parent BatchingSink constructor to initialize the batches
         super().__init__()
 
@@ -67,8 +78,10 @@ class HopsworksFeatureStoreSink(BatchingSink):
 
         try:
             # Try to write data to the db
-            self._feature_group.insert(data)
+            with self._insert_seconds.time():
+                self._feature_group.insert(data)
         except Exception as err:  # Capture the original exception
+            self._retries.inc()
             # In case of timeout, tell the app to wait for 30s
             # and retry the writing later
             raise SinkBackpressureError(
@@ -76,3 +89,5 @@ class HopsworksFeatureStoreSink(BatchingSink):
                 topic=batch.topic,
                 partition=batch.partition,
             ) from err  # Chain the exception
+
+        self._rows_written.inc(len(data))
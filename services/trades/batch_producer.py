@@ -0,0 +1,175 @@
+import time
+from typing import List, Optional
+
+from confluent_kafka import KafkaError, Message
+from loguru import logger
+from quixstreams.kafka import Producer
+from quixstreams.models import Topic
+from quixstreams.models.messages import KafkaMessage
+from streaming_common.metrics import ERRORS, MESSAGES_OUT, PROCESSING_SECONDS
+from streaming_common.tracing import now_ms, stamp
+
+from kraken_api.trade import Trade
+
+
+class BatchedTradesProducer:
+    """
+    Produces the batches of trades we get from the trades API to a Kafka topic.
+
+    Each batch is serialized in one pass before handing it to the producer, which
+    sends the messages in the background (see `linger.ms` in `run.py`). After each
+    batch we serve the delivery reports that are ready without waiting for the others.
+    We only wait for the messages to be delivered when the producer queue is full, and
+    on shutdown. The delivery reports update the counters of delivered and failed
+    messages, and instead of logging every trade we log one every `log_every_n_trades`
+    and the counters every `stats_interval_seconds`.
+    The counters are also exposed as Prometheus metrics, see streaming_common.metrics.
+    """
+
+    def __init__(
+        self,
+        producer: Producer,
+        topic: Topic,
+        log_every_n_trades: int = 1000,
+        stats_interval_seconds: float = 60.0,
+    ):
+        self.producer = producer
+        self.topic = topic
+        self.log_every_n_trades = log_every_n_trades
+        self.stats_interval_seconds = stats_interval_seconds
+
+        self.n_produced = 0
+        self.n_delivered = 0
+        self.n_failed = 0
+        self.n_serialization_errors = 0
+        self.last_error: Optional[KafkaError] = None
+        self._n_failed_at_deliver = 0
+
+        self._last_stats = time.monotonic()
+
+        self._messages_out = MESSAGES_OUT.labels(topic=topic.name)
+        self._serialization_errors = ERRORS.labels(kind='serialization')
+        self._producer_errors = ERRORS.labels(kind='producer')
+        self._produce_seconds = PROCESSING_SECONDS.labels(step='produce_batch')
+
+    def produce(self, trades: List[Trade], received_ms: Optional[int] = None) -> None:
+        """
+        Serializes and produces a batch of trades, and serves the delivery reports that
+        are ready
+
+        Args:
+            trades: The trades to produce
+            received_ms: When we got the trades from the API, for the trace headers
+        """
+        with self._produce_seconds.time():
+            self._produce(trades, received_ms)
+
+        self.producer.poll(0)
+        self._log_stats()
+
+    def _produce(self, trades: List[Trade], received_ms: Optional[int]) -> None:
+        # The time we got the trades and produced them, see streaming_common.tracing
+        headers = [stamp('trades.in', received_ms or now_ms()), stamp('trades.out')]
+
+        messages = []
+        for trade in trades:
+            try:
+                messages.append(
+                    self.topic.serialize(
+                        # Slashes might git problems in Kafka
+                        key=trade.pair.replace('/', '-'),
+                        value=trade.to_dict(),
+                        headers=headers,
+                    )
+                )
+            except Exception as e:
+                self.n_serialization_errors += 1
+                self._serialization_errors.inc()
+                logger.error(f'Error serializing trade {trade}: {e}')
+
+        for message in messages:
+            try:
+                self._produce_message(message)
+            except BufferError:
+                # The producer queue is full, we wait for the messages in it to be
+                # delivered and try again
+                self.flush()
+                try:
+                    self._produce_message(message)
+                except Exception as e:
+                    self._on_produce_error(e)
+            except Exception as e:
+                self._on_produce_error(e)
+
+        if (
+            trades
+            and self.n_produced // self.log_every_n_trades
+            != (self.n_produced + len(messages)) // self.log_every_n_trades
+        ):
+            logger.info(f'Pushed trade to Kafka: {trades[-1]}')
+        self.n_produced += len(messages)
+
+    def _produce_message(self, message: KafkaMessage) -> None:
+        self.producer.produce(
+            topic=self.topic.name,
+            value=message.value,
+            key=message.key,
+            headers=message.headers,
+            on_delivery=self._on_delivery,
+            # We flush ourselves when the queue is full
+            buffer_error_max_tries=0,
+        )
+
+    def _on_produce_error(self, error: Exception) -> None:
+        self.n_failed += 1
+        self._producer_errors.inc()
+        logger.error(f'Error producing trade to Kafka: {error}')
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits until all the messages are delivered (or failed)
+        """
+        remaining = self.producer.flush(timeout)
+        if remaining:
+            logger.warning(f'{remaining} messages not delivered after the flush')
+
+    def deliver(self) -> bool:
+        """
+        Waits until all the messages are delivered (or failed), and returns whether
+        all the messages produced since the last call were delivered
+        """
+        self.flush()
+        delivered = (
+            self.n_failed == self._n_failed_at_deliver
+            and self.n_produced == self.n_delivered + self.n_failed
+        )
+        self._n_failed_at_deliver = self.n_failed
+        return delivered
+
+    def stats(self) -> dict:
+        return {
+            'produced': self.n_produced,
+            'delivered': self.n_delivered,
+            'failed': self.n_failed,
+            'serialization_errors': self.n_serialization_errors,
+            'in_flight': self.n_produced - self.n_delivered - self.n_failed,
+        }
+
+    def _on_delivery(self, error: Optional[KafkaError], message: Message) -> None:
+        # Called from producer.poll/flush, in this same thread
+        if error is None:
+            self.n_delivered += 1
+            self._messages_out.inc()
+        else:
+            self.n_failed += 1
+            self._producer_errors.inc()
+            # Log each error once, not once per message
+            if self.last_error is None or error.code() != self.last_error.code():
+                logger.error(f'Failed to deliver trade to {message.topic()}: {error}')
+            self.last_error = error
+
+    def _log_stats(self) -> None:
+        if time.monotonic() - self._last_stats < self.stats_interval_seconds:
+            return
+        self._last_stats = time.monotonic()
+        logger.info(f'Trades producer: {self.stats()}')
@@ -0,0 +1,121 @@
+"""
+Benchmark of the Trade batch constructors against the pydantic model we used before.
+
+It builds Kraken REST and WebSocket payloads of random trades, checks both paths
+give the same messages and prints the time per trade to parse a payload and turn
+its trades into the dicts we produce to Kafka:
+
+    uv run python benchmark_trade.py
+"""
+
+import random
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from kraken_api.trade import DATE_FORMAT, Trade, TradeModel
+
+N_TRADES = 100_000
+N_REPEATS = 5
+
+
+def pydantic_rest(pair: str, trades: List[list]) -> List[dict]:
+    """
+    What `Trade.from_kraken_rest_api_response` did with the pydantic model
+    """
+    messages = []
+    for price, volume, timestamp_sec, side, *_ in trades:
+        timestamp_ms = int(float(timestamp_sec) * 1000)
+        trade = TradeModel(
+            pair=pair,
+            price=price,
+            volume=volume,
+            timestamp=datetime.fromtimestamp(timestamp_ms / 1000).strftime(DATE_FORMAT),
+            timestamp_ms=timestamp_ms,
+            side={'b': 'buy', 's': 'sell'}.get(side),
+        )
+        messages.append(trade.model_dump())
+    return messages
+
+
+def pydantic_websocket(trades: List[dict]) -> List[dict]:
+    """
+    What `Trade.from_kraken_api_response` did with the pydantic model
+    """
+    return [
+        TradeModel(
+            pair=trade['symbol'],
+            price=trade['price'],
+            volume=trade['qty'],
+            timestamp=trade['timestamp'],
+            timestamp_ms=int(
+                datetime.strptime(trade['timestamp'], DATE_FORMAT).timestamp() * 1000
+            ),
+            side=trade.get('side'),
+        ).model_dump()
+        for trade in trades
+    ]
+
+
+def random_payloads(n_trades: int, seed: int = 42):
+    rng = random.Random(seed)
+    timestamp_sec = time.time() - 86400
+    rest, websocket = [], []
+    for i in range(n_trades):
+        # Bursts of trades within the same second, as in busy markets
+        timestamp_sec += rng.expovariate(20)
+        price = f'{76000 + rng.random() * 1000:.5f}'
+        volume = f'{rng.expovariate(10):.8f}'
+        side = rng.choice('bs')
+        rest.append([price, volume, timestamp_sec, side, 'm', '', i])
+        websocket.append(
+            {
+                'symbol': 'BTC/USD',
+                'side': {'b': 'buy', 's': 'sell'}[side],
+                'price': float(price),
+                'qty': float(volume),
+                'ord_type': 'market',
+                'trade_id': i,
+                'timestamp': datetime.fromtimestamp(timestamp_sec).strftime(
+                    DATE_FORMAT
+                ),
+            }
+        )
+    return rest, websocket
+
+
+def timeit(parse: Callable[[], List[dict]]) -> float:
+    start = time.perf_counter()
+    for _ in range(N_REPEATS):
+        parse()
+    return (time.perf_counter() - start) / N_REPEATS / N_TRADES * 1e6
+
+
+if __name__ == '__main__':
+    rest, websocket = random_payloads(N_TRADES)
+
+    def slots_rest():
+        return [
+            trade.to_dict()
+            for trade in Trade.from_kraken_rest_api_batch('BTC/USD', rest)
+        ]
+
+    def slots_websocket():
+        return [
+            trade.to_dict() for trade in Trade.from_kraken_websocket_batch(websocket)
+        ]
+
+    assert slots_rest() == pydantic_rest('BTC/USD', rest), 'REST trades differ'
+    assert slots_websocket() == pydantic_websocket(websocket), 'WebSocket trades differ'
+    for trade in Trade.from_kraken_rest_api_batch('BTC/USD', rest[:1000]):
+        trade.validate()
+
+    print(f'{N_TRADES} trades, us/trade')
+    print(
+        f'  REST       pydantic {timeit(lambda: pydantic_rest("BTC/USD", rest)):5.2f}'
+        f'  slots {timeit(slots_rest):5.2f}'
+    )
+    print(
+        f'  WebSocket  pydantic {timeit(lambda: pydantic_websocket(websocket)):5.2f}'
+        f'  slots {timeit(slots_websocket):5.2f}'
+    )
@@ -9,11 +9,53 @@ class Config(BaseSettings):
     )
     kafka_broker_address: str
     kafka_topic: str
+    kafka_topic_codec: Literal['json', 'binary'] = 'json'
+
+    # Batching of the producer: how long librdkafka waits to group messages
+    kafka_linger_ms: Optional[int] = 50
+    # Log one trade out of every `log_every_n_trades` instead of all of them
+    log_every_n_trades: Optional[int] = 1000
+    # Serve the Prometheus metrics on this port, see streaming_common.metrics
+    metrics_port: Optional[int] = None
     pairs: List[str]
 
+    # Send a heartbeat (a trade with zero volume at the last price) every
+    # `heartbeat_seconds` for the pairs without trades, so the candles service emits
+    # the candles of every window on time
+    heartbeat_seconds: Optional[int] = None
+
     # Variable to determine the data source. to be used in rest.py
-    data_source: Literal['live', 'historical', 'test']
+    data_source: Literal['live', 'historical', 'replay', 'synthetic', 'test']
     last_n_days: Optional[int] = None
 
+    # Number of WebSocket connections to shard the pairs across, for live data
+    websocket_connections: Optional[int] = 1
+    trades_queue_size: Optional[int] = 10000
+
+    # Rate limit shared by all the requests to the Kraken REST API, for historical data
+    rest_requests_per_second: Optional[float] = 1.0
+    rest_max_burst: Optional[int] = 1
+
+    # Local file with the progress of the backfill of each pair, for historical data.
+    # With `backfill_resume`, a new backfill continues from the saved progress.
+    backfill_checkpoint_file: Optional[str] = None
+    backfill_resume: Optional[bool] = True
+
+    # Local Parquet archive the trades are written to, and replayed from with the
+    # 'replay' data source, as fast as possible or `replay_speed` times faster than
+    # real time
+    archive_dir: Optional[str] = None
+    replay_speed: Optional[float] = None
+
+    # Random trades for load tests, with the 'synthetic' data source. In real time
+    # at the given rate, or as fast as possible (and reproducible with the seed and
+    # the start timestamp)
+    synthetic_trades_per_second: Optional[float] = 1000.0
+    synthetic_seed: Optional[int] = 42
+    synthetic_realtime: Optional[bool] = True
+    synthetic_duration_seconds: Optional[float] = None
+    # Timestamp of the first trade, by default now
+    synthetic_start_timestamp_ms: Optional[int] = None
+
 
 config = Config()
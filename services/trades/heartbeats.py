@@ -0,0 +1,94 @@
+from typing import Dict, List, Optional
+
+from kraken_api.trade import Trade, milliseconds2datestrs
+
+
+class TradeHeartbeats:
+    """
+    Adds heartbeats for the pairs without trades to the stream of trades, so the
+    candles service closes their windows on time.
+
+    The windows of the candles service only close when a trade of the same pair
+    arrives, so the candle of an illiquid pair is emitted minutes or hours late, and
+    the windows without trades are not emitted at all. A heartbeat is a trade with
+    zero volume at the last price of the pair, which the candles service turns into a
+    flat candle.
+
+    The clock is the watermark of the stream, the latest timestamp of the trades, so
+    the heartbeats are the same for live, historical, replayed and synthetic trades.
+    Every `interval_ms` of the watermark, we add a heartbeat for each pair that had no
+    trades since the previous one.
+    """
+
+    def __init__(self, pairs: List[str], interval_ms: int):
+        """
+        Args:
+            pairs: The pairs to send heartbeats for
+            interval_ms: The time between heartbeats, smaller than the candle seconds
+                so every window gets a trade or a heartbeat
+        """
+        self.pairs = pairs
+        self.interval_ms = interval_ms
+
+        self.n_heartbeats = 0
+        self._next_tick_ms: Optional[int] = None
+        self._last_price: Dict[str, float] = {}
+        self._active: set = set()
+
+    def add(self, trades: List[Trade]) -> List[Trade]:
+        """
+        Returns the trades with the heartbeats of the ticks they cross, in time order
+
+        Args:
+            trades: The trades of a batch, sorted by timestamp
+        Returns:
+            The trades and the heartbeats
+        """
+        if not trades:
+            return trades
+
+        if self._next_tick_ms is None:
+            first_ms = trades[0].timestamp_ms
+            self._next_tick_ms = (
+                first_ms - first_ms % self.interval_ms + self.interval_ms
+            )
+
+        output = []
+        for trade in trades:
+            if trade.timestamp_ms >= self._next_tick_ms:
+                output += self._heartbeats(trade.timestamp_ms)
+            output.append(trade)
+            self._last_price[trade.pair] = trade.price
+            self._active.add(trade.pair)
+        return output
+
+    def _heartbeats(self, watermark_ms: int) -> List[Trade]:
+        """
+        Returns the heartbeats of the ticks until the watermark, for the pairs with
+        a price and without trades since the previous tick
+        """
+        heartbeats = []
+        while self._next_tick_ms <= watermark_ms:
+            tick_ms = self._next_tick_ms
+            idle_pairs = [
+                pair
+                for pair in self.pairs
+                if pair in self._last_price and pair not in self._active
+            ]
+            if idle_pairs:
+                timestamp = milliseconds2datestrs([tick_ms])[0]
+                heartbeats += [
+                    Trade(
+                        pair=pair,
+                        price=self._last_price[pair],
+                        volume=0.0,
+                        timestamp=timestamp,
+                        timestamp_ms=tick_ms,
+                    )
+                    for pair in idle_pairs
+                ]
+            self._active.clear()
+            self._next_tick_ms += self.interval_ms
+
+        self.n_heartbeats += len(heartbeats)
+        return heartbeats
@@ -0,0 +1,100 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from .trade import Trade
+
+SCHEMA = pa.schema(
+    [
+        ('pair', pa.string()),
+        ('price', pa.float64()),
+        ('volume', pa.float64()),
+        ('timestamp', pa.string()),
+        ('timestamp_ms', pa.int64()),
+        ('side', pa.string()),
+    ]
+)
+
+
+def pair_dir(root: Path, pair: str) -> Path:
+    """
+    Returns the directory of the trades of a pair, e.g. `root/pair=BTC-USD`
+    """
+    return root / f'pair={pair.replace("/", "-")}'
+
+
+def partition_dir(root: Path, pair: str, date: str) -> Path:
+    """
+    Returns the directory of the trades of a pair on a day (UTC), e.g.
+    `root/pair=BTC-USD/date=2024-11-09`
+    """
+    return pair_dir(root, pair) / f'date={date}'
+
+
+class TradeArchive:
+    """
+    Writes the trades we get from the Kraken API to a local Parquet archive,
+    partitioned by pair and day, so we can replay them later with `TradesReplayAPI`
+    instead of downloading them again.
+
+    Parquet files cannot be appended to, so the trades are buffered and every flush
+    writes a new file in each partition that got trades.
+    """
+
+    def __init__(self, path: str, flush_rows: int = 100_000, flush_seconds: float = 60):
+        self.path = Path(path)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        self._buffer: Dict[Tuple[str, str], List[Trade]] = defaultdict(list)
+        self._n_buffered = 0
+        self._last_flush = time.monotonic()
+        self._n_files = 0
+
+    def write(self, trades: List[Trade]) -> None:
+        """
+        Adds the trades to the archive, flushing it when the buffer is full or old
+        """
+        for trade in trades:
+            date = datetime.fromtimestamp(
+                trade.timestamp_ms / 1000, tz=timezone.utc
+            ).strftime('%Y-%m-%d')
+            self._buffer[(trade.pair, date)].append(trade)
+        self._n_buffered += len(trades)
+
+        if (
+            self._n_buffered >= self.flush_rows
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered trades, one file per pair and day
+        """
+        for (pair, date), trades in self._buffer.items():
+            table = pa.Table.from_pylist(
+                [trade.to_dict() for trade in trades], schema=SCHEMA
+            )
+            directory = partition_dir(self.path, pair, date)
+            directory.mkdir(parents=True, exist_ok=True)
+            # The name sorts the files of a partition in the order we wrote them
+            pq.write_table(
+                table, directory / f'part-{time.time_ns()}-{self._n_files}.parquet'
+            )
+            self._n_files += 1
+
+        if self._n_buffered:
+            logger.info(f'Archived {self._n_buffered} trades to {self.path}')
+        self._buffer.clear()
+        self._n_buffered = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
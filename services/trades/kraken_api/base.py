@@ -5,6 +5,10 @@ from .trade import Trade
 
 
 class TradesAPI(ABC):
+    # Whether the app waits for the trades of each batch to be delivered to Kafka and
+    # calls `commit`, e.g. to save the progress of a backfill
+    commit_after_delivery: bool = False
+
     @abstractmethod
     def get_trades(self) -> List[Trade]:
         pass
@@ -12,3 +16,9 @@ class TradesAPI(ABC):
     @abstractmethod
     def is_done(self) -> bool:
         pass
+
+    def commit(self, delivered: bool) -> None:
+        """
+        Called after each batch when `commit_after_delivery` is set, with whether all
+        the trades returned by `get_trades` so far were delivered to Kafka
+        """
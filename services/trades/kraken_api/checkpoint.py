@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+
+
+class BackfillCheckpoint:
+    """
+    Progress of a historical backfill per pair, saved to a local JSON file so a
+    backfill that stops halfway can resume from where it was.
+
+    For each pair we keep the cursor (the `since` parameter of the Kraken API) after
+    the last trade we handed to the producer, the number of trades and whether the
+    pair is done.
+    """
+
+    def __init__(self, path: str, resume: bool = True):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._pairs: Dict[str, dict] = {}
+
+        if resume and self.path.exists():
+            self._pairs = json.loads(self.path.read_text())['pairs']
+            logger.info(f'Resuming the backfill from {self.path}: {self._pairs}')
+        elif self.path.exists():
+            logger.info(f'Starting a new backfill, overwriting {self.path}')
+
+    def get(self, pair: str) -> Optional[dict]:
+        """
+        Returns the progress of the pair, or None if we have not started it
+        """
+        with self._lock:
+            return self._pairs.get(pair)
+
+    def start(self, pair: str, since_timestamp_ns: int) -> None:
+        """
+        Registers a new pair with the cursor where its backfill starts
+        """
+        with self._lock:
+            self._pairs[pair] = {
+                'start_timestamp_ns': since_timestamp_ns,
+                'since_timestamp_ns': since_timestamp_ns,
+                'n_trades': 0,
+                'done': False,
+            }
+        self.save()
+
+    def update(self, progress: Dict[str, tuple], done: Optional[set] = None) -> None:
+        """
+        Moves the cursors of the pairs and saves the checkpoint
+
+        Args:
+            progress: The cursor after the last trade produced and the number of new
+                trades produced, for each pair
+            done: The pairs with no more trades to produce
+        """
+        with self._lock:
+            for pair, (since_timestamp_ns, n_trades) in progress.items():
+                self._pairs[pair]['since_timestamp_ns'] = since_timestamp_ns
+                self._pairs[pair]['n_trades'] += n_trades
+            for pair in done or ():
+                self._pairs[pair]['done'] = True
+        self.save()
+
+    def save(self) -> None:
+        """
+        Writes the checkpoint to a temporary file and renames it, so a crash while
+        writing never leaves a corrupted checkpoint
+        """
+        with self._lock:
+            content = json.dumps(
+                {'updated_at': time.time(), 'pairs': self._pairs}, indent=2
+            )
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_text(content)
+        os.replace(tmp_path, self.path)
+
+    def report(self) -> Dict[str, dict]:
+        """
+        Returns the number of trades and the time range we backfilled for each pair
+        """
+        with self._lock:
+            return {
+                pair: {
+                    'n_trades': progress['n_trades'],
+                    'from_ms': progress['start_timestamp_ns'] // 1_000_000,
+                    'to_ms': progress['since_timestamp_ns'] // 1_000_000,
+                    'done': progress['done'],
+                }
+                for pair, progress in self._pairs.items()
+            }
@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, shared by all the requests we send to the Kraken REST
+    API so, together, they stay within its rate limit.
+
+    The bucket holds up to `capacity` tokens and gets `rate` tokens per second. Each
+    request takes one token, waiting until there is one available.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes a token from the bucket, blocking until one is available
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def penalize(self, seconds: float) -> None:
+        """
+        Empties the bucket so nobody sends a request for the next `seconds`, e.g.
+        after the API tells us we exceeded the rate limit
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
@@ -0,0 +1,118 @@
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from .archive import SCHEMA, pair_dir, partition_dir
+from .base import TradesAPI
+from .trade import Trade
+
+
+class TradesReplayAPI(TradesAPI):
+    """
+    Replays the trades of a local archive written by `TradeArchive`, sorted by
+    timestamp across all the pairs.
+
+    The archive is read one day at a time. Without a `speed` the trades are returned
+    as fast as we can read them, otherwise they are paced so `speed` seconds of
+    trades are replayed every second (e.g. 60 replays an hour of trades per minute).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pairs: List[str],
+        speed: Optional[float] = None,
+        batch_size: int = 1000,
+    ):
+        self.path = Path(path)
+        self.pairs = pairs
+        self.speed = speed
+        self.batch_size = batch_size
+
+        self._dates = sorted(
+            {
+                directory.name.removeprefix('date=')
+                for pair in pairs
+                for directory in pair_dir(self.path, pair).glob('date=*')
+            }
+        )
+        if not self._dates:
+            logger.warning(f'No trades of {pairs} in the archive {self.path}')
+        logger.info(f'Replaying {len(self._dates)} days of trades from {self.path}')
+
+        self._trades: List[Trade] = []
+        self._position = 0
+
+        # The first trade is replayed when we start, and the rest relative to it
+        self._start_time: Optional[float] = None
+        self._start_timestamp_ms: Optional[int] = None
+
+    def get_trades(self) -> List[Trade]:
+        """
+        Returns the next `batch_size` trades, or the ones that are due if we replay at
+        a given speed
+        """
+        if self._position == len(self._trades) and not self._read_next_day():
+            return []
+
+        end = min(self._position + self.batch_size, len(self._trades))
+        if self.speed:
+            end = self._due(end)
+
+        trades = self._trades[self._position : end]
+        self._position = end
+        return trades
+
+    def is_done(self) -> bool:
+        return not self._dates and self._position == len(self._trades)
+
+    def _read_next_day(self) -> bool:
+        """
+        Reads the trades of all the pairs on the next day of the archive
+        """
+        while self._dates:
+            date = self._dates.pop(0)
+            files = sorted(
+                file
+                for pair in self.pairs
+                for file in partition_dir(self.path, pair, date).glob('*.parquet')
+            )
+            if not files:
+                continue
+
+            table = pa.concat_tables(
+                pq.read_table(file, schema=SCHEMA) for file in files
+            ).sort_by('timestamp_ms')
+            self._trades = [Trade(**row) for row in table.to_pylist()]
+            self._position = 0
+            logger.info(f'Replaying {len(self._trades)} trades of {date}')
+            return True
+        return False
+
+    def _due(self, end: int) -> int:
+        """
+        Waits until the next trade is due and returns the end of the trades that are
+        due, up to `end`
+        """
+        if self._start_time is None:
+            self._start_time = time.monotonic()
+            self._start_timestamp_ms = self._trades[self._position].timestamp_ms
+
+        def due_timestamp_ms() -> float:
+            elapsed = time.monotonic() - self._start_time
+            return self._start_timestamp_ms + elapsed * 1000 * self.speed
+
+        # Wait at most 1 second, so the caller does not block for long
+        wait_ms = self._trades[self._position].timestamp_ms - due_timestamp_ms()
+        if wait_ms > 0:
+            time.sleep(min(1.0, wait_ms / 1000 / self.speed))
+
+        due = due_timestamp_ms()
+        position = self._position
+        while position < end and self._trades[position].timestamp_ms <= due:
+            position += 1
+        return position
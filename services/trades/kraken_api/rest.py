@@ -1,51 +1,195 @@
+import heapq
 import json
+import queue
+import threading
 import time
-from typing import List
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
 from loguru import logger
+from requests.adapters import HTTPAdapter
 
 from .base import TradesAPI
+from .checkpoint import BackfillCheckpoint
+from .rate_limiter import TokenBucket
 from .trade import Trade
 
 
 class KrakenRestAPI(TradesAPI):
-    def __init__(self, pairs: List[str], last_n_days: int):
-        self.pairs = pairs
+    """
+    Downloads the trades of several pairs concurrently and returns them sorted by
+    timestamp.
 
-        # breakpoint()
+    Each pair has a thread that fetches its pages (sorted by time) into a bounded
+    queue, all of them sharing a pooled HTTP session and a token bucket so we stay
+    within the rate limit of the Kraken API. The pages of all the pairs are merged as
+    they arrive with a k-way merge, instead of sorting the trades of each batch.
+
+    With a checkpoint, the cursor of each pair is saved once the batch of trades we
+    returned is delivered to Kafka (see `commit`), and a new backfill with the same
+    checkpoint resumes from those cursors, skipping the pairs that are done. After a
+    failed delivery the checkpoint is not saved anymore. The trades after the last
+    saved cursor might be produced again, but none is missed.
+    """
 
+    def __init__(
+        self,
+        pairs: List[str],
+        last_n_days: int,
+        requests_per_second: float = 1.0,
+        max_burst: int = 1,
+        batch_size: int = 1000,
+        checkpoint: Optional[BackfillCheckpoint] = None,
+    ):
+        self.pairs = pairs
         self.last_n_days = last_n_days
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.commit_after_delivery = checkpoint is not None
+
+        # One pooled session and one rate limit for all the pairs
+        self._session = requests.Session()
+        self._session.mount(
+            'https://', HTTPAdapter(pool_connections=1, pool_maxsize=max(1, len(pairs)))
+        )
+        self._rate_limiter = TokenBucket(rate=requests_per_second, capacity=max_burst)
+
+        self.apis = []
+        for pair in self.pairs:
+            progress = checkpoint.get(pair) if checkpoint else None
+            if progress and progress['done']:
+                logger.info(f'Backfill of pair {pair} is done, skipping it')
+                continue
+            api = KrakenRestAPISinglePair(
+                pair=pair,
+                last_n_days=last_n_days,
+                session=self._session,
+                rate_limiter=self._rate_limiter,
+                since_timestamp_ns=progress['since_timestamp_ns'] if progress else None,
+            )
+            if checkpoint and not progress:
+                checkpoint.start(pair, api.since_timestamp_ns)
+            self.apis.append(api)
+
+        # Trades handed to the producer but not saved in the checkpoint yet, the pairs
+        # whose fetcher has finished, and whether a delivery failed
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._exhausted: Set[str] = set()
+        self._delivery_failed = False
+
+        # A few pages per pair are fetched ahead of the merge
+        self._queues = [queue.Queue(maxsize=4) for _ in self.apis]
+        # Daemon threads, so they do not keep the app alive if it stops before the end
+        for api, pages in zip(self.apis, self._queues, strict=True):
+            threading.Thread(
+                target=self._fetch_pages,
+                args=(api, pages),
+                name=f'kraken-rest-{api.pair}',
+                daemon=True,
+            ).start()
 
-        self.apis = [
-            KrakenRestAPISinglePair(pair=pair, last_n_days=last_n_days)
-            for pair in self.pairs
-        ]
+        self._trades = heapq.merge(
+            *(
+                self._iter_trades(api.pair, pages)
+                for api, pages in zip(self.apis, self._queues, strict=True)
+            ),
+            key=lambda trade: trade.timestamp_ms,
+        )
+        self._is_done = False
 
     def get_trades(self) -> List[Trade]:
         """
-        Get trades for each pair, sort them by timestamp and return the trades.
+        Returns the next `batch_size` trades of all the pairs, sorted by timestamp.
         """
-        trades = []
-        for api in self.apis:
-            if not api.is_done():
-                trades += api.get_trades()
+        trades = list(islice(self._trades, self.batch_size))
+        if self.checkpoint:
+            # The cursors move once the trades are delivered
+            for pair, (since_timestamp_ns, n_trades) in self._progress(trades).items():
+                _, n_pending = self._pending.get(pair, (0, 0))
+                self._pending[pair] = (since_timestamp_ns, n_pending + n_trades)
+        if len(trades) < self.batch_size:
+            self._is_done = True
+            self._session.close()
+        return trades
 
-        # sort the trades by timestamp
-        trades.sort(key=lambda x: x.timestamp_ms)
+    def is_done(self) -> bool:
+        """
+        We are done when all the pairs are done and we returned all their trades.
+        """
+        if self._is_done and self.checkpoint:
+            # The last batch was delivered and committed
+            self._log_report()
+        return self._is_done
 
-        # breakpoint()
+    def commit(self, delivered: bool) -> None:
+        """
+        Saves the cursors of the trades we returned in the checkpoint, if they were all
+        delivered. After a failed delivery we never save it again, so a new backfill
+        resumes from before the trades that were not delivered.
+        """
+        if not delivered and not self._delivery_failed:
+            logger.error(
+                'Some trades were not delivered to Kafka, the checkpoint '
+                f'{self.checkpoint.path} stays at the last delivered batch'
+            )
+            self._delivery_failed = True
+        if not self._delivery_failed:
+            self._save_checkpoint()
 
-        return trades
+    @staticmethod
+    def _progress(trades: List[Trade]) -> Dict[str, Tuple[int, int]]:
+        """
+        Returns the cursor after the last trade of each pair in the batch, and the
+        number of trades of the pair
+        """
+        progress = {}
+        for trade in trades:
+            _, n_trades = progress.get(trade.pair, (0, 0))
+            # The Kraken API returns the trades since the cursor, so we might get
+            # again the other trades of the same millisecond
+            progress[trade.pair] = (trade.timestamp_ms * 1_000_000, n_trades + 1)
+        return progress
 
-    def is_done(self) -> bool:
+    def _save_checkpoint(self) -> None:
+        if self.checkpoint is None or not (self._pending or self._exhausted):
+            return
+        self.checkpoint.update(self._pending, done=self._exhausted)
+        self._pending = {}
+        self._exhausted = set()
+
+    def _log_report(self) -> None:
+        report = self.checkpoint.report()
+        for pair, progress in report.items():
+            logger.info(f'Backfill of pair {pair}: {progress}')
+        logger.info(
+            f'Backfill done: {sum(p["n_trades"] for p in report.values())} trades of '
+            f'{len(report)} pairs, checkpoint saved to {self.checkpoint.path}'
+        )
+
+    @staticmethod
+    def _fetch_pages(api: 'KrakenRestAPISinglePair', pages: queue.Queue) -> None:
         """
-        We are done when all the APIs are done.
+        Fetches the pages of a pair until it is done, and then puts `None` in the queue
         """
-        for api in self.apis:
-            if not api.is_done():
-                return False
-        return True
+        try:
+            while not api.is_done():
+                trades = api.get_trades()
+                if trades:
+                    pages.put(trades)
+        except Exception as e:
+            logger.error(f'Failed to get trades for pair {api.pair}: {e}')
+            pages.put(e)
+        finally:
+            pages.put(None)
+
+    def _iter_trades(self, pair: str, pages: queue.Queue) -> Iterator[Trade]:
+        while (page := pages.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            yield from page
+        # The merge only gets here after it took the last trade of the pair
+        self._exhausted.add(pair)
 
 
 class KrakenRestAPISinglePair(TradesAPI):
@@ -55,15 +199,24 @@ class KrakenRestAPISinglePair(TradesAPI):
         self,
         pair: str,
         last_n_days: int,
+        session: Optional[requests.Session] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        since_timestamp_ns: Optional[int] = None,
     ):
         self.pair = pair
         self.last_n_days = last_n_days
         self._is_done = False
 
-        # get current timestamp in nanoseconds
-        self.since_timestamp_ns = int(
-            time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
-        )
+        self._session = session or requests.Session()
+        self._rate_limiter = rate_limiter
+
+        # get current timestamp in nanoseconds, unless we resume from a cursor
+        if since_timestamp_ns is not None:
+            self.since_timestamp_ns = since_timestamp_ns
+        else:
+            self.since_timestamp_ns = int(
+                time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
+            )
 
         logger.info(
             f'Getting trades for pair {self.pair} for the last {self.since_timestamp_ns * 1000000000} seconds'
@@ -79,9 +232,10 @@ class KrakenRestAPISinglePair(TradesAPI):
             'since': self.since_timestamp_ns,
         }
 
-        response = requests.request('GET', self.URL, headers=headers, params=params)
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
 
-        # TODO: check if we get a an error response. If so, implement a slow-down mechanism
+        response = self._session.get(self.URL, headers=headers, params=params)
 
         # parse the response as json
         try:
@@ -90,6 +244,15 @@ class KrakenRestAPISinglePair(TradesAPI):
             logger.error(f'Failed to parse response as json: {e}')
             return []
 
+        # If we exceeded the rate limit, we slow down and retry the same page
+        if any('Rate limit' in error for error in data.get('error', [])):
+            logger.warning(f'Rate limit exceeded for pair {self.pair}, slowing down')
+            if self._rate_limiter is not None:
+                self._rate_limiter.penalize(seconds=5.0)
+            else:
+                time.sleep(5.0)
+            return []
+
         # breakpoint()
 
         # get the trades for the self.pair cryptocurrency
@@ -100,15 +263,7 @@ class KrakenRestAPISinglePair(TradesAPI):
             return []
 
         # convert the trades to Trade objects
-        trades = [
-            Trade.from_kraken_rest_api_response(
-                pair=self.pair,
-                price=trade[0],
-                volume=trade[1],
-                timestamp_sec=trade[2],
-            )
-            for trade in trades
-        ]
+        trades = Trade.from_kraken_rest_api_batch(pair=self.pair, trades=trades)
 
         # update the since_timestamp_ns
         self.since_timestamp_ns = int(data['result']['last'])
@@ -119,6 +274,9 @@ class KrakenRestAPISinglePair(TradesAPI):
             self._is_done = True
         if self.since_timestamp_ns == 0:
             self._is_done = True
+        # no more trades since the cursor
+        if not trades:
+            self._is_done = True
 
         # breakpoint()
 
@@ -0,0 +1,185 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from .base import TradesAPI
+from .trade import Trade, milliseconds2datestrs
+
+# Rough starting prices, so the candles and indicators look like the real ones
+INITIAL_PRICES = {
+    'BTC/USD': 76_000.0,
+    'BTC/EUR': 71_000.0,
+    'ETH/USD': 2_900.0,
+    'ETH/EUR': 2_700.0,
+}
+
+
+class SyntheticTradesAPI(TradesAPI):
+    """
+    Generates random trades, to load test the services without the Kraken API.
+
+    The price of each pair follows a geometric random walk and the trades arrive as
+    a Poisson process at `trades_per_second` across all the pairs. The rate switches
+    between regimes: most of the time it is the normal rate, sometimes there is a
+    burst (`burst_multiplier` times the rate) and sometimes a gap without trades.
+
+    With `realtime`, the trades are timestamped with the current time and returned
+    when they are due, so the service produces them at the target rate. Otherwise
+    they are generated as fast as possible from `start_timestamp_ms`, and the same
+    seed and `start_timestamp_ms` always give the same trades. By default the trades
+    start now, so only their prices, volumes and intervals repeat.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        trades_per_second: float = 1000.0,
+        seed: Optional[int] = 42,
+        realtime: bool = True,
+        duration_seconds: Optional[float] = None,
+        start_timestamp_ms: Optional[int] = None,
+        volatility: float = 0.6,
+        burst_probability: float = 0.05,
+        burst_multiplier: float = 10.0,
+        burst_seconds: float = 2.0,
+        gap_probability: float = 0.01,
+        gap_seconds: float = 5.0,
+        batch_size: int = 1000,
+    ):
+        """
+        Args:
+            pairs: The pairs to generate trades for
+            trades_per_second: The normal rate of trades, across all the pairs
+            seed: The seed of the random generator
+            realtime: Return the trades when they are due, or as fast as possible
+            duration_seconds: Stop after this many seconds of trades, or never
+            start_timestamp_ms: Timestamp of the first trade, by default now
+            volatility: Annualized volatility of the prices
+            burst_probability: Probability that a second starts a burst
+            burst_multiplier: How many times faster trades arrive during a burst
+            burst_seconds: Duration of a burst
+            gap_probability: Probability that a second starts a gap without trades
+            gap_seconds: Duration of a gap
+            batch_size: Maximum number of trades returned by `get_trades`
+        """
+        self.pairs = pairs
+        self.trades_per_second = trades_per_second
+        self.realtime = realtime
+        self.duration_seconds = duration_seconds
+        self.burst_probability = burst_probability
+        self.burst_multiplier = burst_multiplier
+        self.burst_seconds = burst_seconds
+        self.gap_probability = gap_probability
+        self.gap_seconds = gap_seconds
+        self.batch_size = batch_size
+
+        self._random = random.Random(seed)
+        # Volatility per square root of millisecond
+        self._volatility_ms = volatility / math.sqrt(365 * 24 * 60 * 60 * 1000)
+        self._prices: Dict[str, float] = {
+            pair: INITIAL_PRICES.get(pair, 100.0) for pair in pairs
+        }
+        self._last_trade_ms: Dict[str, float] = {}
+
+        self._start_ms = float(
+            start_timestamp_ms if start_timestamp_ms is not None else time.time() * 1000
+        )
+        self._start_wall = time.monotonic()
+        # Simulated time of the next trade
+        self._time_ms = self._start_ms
+        self._rate_per_ms = trades_per_second / 1000
+        self._regime_end_ms = self._start_ms
+
+        self._next_trade = self._generate()
+        logger.info(
+            f'Generating {trades_per_second} synthetic trades per second for {pairs}'
+        )
+
+    def get_trades(self) -> List[Trade]:
+        """
+        Returns the next `batch_size` trades, or only the ones that are due if we
+        generate them in real time
+        """
+        if self.realtime:
+            now_ms = self._start_ms + (time.monotonic() - self._start_wall) * 1000
+            wait_ms = self._next_trade[4] - now_ms
+            if wait_ms > 0:
+                # Do not block the caller for long if we are in a gap
+                time.sleep(min(wait_ms, 100) / 1000)
+                now_ms += min(wait_ms, 100)
+        else:
+            now_ms = math.inf
+
+        end_ms = (
+            self._start_ms + self.duration_seconds * 1000
+            if self.duration_seconds is not None
+            else math.inf
+        )
+        rows = []
+        while (
+            len(rows) < self.batch_size
+            and self._next_trade[4] <= now_ms
+            and self._next_trade[4] < end_ms
+        ):
+            rows.append(self._next_trade)
+            self._next_trade = self._generate()
+
+        timestamps_ms = [int(row[4]) for row in rows]
+        return [
+            Trade(pair, price, volume, timestamp, timestamp_ms, side)
+            for (pair, price, volume, side, _), timestamp, timestamp_ms in zip(
+                rows, milliseconds2datestrs(timestamps_ms), timestamps_ms, strict=True
+            )
+        ]
+
+    def is_done(self) -> bool:
+        return (
+            self.duration_seconds is not None
+            and self._next_trade[4] >= self._start_ms + self.duration_seconds * 1000
+        )
+
+    def _generate(self) -> tuple:
+        """
+        Generates the next trade, as a tuple (pair, price, volume, side, timestamp_ms)
+        """
+        rng = self._random
+
+        if self._time_ms >= self._regime_end_ms:
+            self._switch_regime()
+        self._time_ms += rng.expovariate(self._rate_per_ms)
+
+        pair = rng.choice(self.pairs)
+        # The price moves with the square root of the time since the last trade
+        elapsed_ms = self._time_ms - self._last_trade_ms.get(pair, self._start_ms)
+        self._last_trade_ms[pair] = self._time_ms
+        self._prices[pair] *= math.exp(
+            self._volatility_ms * math.sqrt(elapsed_ms) * rng.gauss(0, 1)
+        )
+
+        return (
+            pair,
+            round(self._prices[pair], 2),
+            round(rng.lognormvariate(-4, 1.5), 8),
+            'buy' if rng.random() < 0.5 else 'sell',
+            self._time_ms,
+        )
+
+    def _switch_regime(self) -> None:
+        """
+        Picks the regime of the next seconds: a burst, a gap or the normal rate
+        """
+        draw = self._random.random()
+        if draw < self.gap_probability:
+            # No trades until the gap is over
+            self._time_ms += self.gap_seconds * 1000
+            self._rate_per_ms = self.trades_per_second / 1000
+            self._regime_end_ms = self._time_ms + 1000
+        elif draw < self.gap_probability + self.burst_probability:
+            self._rate_per_ms = self.trades_per_second * self.burst_multiplier / 1000
+            self._regime_end_ms = self._time_ms + self.burst_seconds * 1000
+        else:
+            self._rate_per_ms = self.trades_per_second / 1000
+            self._regime_end_ms = self._time_ms + 1000
@@ -1,11 +1,23 @@
+import json
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List, Literal, Optional
 
 from pydantic import BaseModel
 
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
 
-class Trade(BaseModel):
+_SIDES = {'b': 'buy', 's': 'sell'}
+
+
+@dataclass(slots=True)
+class Trade:
     """
     A trade from the Kraken API.
+
+    A plain slots class instead of a pydantic model, as we create one per trade on
+    the ingest hot path. `TradeModel` validates the same fields.
     """
 
     pair: str  # "symbol": "BTC/USD"
@@ -13,6 +25,7 @@ class Trade(BaseModel):
     volume: float  # "qty": 40.0
     timestamp: str
     timestamp_ms: int
+    side: Optional[Literal['buy', 'sell']] = None  # "side": "buy"
 
     @classmethod
     def from_kraken_rest_api_response(
@@ -21,6 +34,7 @@ class Trade(BaseModel):
         price: float,
         volume: float,
         timestamp_sec: float,
+        side: Optional[str] = None,
     ) -> 'Trade':
         """
         Returns a Trade object from the Kraken REST API response.
@@ -31,16 +45,40 @@ class Trade(BaseModel):
             price: float
             volume: float
             timestamp_sec: float
+            side: 'b' for buy or 's' for sell
+        """
+        return cls.from_kraken_rest_api_batch(
+            pair, [[price, volume, timestamp_sec, side]]
+        )[0]
+
+    @classmethod
+    def from_kraken_rest_api_batch(cls, pair: str, trades: List[list]) -> List['Trade']:
         """
-        # convert the timestamp_sec from float to str
-        timestamp_ms = int(float(timestamp_sec) * 1000)
-
-        return cls(
-            pair=pair,
-            price=price,
-            volume=volume,
-            timestamp=cls._milliseconds2datestr(timestamp_ms),
-            timestamp_ms=timestamp_ms,
+        Returns the Trade objects of a page of the Kraken REST API response, converting
+        each field of the whole page at once.
+
+        Args:
+            pair: The pair of the trades
+            trades: The trades of the response, e.g.
+                [['76395.00000', '0.01305597', 1731155565.4159515, 's', ...], ...]
+        Returns:
+            The trades, in the same order
+        """
+        if not trades:
+            return []
+        prices, volumes, timestamps_sec, sides = list(zip(*trades, strict=False))[:4]
+
+        timestamps_ms = [int(float(timestamp) * 1000) for timestamp in timestamps_sec]
+        return list(
+            map(
+                cls,
+                [pair] * len(trades),
+                map(float, prices),
+                map(float, volumes),
+                milliseconds2datestrs(timestamps_ms),
+                timestamps_ms,
+                map(_SIDES.get, sides),
+            )
         )
 
     @classmethod
@@ -49,31 +87,120 @@ class Trade(BaseModel):
         pair: str,
         price: float,
         volume: float,
-        timestamp: datetime,
+        timestamp: str,
+        side: Optional[str] = None,
     ) -> 'Trade':
-        return cls(
-            pair=pair,
-            price=price,
-            volume=volume,
-            timestamp=timestamp,
-            timestamp_ms=cls._datestr2milliseconds(timestamp),
+        return cls.from_kraken_websocket_batch(
+            [
+                {
+                    'symbol': pair,
+                    'price': price,
+                    'qty': volume,
+                    'timestamp': timestamp,
+                    'side': side,
+                }
+            ]
+        )[0]
+
+    @classmethod
+    def from_kraken_websocket_batch(cls, trades: List[dict]) -> List['Trade']:
+        """
+        Returns the Trade objects of the data of a Kraken WebSocket trade message,
+        converting each field of the whole message at once.
+
+        Args:
+            trades: The `data` of the message, e.g.
+                [{'symbol': 'BTC/USD', 'price': 0.5117, 'qty': 40.0,
+                  'timestamp': '2023-09-25T07:49:37.708706Z', 'side': 'buy', ...}]
+        Returns:
+            The trades, in the same order
+        """
+        timestamps = [trade['timestamp'] for trade in trades]
+        return list(
+            map(
+                cls,
+                [trade['symbol'] for trade in trades],
+                [float(trade['price']) for trade in trades],
+                [float(trade['qty']) for trade in trades],
+                timestamps,
+                datestrs2milliseconds(timestamps),
+                [trade.get('side') for trade in trades],
+            )
         )
 
     @staticmethod
     def _milliseconds2datestr(milliseconds: int) -> str:
-        return datetime.fromtimestamp(milliseconds / 1000).strftime(
-            '%Y-%m-%dT%H:%M:%S.%fZ'
-        )
+        return milliseconds2datestrs([milliseconds])[0]
 
     @staticmethod
     def _datestr2milliseconds(datestr: str) -> int:
-        return int(
-            datetime.strptime(datestr, '%Y-%m-%dT%H:%M:%S.%fZ').timestamp() * 1000
-        )
+        return datestrs2milliseconds([datestr])[0]
 
     def to_str(self) -> str:
-        # pydantic method to convert the model to a dict
-        return self.model_dump_json()
+        return json.dumps(self.to_dict())
 
     def to_dict(self) -> dict:
-        return self.model_dump()
+        return {
+            'pair': self.pair,
+            'price': self.price,
+            'volume': self.volume,
+            'timestamp': self.timestamp,
+            'timestamp_ms': self.timestamp_ms,
+            'side': self.side,
+        }
+
+    def validate(self) -> 'Trade':
+        """
+        Validates the fields with `TradeModel`, raising a pydantic ValidationError if
+        they are not valid
+        """
+        TradeModel.model_validate(self.to_dict(), strict=True)
+        return self
+
+
+class TradeModel(BaseModel):
+    """
+    Pydantic model of a trade, to validate Trade objects.
+    """
+
+    pair: str
+    price: float
+    volume: float
+    timestamp: str
+    timestamp_ms: int
+    side: Optional[Literal['buy', 'sell']] = None
+
+
+# Date conversions. Trades come in bursts within the same second, so we only use
+# datetime once per second and format or parse the milliseconds ourselves.
+
+
+@lru_cache(maxsize=4096)
+def _second2datestr(second: int) -> str:
+    # The date and time up to the seconds, e.g. '2023-09-25T07:49:37'
+    return datetime.fromtimestamp(second).strftime(DATE_FORMAT)[:19]
+
+
+@lru_cache(maxsize=4096)
+def _datestr2second(datestr: str) -> int:
+    return int(datetime.strptime(datestr, DATE_FORMAT[:17]).timestamp())
+
+
+def milliseconds2datestrs(milliseconds: Iterable[int]) -> List[str]:
+    """
+    Converts Unix timestamps in milliseconds to local date strings with `DATE_FORMAT`,
+    e.g. 1695628177708 -> '2023-09-25T07:49:37.708000Z'
+    """
+    return [f'{_second2datestr(ms // 1000)}.{ms % 1000:03d}000Z' for ms in milliseconds]
+
+
+def datestrs2milliseconds(datestrs: Iterable[str]) -> List[int]:
+    """
+    Converts local date strings with `DATE_FORMAT` to Unix timestamps in milliseconds,
+    e.g. '2023-09-25T07:49:37.708706Z' -> 1695628177708
+    """
+    return [
+        _datestr2second(datestr[:19]) * 1000
+        + int(datestr[20:23].rstrip('Z').ljust(3, '0'))
+        for datestr in datestrs
+    ]
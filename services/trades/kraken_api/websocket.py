@@ -39,16 +39,7 @@ class KrakenWebsocketAPI(TradesAPI):
             data = json.loads(data)
             trades_data = data.get('data', [])
 
-            trades = [
-                Trade.from_kraken_api_response(
-                    pair=trade['symbol'],
-                    price=trade['price'],
-                    volume=trade['qty'],
-                    timestamp=trade['timestamp'],
-                )
-                for trade in trades_data
-            ]
-            return trades
+            return Trade.from_kraken_websocket_batch(trades_data)
         except (json.JSONDecodeError, KeyError) as e:
             logger.error(f'Error decoding WebSocket data: {e}')
             return []
@@ -0,0 +1,197 @@
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+from streaming_common.metrics import (
+    QUEUE_SIZE,
+    SOURCE_BLOCKED_SECONDS,
+    SOURCE_LAG_SECONDS,
+    SOURCE_LAST_MESSAGE_TIMESTAMP,
+)
+
+from .base import TradesAPI
+from .trade import Trade
+from .websocket import KrakenWebsocketAPI
+
+
+class _Connection(threading.Thread):
+    """
+    Reads the trades of a shard of pairs from its own WebSocket connection and puts
+    them in the shared queue.
+
+    If the queue is full, `put` blocks and we stop reading from this connection. The
+    queue is shared, so while it is full every connection waits: the backpressure
+    slows down all the shards, not only the one whose trades filled it.
+    """
+
+    def __init__(self, index: int, pairs: List[str], trades_queue: queue.Queue):
+        super().__init__(name=f'kraken-ws-{index}', daemon=True)
+        self.index = index
+        self.pairs = pairs
+        self._queue = trades_queue
+        self._stop_event = threading.Event()
+        self._api: Optional[KrakenWebsocketAPI] = None
+
+        self.error: Optional[Exception] = None
+        self.n_messages = 0
+        self.n_trades = 0
+        self.last_message_time = time.time()
+        self.last_trade_lag_ms = 0.0
+        self.blocked_seconds = 0.0
+
+    def run(self):
+        try:
+            self._api = KrakenWebsocketAPI(pairs=self.pairs)
+            while not self._stop_event.is_set():
+                trades = self._api.get_trades()
+
+                self.n_messages += 1
+                self.last_message_time = time.time()
+                SOURCE_LAST_MESSAGE_TIMESTAMP.labels(connection=self.name).set(
+                    self.last_message_time
+                )
+                if not trades:
+                    continue
+
+                self.n_trades += len(trades)
+                self.last_trade_lag_ms = (
+                    self.last_message_time * 1000 - trades[-1].timestamp_ms
+                )
+                SOURCE_LAG_SECONDS.labels(connection=self.name).set(
+                    self.last_trade_lag_ms / 1000
+                )
+
+                start = time.monotonic()
+                while not self._stop_event.is_set():
+                    try:
+                        self._queue.put(trades, timeout=1.0)
+                        break
+                    except queue.Full:
+                        logger.warning(
+                            f'Trades queue is full, connection {self.index} waits'
+                        )
+                blocked_seconds = time.monotonic() - start
+                self.blocked_seconds += blocked_seconds
+                SOURCE_BLOCKED_SECONDS.labels(connection=self.name).inc(blocked_seconds)
+
+        except Exception as e:
+            # Raised again by the pool, to terminate the app as with a single
+            # connection
+            logger.error(f'Connection {self.index} for {self.pairs} failed: {e}')
+            self.error = e
+        finally:
+            if self._api is not None:
+                self._api.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._api is not None:
+            self._api.close()
+
+    def metrics(self) -> dict:
+        return {
+            'pairs': self.pairs,
+            'messages': self.n_messages,
+            'trades': self.n_trades,
+            'seconds_since_last_message': round(
+                time.time() - self.last_message_time, 3
+            ),
+            'last_trade_lag_ms': round(self.last_trade_lag_ms, 1),
+            'blocked_seconds': round(self.blocked_seconds, 3),
+        }
+
+
+class KrakenWebsocketPoolAPI(TradesAPI):
+    """
+    Reads the trades from several Kraken WebSocket connections, each one subscribed
+    to a shard of the pairs and running in its own thread, so a slow connection or a
+    large message does not stall the other pairs.
+
+    The connections hand the trades over through a single bounded queue, which
+    decouples reading from the WebSocket from producing to Kafka in `run.py`. When
+    producing falls behind and the queue fills up, all the connections wait.
+
+    The queue size and the lag, last message time and blocked time of each connection
+    are Prometheus metrics, see streaming_common.metrics, and are also logged every
+    `metrics_interval_seconds`.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        n_connections: int,
+        queue_size: int = 10_000,
+        metrics_interval_seconds: float = 60.0,
+    ):
+        self.pairs = pairs
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        # Round-robin, so each connection gets a similar number of pairs
+        n_connections = max(1, min(n_connections, len(pairs)))
+        self._connections = [
+            _Connection(i, pairs[i::n_connections], self._queue)
+            for i in range(n_connections)
+        ]
+        for connection in self._connections:
+            connection.start()
+
+        self._metrics_interval_seconds = metrics_interval_seconds
+        self._last_metrics_time = time.monotonic()
+
+    def get_trades(self) -> List[Trade]:
+        """
+        Returns the trades the connections received since the last call, waiting up
+        to 1 second for the first ones.
+        """
+        for connection in self._connections:
+            if connection.error is not None:
+                raise RuntimeError(
+                    f'WebSocket connection {connection.index} failed'
+                ) from connection.error
+
+        self._log_metrics()
+
+        try:
+            trades = self._queue.get(timeout=1.0)
+        except queue.Empty:
+            return []
+
+        # The size before we drain it, which shows how far producing falls behind
+        QUEUE_SIZE.labels(queue='kraken-ws').set(self._queue.qsize() + 1)
+
+        # Take everything that is already in the queue, up to its size
+        for _ in range(self._queue.maxsize):
+            try:
+                trades += self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+        return trades
+
+    def is_done(self) -> bool:
+        return False
+
+    def metrics(self) -> Dict[str, dict]:
+        """
+        Returns the number of messages and trades, the time since the last message and
+        the lag of the last trade (receive time minus trade time) of each connection
+        """
+        return {
+            connection.name: connection.metrics() for connection in self._connections
+        }
+
+    def close(self):
+        """Closes all the WebSocket connections."""
+        for connection in self._connections:
+            connection.stop()
+
+    def _log_metrics(self):
+        if time.monotonic() - self._last_metrics_time < self._metrics_interval_seconds:
+            return
+        self._last_metrics_time = time.monotonic()
+
+        logger.info(f'Trades queue size: {self._queue.qsize()}')
+        for name, metrics in self.metrics().items():
+            logger.info(f'{name}: {metrics}')
@@ -1,13 +1,27 @@
 import signal
 import sys
+from typing import TYPE_CHECKING, Optional
 
 from loguru import logger
 from quixstreams import Application
+from streaming_common.metrics import MESSAGES_IN, start_server
+from streaming_common.serialization import Codec, get_serializer
+from streaming_common.tracing import now_ms
 
+from batch_producer import BatchedTradesProducer
+from heartbeats import TradeHeartbeats
 from kraken_api.base import TradesAPI
+from kraken_api.checkpoint import BackfillCheckpoint
 from kraken_api.mock import KrakenMockAPI
 from kraken_api.rest import KrakenRestAPI
+from kraken_api.synthetic import SyntheticTradesAPI
 from kraken_api.websocket import KrakenWebsocketAPI
+from kraken_api.websocket_pool import KrakenWebsocketPoolAPI
+
+if TYPE_CHECKING:
+    # The archive and the replay need pyarrow, so we only import them when the
+    # archive or the replay are configured
+    from kraken_api.archive import TradeArchive
 
 
 def signal_handler(sig, frame):
@@ -20,7 +34,17 @@ signal.signal(signal.SIGINT, signal_handler)
 # signal.signal(signal.SIGTERM, signal_handler)
 
 
-def main(kafka_broker_address: str, kafka_topic: str, trades_api: TradesAPI):
+def main(
+    kafka_broker_address: str,
+    kafka_topic: str,
+    trades_api: TradesAPI,
+    kafka_topic_codec: Codec = 'json',
+    trade_archive: Optional['TradeArchive'] = None,
+    linger_ms: int = 50,
+    log_every_n_trades: int = 1000,
+    metrics_port: Optional[int] = None,
+    heartbeats: Optional[TradeHeartbeats] = None,
+):
     """
     Reads trade data from the Kraken WebSocket API and publishes it to a Kafka topic.
 
@@ -28,6 +52,13 @@ def main(kafka_broker_address: str, kafka_topic: str, trades_api: TradesAPI):
         kafka_broker_address (str): The address of the Kafka broker (e.g., 'localhost:9092').
         kafka_topic (str): The name of the Kafka topic to which trade data will be published.
         trades_api(TradesAPI): The Kraken API object with 2 methods: get_trades and is_done
+        kafka_topic_codec (Codec): The codec of the messages, 'json' or 'binary'
+        trade_archive (Optional[TradeArchive]): Local archive to also write the trades to
+        linger_ms (int): How long the producer waits to group messages in a request
+        log_every_n_trades (int): Log one trade out of every `log_every_n_trades`
+        metrics_port (Optional[int]): Serve the Prometheus metrics on this port
+        heartbeats (Optional[TradeHeartbeats]): Adds heartbeats for the pairs without
+            trades, so the candles service emits their candles on time
     """
 
     logger.info('Starting the trades service')
@@ -35,35 +66,49 @@ def main(kafka_broker_address: str, kafka_topic: str, trades_api: TradesAPI):
     # Initialize the Quix Streams application.
     # This class handles all the low-level details to connect to Kafka.
     # https://quix.io/docs/quix-streams/producer.html
-    app = Application(broker_address=kafka_broker_address)
-    topic = app.topic(name=kafka_topic, value_serializer='json')
-    producer = app.get_producer()
+    app = Application(
+        broker_address=kafka_broker_address,
+        producer_extra_config={'linger.ms': linger_ms},
+    )
+    topic = app.topic(
+        name=kafka_topic, value_serializer=get_serializer(kafka_topic_codec, 'trade')
+    )
+    producer = BatchedTradesProducer(
+        producer=app.get_producer(),
+        topic=topic,
+        log_every_n_trades=log_every_n_trades,
+    )
+
+    start_server(metrics_port)
+    # The trades we get from the API, labelled with the name of the API
+    trades_in = MESSAGES_IN.labels(topic=type(trades_api).__name__)
 
     try:
         while not trades_api.is_done():
             trades = trades_api.get_trades()
-
-            for trade in trades:
-                try:
-                    message = topic.serialize(
-                        key=trade.pair.replace(
-                            '/', '-'
-                        ),  # Slashes might git problems in Kafka
-                        value=trade.to_dict(),
-                    )
-                    producer.produce(
-                        topic=topic.name, value=message.value, key=message.key
-                    )
-                    logger.info(f'Pushed trade to Kafka: {trade}')
-
-                except Exception as e:
-                    logger.error(f'Error producing trade to Kafka: {e}')
+            received_ms = now_ms()
+            trades_in.inc(len(trades))
+            if trade_archive is not None:
+                trade_archive.write(trades)
+            if heartbeats is not None:
+                trades = heartbeats.add(trades)
+
+            producer.produce(trades, received_ms)
+            if trades_api.commit_after_delivery:
+                # e.g. the backfill checkpoint only moves past delivered trades
+                trades_api.commit(producer.deliver())
 
     except KeyboardInterrupt:
         logger.info('Shutting down due to KeyboardInterrupt')
     finally:
         logger.info('Shutting down Quix Streams application')
+        producer.flush()
+        logger.info(f'Trades producer: {producer.stats()}')
+        if heartbeats is not None:
+            logger.info(f'Sent {heartbeats.n_heartbeats} heartbeats')
         app.stop()
+        if trade_archive is not None:
+            trade_archive.close()
         # trades_api.close()
 
 
@@ -71,10 +116,27 @@ if __name__ == '__main__':
     from config import config
 
     # Initialize the Kraken API depending on the data source
-    if config.data_source == 'live':
+    if config.data_source == 'live' and config.websocket_connections > 1:
+        # Shard the pairs across several WebSocket connections
+        kraken_api = KrakenWebsocketPoolAPI(
+            pairs=config.pairs,
+            n_connections=config.websocket_connections,
+            queue_size=config.trades_queue_size,
+        )
+    elif config.data_source == 'live':
         kraken_api = KrakenWebsocketAPI(pairs=config.pairs)
     elif config.data_source == 'historical':
-        kraken_api = KrakenRestAPI(pairs=config.pairs, last_n_days=config.last_n_days)
+        kraken_api = KrakenRestAPI(
+            pairs=config.pairs,
+            last_n_days=config.last_n_days,
+            requests_per_second=config.rest_requests_per_second,
+            max_burst=config.rest_max_burst,
+            checkpoint=BackfillCheckpoint(
+                path=config.backfill_checkpoint_file, resume=config.backfill_resume
+            )
+            if config.backfill_checkpoint_file
+            else None,
+        )
 
         # # TODO: remove this once we are done debugging the KrakenRestAPISinglePair
         # from kraken_api.rest import KrakenRestAPISinglePair
@@ -83,16 +145,51 @@ if __name__ == '__main__':
         #     last_n_days=config.last_n_days,
         # )
 
+    elif config.data_source == 'replay':
+        from kraken_api.replay import TradesReplayAPI
+
+        kraken_api = TradesReplayAPI(
+            path=config.archive_dir,
+            pairs=config.pairs,
+            speed=config.replay_speed,
+        )
+    elif config.data_source == 'synthetic':
+        kraken_api = SyntheticTradesAPI(
+            pairs=config.pairs,
+            trades_per_second=config.synthetic_trades_per_second,
+            seed=config.synthetic_seed,
+            realtime=config.synthetic_realtime,
+            duration_seconds=config.synthetic_duration_seconds,
+            start_timestamp_ms=config.synthetic_start_timestamp_ms,
+        )
     elif config.data_source == 'test':
         kraken_api = KrakenMockAPI(pairs=config.pairs)
     else:
         raise ValueError(f'Invalid data source: {config.data_source}')
 
+    # We do not archive the trades we replay from the archive
+    if config.archive_dir and config.data_source != 'replay':
+        from kraken_api.archive import TradeArchive
+
+        trade_archive = TradeArchive(path=config.archive_dir)
+    else:
+        trade_archive = None
+
     try:
         main(
             kafka_broker_address=config.kafka_broker_address,
             kafka_topic=config.kafka_topic,
             trades_api=kraken_api,
+            kafka_topic_codec=config.kafka_topic_codec,
+            trade_archive=trade_archive,
+            linger_ms=config.kafka_linger_ms,
+            log_every_n_trades=config.log_every_n_trades,
+            metrics_port=config.metrics_port,
+            heartbeats=TradeHeartbeats(
+                pairs=config.pairs, interval_ms=config.heartbeat_seconds * 1000
+            )
+            if config.heartbeat_seconds
+            else None,
         )
     except Exception as e:
         logger.error(f'Fatal error in main: {e}')
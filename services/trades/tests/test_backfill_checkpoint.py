@@ -0,0 +1,126 @@
+"""
+The backfill checkpoint only moves past the trades that were delivered to Kafka.
+"""
+
+import json
+from typing import List
+
+import pytest
+from confluent_kafka import KafkaError
+from quixstreams.models import Topic
+from streaming_common.serialization import get_serializer
+
+from batch_producer import BatchedTradesProducer
+from kraken_api import rest
+from kraken_api.checkpoint import BackfillCheckpoint
+from kraken_api.trade import Trade
+
+START_NS = 1_700_000_000_000 * 1_000_000
+
+
+class FakeSinglePairAPI:
+    """
+    Returns two pages of two trades of the pair, one second apart
+    """
+
+    def __init__(self, pair: str, since_timestamp_ns: int = None, **kwargs):
+        self.pair = pair
+        self.since_timestamp_ns = since_timestamp_ns or START_NS
+        start_ms = self.since_timestamp_ns // 1_000_000
+        self._pages = [
+            [self._trade(start_ms + 1000 * i) for i in (1, 2)],
+            [self._trade(start_ms + 1000 * i) for i in (3, 4)],
+        ]
+
+    def _trade(self, timestamp_ms: int) -> Trade:
+        return Trade(self.pair, 100.0, 1.0, 'timestamp', timestamp_ms, 'buy')
+
+    def get_trades(self) -> List[Trade]:
+        return self._pages.pop(0)
+
+    def is_done(self) -> bool:
+        return not self._pages
+
+
+class FakeMessage:
+    def topic(self) -> str:
+        return 'trades'
+
+
+class FakeProducer:
+    """
+    Keeps the delivery callbacks until the flush, and fails the deliveries while
+    `failing` is set
+    """
+
+    def __init__(self):
+        self.failing = False
+        self._callbacks = []
+
+    def produce(self, on_delivery, **kwargs):
+        self._callbacks.append(on_delivery)
+
+    def poll(self, timeout: float) -> None:
+        pass
+
+    def flush(self, timeout=None) -> int:
+        error = KafkaError(KafkaError._MSG_TIMED_OUT) if self.failing else None
+        for callback in self._callbacks:
+            callback(error, FakeMessage())
+        self._callbacks = []
+        return 0
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch) -> rest.KrakenRestAPI:
+    monkeypatch.setattr(rest, 'KrakenRestAPISinglePair', FakeSinglePairAPI)
+    checkpoint = BackfillCheckpoint(str(tmp_path / 'checkpoint.json'))
+    return rest.KrakenRestAPI(
+        ['BTC/USD'], last_n_days=1, batch_size=2, checkpoint=checkpoint
+    )
+
+
+@pytest.fixture
+def producer() -> BatchedTradesProducer:
+    topic = Topic('trades', value_serializer=get_serializer('json', 'trade'))
+    return BatchedTradesProducer(FakeProducer(), topic)
+
+
+def saved_cursor(api: rest.KrakenRestAPI) -> dict:
+    return json.loads(api.checkpoint.path.read_text())['pairs']['BTC/USD']
+
+
+def test_checkpoint_moves_after_delivery(api, producer):
+    producer.produce(api.get_trades())
+
+    # handed to the producer, not delivered yet
+    assert saved_cursor(api)['since_timestamp_ns'] == START_NS
+
+    api.commit(producer.deliver())
+
+    assert saved_cursor(api)['since_timestamp_ns'] == START_NS + 2 * 10**9
+    assert saved_cursor(api)['n_trades'] == 2
+
+
+def test_failed_delivery_does_not_move_checkpoint(api, producer):
+    producer.produce(api.get_trades())
+    api.commit(producer.deliver())
+
+    producer.producer.failing = True
+    producer.produce(api.get_trades())
+    api.commit(producer.deliver())
+
+    assert saved_cursor(api)['since_timestamp_ns'] == START_NS + 2 * 10**9
+
+    # nor any later delivery, which would skip the trades that failed
+    producer.producer.failing = False
+    producer.produce(api.get_trades())
+    api.commit(producer.deliver())
+
+    assert api.is_done()
+    assert saved_cursor(api) == {
+        'start_timestamp_ns': START_NS,
+        'since_timestamp_ns': START_NS + 2 * 10**9,
+        'n_trades': 2,
+        'done': False,
+    }